@@ -0,0 +1,233 @@
+"""Vectorized rating analytics over an in-memory matrix of category scores.
+
+Every title has the same fixed vector of category scores, so the catalog is
+held as one (titles x categories) float array plus integer codes for the
+platform and content type of each row. Analytics are computed with NumPy
+over that array (or a boolean-masked subset of it) and never touch Mongo;
+the matrix is loaded once and then kept current row by row as movies are
+written.
+
+The same rows, normalized to unit length, serve as a vector index for
+"more like this" nearest-neighbour queries.
+
+The matrix is per process: with several workers each one only sees its own
+writes until it reloads.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def _plain(value: Any) -> Any:
+    """Value of an enum member, or the value itself"""
+    return getattr(value, "value", value)
+
+
+def _number(value: float, digits: int = 4) -> Optional[float]:
+    """JSON-friendly float: rounded, with NaN/inf as None"""
+    return round(float(value), digits) if np.isfinite(value) else None
+
+
+class RatingMatrix:
+    """Rating vectors of the catalog, one row per movie.
+
+    Rows are stored in a preallocated array that doubles when full; removing a
+    row moves the last row into its slot, so upserts and removals are O(k).
+    """
+
+    _ARRAYS = ("_scores", "_unit", "_sqnorm", "_platform", "_type")
+
+    def __init__(self, categories: Sequence[str], platforms: Sequence[str],
+                 content_types: Sequence[str], capacity: int = 1024):
+        self.categories = list(categories)
+        self.platforms = list(platforms)
+        self.content_types = list(content_types)
+        self._platform_codes = {name: code for code, name in enumerate(self.platforms)}
+        self._type_codes = {name: code for code, name in enumerate(self.content_types)}
+
+        self.ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._scores = np.zeros((capacity, len(self.categories)), dtype=np.float64)
+        # Similarity index: unit-length copy of each row and its squared norm
+        self._unit = np.zeros((capacity, len(self.categories)), dtype=np.float64)
+        self._sqnorm = np.zeros(capacity, dtype=np.float64)
+        self._platform = np.zeros(capacity, dtype=np.int16)
+        self._type = np.zeros(capacity, dtype=np.int8)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, movie_id: str) -> bool:
+        return movie_id in self._rows
+
+    @property
+    def scores(self) -> np.ndarray:
+        """View of the filled rows"""
+        return self._scores[:len(self.ids)]
+
+    def _grow(self):
+        capacity = max(1, len(self._scores) * 2)
+        for name in self._ARRAYS:
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def upsert(self, movie: Dict[str, Any]):
+        """Insert or refresh the row of a movie document"""
+        row = self._rows.get(movie['id'])
+        if row is None:
+            if len(self.ids) == len(self._scores):
+                self._grow()
+            row = len(self.ids)
+            self.ids.append(movie['id'])
+            self._rows[movie['id']] = row
+        ratings = movie['ratings']
+        vector = np.array([ratings[category] for category in self.categories], dtype=np.float64)
+        norm = np.linalg.norm(vector)
+        self._scores[row] = vector
+        self._unit[row] = vector / norm if norm > 0 else 0
+        self._sqnorm[row] = norm ** 2
+        self._platform[row] = self._platform_codes[_plain(movie['streaming_platform'])]
+        self._type[row] = self._type_codes[_plain(movie['content_type'])]
+
+    def remove(self, movie_id: str):
+        row = self._rows.pop(movie_id, None)
+        if row is None:
+            return
+        last = len(self.ids) - 1
+        if row != last:
+            moved_id = self.ids[last]
+            self.ids[row] = moved_id
+            self._rows[moved_id] = row
+            for name in self._ARRAYS:
+                array = getattr(self, name)
+                array[row] = array[last]
+        self.ids.pop()
+
+    def clear(self):
+        """Drop every row, keeping the allocated arrays"""
+        self.ids, self._rows = [], {}
+
+    def mask(self, platform: Optional[str] = None, content_type: Optional[str] = None) -> np.ndarray:
+        """Boolean row mask for an optional platform/content type filter"""
+        selected = np.ones(len(self.ids), dtype=bool)
+        if platform is not None:
+            selected &= self._platform[:len(self.ids)] == self._platform_codes[_plain(platform)]
+        if content_type is not None:
+            selected &= self._type[:len(self.ids)] == self._type_codes[_plain(content_type)]
+        return selected
+
+    def select(self, mask: np.ndarray) -> List[str]:
+        """Ids of the rows in a mask"""
+        return [self.ids[row] for row in np.flatnonzero(mask)]
+
+    def mask_like(self, movie_id: str, same_platform: bool = False, same_content_type: bool = False) -> np.ndarray:
+        """Row mask restricted to the platform and/or content type of a movie in the matrix"""
+        row = self._rows[movie_id]
+        selected = np.ones(len(self.ids), dtype=bool)
+        if same_platform:
+            selected &= self._platform[:len(self.ids)] == self._platform[row]
+        if same_content_type:
+            selected &= self._type[:len(self.ids)] == self._type[row]
+        return selected
+
+    def row(self, movie_id: str) -> Optional[np.ndarray]:
+        row = self._rows.get(movie_id)
+        return None if row is None else self._scores[row]
+
+    # Analytics
+
+    def correlations(self, mask: np.ndarray) -> Dict[str, Dict[str, Optional[float]]]:
+        """Pearson correlation between every pair of categories"""
+        scores = self.scores[mask]
+        if len(scores) < 2:
+            matrix = np.full((len(self.categories),) * 2, np.nan)
+        else:
+            with np.errstate(invalid="ignore", divide="ignore"):
+                matrix = np.corrcoef(scores, rowvar=False)
+        return {
+            a: {b: _number(matrix[i, j]) for j, b in enumerate(self.categories)}
+            for i, a in enumerate(self.categories)
+        }
+
+    def percentiles(self, mask: np.ndarray, quantiles: Iterable[float]) -> Dict[str, Dict[str, Optional[float]]]:
+        """Per-category score at each requested percentile (0-100)"""
+        quantiles = list(quantiles)
+        scores = self.scores[mask]
+        if not len(scores):
+            return {category: {f"{q:g}": None for q in quantiles} for category in self.categories}
+        values = np.percentile(scores, quantiles, axis=0)
+        return {
+            category: {f"{q:g}": _number(values[i, j]) for i, q in enumerate(quantiles)}
+            for j, category in enumerate(self.categories)
+        }
+
+    def zscores(self, movie_id: str, mask: np.ndarray) -> Optional[Dict[str, Optional[float]]]:
+        """Standard score of one movie in every category against the masked population"""
+        vector = self.row(movie_id)
+        if vector is None:
+            return None
+        scores = self.scores[mask]
+        if not len(scores):
+            return {category: None for category in self.categories}
+        mean, std = scores.mean(axis=0), scores.std(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            z = np.where(std > 0, (vector - mean) / std, np.nan)
+        return {category: _number(z[j]) for j, category in enumerate(self.categories)}
+
+    def nearest(self, movie_id: str, k: int, mask: np.ndarray,
+                metric: str = "cosine") -> Optional[List[Tuple[str, float]]]:
+        """The k rows closest to a movie's rating profile, as (id, score) pairs.
+
+        Cosine scores are similarities (higher is closer), Euclidean scores are
+        distances (lower is closer). Either costs one matrix-vector product.
+        """
+        row = self._rows.get(movie_id)
+        if row is None:
+            return None
+        mask = mask.copy()
+        mask[row] = False
+        candidates = np.flatnonzero(mask)
+        if not len(candidates):
+            return []
+
+        if metric == "cosine":
+            # Higher is closer; negate so that smaller keys come first either way
+            scores = self._unit[candidates] @ self._unit[row]
+            keys = -scores
+        else:
+            # |a - b|^2 = |a|^2 - 2 a.b + |b|^2, with the squared norms precomputed
+            squared = self._sqnorm[candidates] - 2 * (self._scores[candidates] @ self._scores[row]) + self._sqnorm[row]
+            scores = np.sqrt(np.maximum(squared, 0))
+            keys = scores
+
+        k = min(k, len(candidates))
+        best = np.argpartition(keys, k - 1)[:k]
+        best = best[np.argsort(keys[best], kind="stable")]
+        return [(self.ids[candidates[i]], _number(scores[i])) for i in best]
+
+    def platform_summary(self, mask: np.ndarray) -> List[Dict[str, Any]]:
+        """Count, per-category mean and standard deviation for every platform"""
+        codes = self._platform[:len(self.ids)][mask]
+        scores = self.scores[mask]
+        count = np.bincount(codes, minlength=len(self.platforms))
+        # Grouped sums via bincount per category: one pass over the matrix per column
+        sums = np.stack([np.bincount(codes, weights=scores[:, j], minlength=len(self.platforms))
+                         for j in range(len(self.categories))], axis=1)
+        squares = np.stack([np.bincount(codes, weights=scores[:, j] ** 2, minlength=len(self.platforms))
+                            for j in range(len(self.categories))], axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = sums / count[:, None]
+            std = np.sqrt(np.maximum(squares / count[:, None] - mean ** 2, 0))
+
+        summary = []
+        for code in np.flatnonzero(count):
+            summary.append({
+                "platform": self.platforms[code],
+                "count": int(count[code]),
+                "mean": {c: _number(mean[code, j], 2) for j, c in enumerate(self.categories)},
+                "std": {c: _number(std[code, j], 2) for j, c in enumerate(self.categories)},
+                "overall_mean": _number(mean[code].mean(), 2),
+            })
+        return sorted(summary, key=lambda item: -item["count"])
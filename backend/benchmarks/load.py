@@ -0,0 +1,265 @@
+"""Concurrent load test of the API with a mixed read/write workload.
+
+    cd backend && STORAGE_BACKEND=memory python -m benchmarks.load --save baseline.json
+    cd backend && STORAGE_BACKEND=memory python -m benchmarks.load --compare baseline.json
+    cd backend && python -m benchmarks.load --url http://localhost:8001 --clients 100
+
+Without --url the app is driven in-process through httpx's ASGI transport
+(with its startup and shutdown handlers run around the test), on whatever
+storage engine STORAGE_BACKEND selects. With --url the requests go to a
+running server instead.
+
+Each client loops for --duration seconds, picking an operation by the
+weights of --mix and waiting for its response before sending the next one
+(a closed-loop model), after --warmup seconds whose requests are not
+counted. Throughput and p50/p95/p99 latency are reported per route.
+
+--save writes the report as a JSON baseline. --compare reads one and exits
+with status 1 if any route's p95 or p99 latency grew, or its throughput
+dropped, by more than --tolerance (a fraction), or if requests failed.
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+from server import SEED_DATA, RATING_CATEGORIES, StreamingPlatform, app
+from synthetic import generate_movies, synthetic_movie
+
+DEFAULT_MIX = "list=40,detail=30,stats=10,create=10,update=10"
+LIST_LIMIT = 20
+PERCENTILES = (50, 95, 99)
+# Metrics compared against a baseline, and whether a higher value is better
+COMPARED_METRICS = {"p95_ms": False, "p99_ms": False, "throughput": True}
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for item in mix.split(','):
+        name, _, weight = item.partition('=')
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"Unknown operation '{name}', expected any of: {', '.join(OPERATIONS)}")
+        weights[name] = float(weight)
+    return weights
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+
+class Workload:
+    """Shared state of the clients: known ids and the recorded latencies"""
+
+    def __init__(self, http: httpx.AsyncClient, ids: List[str]):
+        self.http = http
+        self.ids = ids
+        self.created = 0
+        # Requests sent before this (monotonic) time are warmup
+        self.measure_from = float("inf")
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    async def request(self, route: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        sent = time.monotonic()
+        started = time.perf_counter()
+        try:
+            response = await self.http.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            response = None
+        elapsed = time.perf_counter() - started
+        if sent >= self.measure_from:
+            self.latencies[route].append(elapsed)
+            if response is None or response.status_code >= 400:
+                self.errors[route] += 1
+        return response
+
+
+async def list_movies(workload: Workload, rng: random.Random):
+    params = {"limit": LIST_LIMIT}
+    if rng.random() < 0.5:
+        params["platform"] = rng.choice(list(StreamingPlatform)).value
+    await workload.request("GET /api/movies", "GET", "/api/movies", params=params)
+
+
+async def get_movie(workload: Workload, rng: random.Random):
+    await workload.request("GET /api/movies/{id}", "GET", f"/api/movies/{rng.choice(workload.ids)}")
+
+
+async def get_stats(workload: Workload, rng: random.Random):
+    await workload.request("GET /api/stats", "GET", "/api/stats")
+
+
+async def create_movie(workload: Workload, rng: random.Random):
+    workload.created += 1
+    movie = synthetic_movie(rng.choice(SEED_DATA), len(workload.ids) + workload.created, rng)
+    response = await workload.request("POST /api/movies", "POST", "/api/movies", json=movie)
+    if response is not None and response.status_code == 200:
+        workload.ids.append(response.json()['id'])
+
+
+async def update_movie(workload: Workload, rng: random.Random):
+    ratings = {category: round(rng.uniform(1, 10), 1) for category in RATING_CATEGORIES}
+    await workload.request(
+        "PUT /api/movies/{id}", "PUT", f"/api/movies/{rng.choice(workload.ids)}", json={"ratings": ratings}
+    )
+
+
+OPERATIONS = {
+    "list": list_movies,
+    "detail": get_movie,
+    "stats": get_stats,
+    "create": create_movie,
+    "update": update_movie,
+}
+
+
+async def prepare(http: httpx.AsyncClient, titles: int, seed: int) -> List[str]:
+    """Ids of the titles to read and update, creating titles up to `titles` if needed"""
+    ids, cursor = [], None
+    while True:
+        params = {"limit": 1000, "fields": "id", **({"cursor": cursor} if cursor else {})}
+        response = await http.get("/api/movies", params=params)
+        response.raise_for_status()
+        ids.extend(movie['id'] for movie in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor or len(ids) >= titles:
+            break
+    for start in range(len(ids), titles, 1000):
+        batch = list(generate_movies(SEED_DATA, min(titles, start + 1000) - start, seed, start))
+        response = await http.post("/api/movies/bulk", json=batch)
+        response.raise_for_status()
+        ids.extend(result['id'] for result in response.json()['results'] if result['id'])
+    return ids[:titles]
+
+
+async def run_client(workload: Workload, mix: Dict[str, float], seed: int, deadline: float):
+    rng = random.Random(seed)
+    names, weights = list(mix), list(mix.values())
+    while time.monotonic() < deadline:
+        await OPERATIONS[rng.choices(names, weights)[0]](workload, rng)
+        # In-process requests may complete without suspending; yield so the
+        # clients interleave as they would over a network
+        await asyncio.sleep(0)
+
+
+def summarize(workload: Workload, seconds: float) -> Dict[str, Dict[str, float]]:
+    routes = {}
+    for route, latencies in sorted(workload.latencies.items()):
+        latencies.sort()
+        routes[route] = {
+            "requests": len(latencies),
+            "errors": workload.errors[route],
+            "throughput": round(len(latencies) / seconds, 1),
+            "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+            **{f"p{p}_ms": round(percentile(latencies, p) * 1000, 3) for p in PERCENTILES},
+        }
+    return routes
+
+
+async def run(args) -> Dict:
+    if args.url:
+        http = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+    else:
+        await app.router.startup()
+        http = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark", timeout=args.timeout)
+    try:
+        ids = await prepare(http, args.titles, args.seed)
+        workload = Workload(http, ids)
+        mix = parse_mix(args.mix)
+
+        workload.measure_from = time.monotonic() + args.warmup
+        deadline = workload.measure_from + args.duration
+        await asyncio.gather(*[
+            run_client(workload, mix, args.seed + client, deadline) for client in range(args.clients)
+        ])
+        seconds = time.monotonic() - workload.measure_from
+    finally:
+        await http.aclose()
+        if not args.url:
+            await app.router.shutdown()
+
+    routes = summarize(workload, seconds)
+    total = sum(route["requests"] for route in routes.values())
+    return {
+        "config": {
+            "target": args.url or "in-process", "clients": args.clients, "duration": args.duration,
+            "titles": args.titles, "mix": args.mix, "seed": args.seed,
+        },
+        "throughput": round(total / seconds, 1),
+        "routes": routes,
+    }
+
+
+def print_report(report: Dict):
+    print(f"{'route':<24} {'requests':>9} {'errors':>7} {'req/s':>9} {'mean ms':>9} "
+          + " ".join(f"{f'p{p} ms':>9}" for p in PERCENTILES))
+    for route, metrics in report["routes"].items():
+        print(f"{route:<24} {metrics['requests']:>9} {metrics['errors']:>7} {metrics['throughput']:>9} "
+              f"{metrics['mean_ms']:>9} " + " ".join(f"{metrics[f'p{p}_ms']:>9}" for p in PERCENTILES))
+    print(f"total {report['throughput']} req/s")
+
+
+def compare(report: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Regressions of `report` against `baseline`, as readable lines"""
+    regressions = []
+    for route, expected in baseline["routes"].items():
+        actual = report["routes"].get(route)
+        if actual is None:
+            regressions.append(f"{route}: no requests")
+            continue
+        if actual["errors"]:
+            regressions.append(f"{route}: {actual['errors']} failed requests")
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            change = (actual[metric] - expected[metric]) / expected[metric] if expected[metric] else 0.0
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append(f"{route}: {metric} {expected[metric]} -> {actual[metric]} ({change:+.0%})")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="base URL of a running server (default: in-process)")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=2, help="seconds run before measuring")
+    parser.add_argument("--titles", type=int, default=1000, help="titles to read and update (created if missing)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="operation weights")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--save", type=Path, help="write the report to this JSON baseline")
+    parser.add_argument("--compare", type=Path, help="fail on regressions against this JSON baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+    if args.titles < 1:
+        parser.error("--titles must be at least 1")
+    try:
+        parse_mix(args.mix)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.save:
+        args.save.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"Saved baseline to {args.save}")
+    if args.compare:
+        regressions = compare(report, json.loads(args.compare.read_text()), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.tolerance:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
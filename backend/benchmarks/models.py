@@ -0,0 +1,116 @@
+"""Time and memory of the per-request model work, one step at a time.
+
+    cd backend && python -m benchmarks.models
+
+Each step runs on batches of synthetic documents (see synthetic.py) at the
+sizes the service sees: a single request, a list page and a bulk chunk.
+Time is the best of REPEAT runs per item. Memory is measured in a separate
+run under tracemalloc: "peak" is the highest traced usage during the batch
+and "kept" what is still allocated once the results are returned, both per
+item.
+"""
+import time
+import tracemalloc
+import uuid
+import warnings
+from datetime import datetime, timedelta
+
+from pydantic import PydanticDeprecatedSince20
+
+from server import (
+    SEED_DATA, MovieTVShow, MovieTVShowCreate, MovieTVShowUpdate, RatingCategories,
+    build_movie, calculate_overall_rating,
+)
+from synthetic import generate_movies
+
+BATCH_SIZES = (1, 50, 1000)
+REPEAT = 5
+# Small batches are run repeatedly so each timing covers at least this many items
+MIN_ITEMS = 1000
+SEED = 0
+
+
+def make_inputs(size):
+    payloads = list(generate_movies(SEED_DATA, size, SEED))
+    base = datetime(2024, 1, 1)
+    documents = []
+    for index, payload in enumerate(payloads):
+        movie = build_movie(MovieTVShowCreate(**payload)).dict()
+        movie['id'] = str(uuid.UUID(int=index))
+        movie['created_at'] = movie['updated_at'] = base - timedelta(seconds=index)
+        documents.append(movie)
+    updates = [{"ratings": document['ratings']} for document in reversed(documents)]
+    return {
+        "payloads": payloads,
+        "ratings": [payload['ratings'] for payload in payloads],
+        "rating_models": [RatingCategories(**payload['ratings']) for payload in payloads],
+        "creates": [MovieTVShowCreate(**payload) for payload in payloads],
+        "movies": [MovieTVShow(**document) for document in documents],
+        "documents": documents,
+        "updates": list(zip(documents, updates)),
+    }
+
+
+def update_like_route(document, payload):
+    """What update_movie does with a PUT body before and after the write"""
+    movie_data = MovieTVShowUpdate(**payload)
+    update_data = movie_data.dict(exclude_unset=True)
+    update_data['overall_rating'] = calculate_overall_rating(movie_data.ratings)
+    return MovieTVShow(**{**document, **update_data})
+
+
+# (name, input key, function of one input)
+STEPS = [
+    ("MovieTVShowCreate(**payload)", "payloads", lambda payload: MovieTVShowCreate(**payload)),
+    ("RatingCategories(**ratings)", "ratings", lambda ratings: RatingCategories(**ratings)),
+    ("calculate_overall_rating", "rating_models", calculate_overall_rating),
+    ("build_movie(create)", "creates", build_movie),
+    ("MovieTVShow.dict()", "movies", lambda movie: movie.dict()),
+    ("MovieTVShow(**document)", "documents", lambda document: MovieTVShow(**document)),
+    ("update_movie models", "updates", lambda pair: update_like_route(*pair)),
+]
+
+
+def run_step(func, items):
+    return [func(item) for item in items]
+
+
+def time_per_item(func, items):
+    rounds = max(1, MIN_ITEMS // len(items))
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            run_step(func, items)
+        best = min(best, time.perf_counter() - start)
+    return best / (rounds * len(items))
+
+
+def memory_per_item(func, items):
+    """(peak, kept) traced bytes per item of one batch"""
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        results = run_step(func, items)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del results
+    return (peak - before) / len(items), (current - before) / len(items)
+
+
+def main():
+    # The server uses the pydantic 1 style .dict(); the benchmark measures it as is
+    warnings.simplefilter("ignore", PydanticDeprecatedSince20)
+    print(f"{'step':<30} {'batch':>6} {'us/item':>9} {'peak B/item':>12} {'kept B/item':>12}")
+    for size in BATCH_SIZES:
+        inputs = make_inputs(size)
+        for name, key, func in STEPS:
+            seconds = time_per_item(func, inputs[key])
+            peak, kept = memory_per_item(func, inputs[key])
+            print(f"{name:<30} {size:>6} {seconds * 1e6:>9.2f} {peak:>12.0f} {kept:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
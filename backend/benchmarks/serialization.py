@@ -0,0 +1,77 @@
+"""Per-item cost of serializing a GET /api/movies page, validated vs trusted path.
+
+    cd backend && python -m benchmarks.serialization
+
+"validated" is what the route did before the trusted read path: build a
+MovieTVShow per Mongo document, then let FastAPI validate the list against
+response_model and render it with the stdlib json encoder. "trusted" encodes
+the raw documents with orjson, as get_movies does now.
+"""
+import asyncio
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import orjson
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+
+from server import SEED_DATA, MovieTVShow, MovieTVShowCreate, api_router, build_movie
+
+PAGE_SIZES = (50, 500, 5000)
+REPEAT = 5
+
+
+def make_documents(count):
+    """Movie documents as get_movies reads them from Mongo (without _id)"""
+    base = datetime(2024, 1, 1)
+    documents = []
+    for index in range(count):
+        movie = build_movie(MovieTVShowCreate(**SEED_DATA[index % len(SEED_DATA)])).dict()
+        movie['id'] = str(uuid.UUID(int=index))
+        movie['created_at'] = movie['updated_at'] = base - timedelta(seconds=index)
+        documents.append(movie)
+    return documents
+
+
+def list_response_field():
+    for route in api_router.routes:
+        if route.path == "/api/movies" and "GET" in route.methods:
+            return route.response_field
+    raise RuntimeError("GET /api/movies route not found")
+
+
+async def validated(documents, field):
+    content = [MovieTVShow(**movie) for movie in documents]
+    serialized = await serialize_response(field=field, response_content=content)
+    return JSONResponse(serialized).body
+
+
+async def trusted(documents, field):
+    return orjson.dumps(documents)
+
+
+async def best_time(func, documents, field):
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        await func(documents, field)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+async def main():
+    field = list_response_field()
+    print(f"{'page':>6} {'validated us/item':>18} {'trusted us/item':>16} {'speedup':>8}")
+    for size in PAGE_SIZES:
+        documents = make_documents(size)
+        # Both paths must produce the same JSON
+        assert orjson.loads(await validated(documents, field)) == orjson.loads(await trusted(documents, field))
+
+        slow = await best_time(validated, documents, field)
+        fast = await best_time(trusted, documents, field)
+        print(f"{size:>6} {slow / size * 1e6:>18.2f} {fast / size * 1e6:>16.2f} {slow / fast:>7.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,99 @@
+"""Bounded in-process LRU + TTL cache for read endpoint responses."""
+import time
+from collections import OrderedDict
+from enum import Enum
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+CacheKey = Tuple[str, Tuple[Tuple[str, Any], ...]]
+
+
+class ResponseCache:
+    """LRU cache whose entries also expire after `ttl_seconds`.
+
+    Entries are keyed by route name and normalized query parameters. Every
+    invalidation bumps a generation counter; a value computed from a read that
+    started before an invalidation is dropped instead of cached, so a slow read
+    cannot put stale data back after a write.
+
+    The cache is per process: with several workers, a write only invalidates
+    the worker that served it and the others catch up within the TTL.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._clock = clock
+        self._entries: "OrderedDict[CacheKey, Tuple[float, Any]]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    @staticmethod
+    def make_key(route: str, **params: Any) -> CacheKey:
+        """Normalize query parameters: drop unset ones, use enum values, sort by name"""
+        normalized = []
+        for name, value in sorted(params.items()):
+            if value is None:
+                continue
+            if isinstance(value, Enum):
+                value = value.value
+            elif not isinstance(value, Hashable):
+                value = repr(value)
+            normalized.append((name, value))
+        return route, tuple(normalized)
+
+    def get(self, key: CacheKey) -> Tuple[bool, Any]:
+        """Return (hit, value) for a key, refreshing its LRU position on a hit"""
+        if not self.enabled:
+            return False, None
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= self._clock():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return True, entry[1]
+
+    def set(self, key: CacheKey, value: Any, generation: Optional[int] = None):
+        """Store a value; pass the generation read before computing it to guard against stale writes"""
+        if not self.enabled or (generation is not None and generation != self.generation):
+            return
+        self._entries[key] = (self._clock() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, route: str, **params: Any):
+        """Drop one entry, or every entry of the route when no parameters are given"""
+        self.generation += 1
+        if params:
+            self._entries.pop(self.make_key(route, **params), None)
+            return
+        for key in [key for key in self._entries if key[0] == route]:
+            del self._entries[key]
+
+    def clear(self):
+        self.generation += 1
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,115 @@
+"""Incremental parsers for catalog uploads in NDJSON or CSV.
+
+Both parsers consume an async iterator of raw byte chunks (an HTTP request
+body or a file read piece by piece) and yield `(line_number, row)` pairs as
+soon as a row is complete, so a file is never held in memory as a whole.
+`row` is a dict ready for MovieTVShowCreate, or a RowError when the line
+could not be parsed.
+"""
+import codecs
+import csv
+import io
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+import orjson
+
+FORMATS = ("ndjson", "csv")
+
+RATING_COLUMNS = (
+    "story", "acting", "direction", "music_sound",
+    "cinematography", "action_stunts", "emotional_impact",
+)
+
+
+class RowError:
+    """A row that could not be parsed, reported instead of aborting the import."""
+
+    def __init__(self, message: str):
+        self.message = message
+
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Decode UTF-8 chunks and yield complete lines (with their line ending)"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        # The last piece is an unfinished line, kept for the next chunk
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+async def iter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Any]]:
+    line_number = 0
+    async for line in _lines(chunks):
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            row = orjson.loads(line)
+        except orjson.JSONDecodeError as e:
+            yield line_number, RowError(f"Invalid JSON: {e}")
+            continue
+        if not isinstance(row, dict):
+            yield line_number, RowError("Row must be a JSON object")
+            continue
+        yield line_number, row
+
+
+def csv_row_to_movie(header: List[str], values: List[str]) -> Dict[str, Any]:
+    """Map a flat CSV row onto the nested create payload.
+
+    Rating columns may be named `story` or `ratings.story`; an empty
+    description is treated as missing.
+    """
+    movie: Dict[str, Any] = {}
+    ratings: Dict[str, Any] = {}
+    for name, value in zip(header, values):
+        name = name.strip()
+        category = name[len("ratings."):] if name.startswith("ratings.") else name
+        if category in RATING_COLUMNS:
+            ratings[category] = value
+        elif name == "description":
+            movie[name] = value or None
+        else:
+            movie[name] = value
+    movie["ratings"] = ratings
+    return movie
+
+
+async def iter_csv(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Any]]:
+    header = None
+    record, record_start, line_number = "", 0, 0
+    async for line in _lines(chunks):
+        line_number += 1
+        if not record:
+            record_start = line_number
+        record += line
+        # A quoted field may span lines; the record is complete once quotes balance
+        if record.count('"') % 2:
+            continue
+        text, record = record, ""
+        if not text.strip():
+            continue
+
+        values = next(csv.reader(io.StringIO(text)))
+        if header is None:
+            header = values
+            continue
+        if len(values) != len(header):
+            yield record_start, RowError(f"Expected {len(header)} columns, got {len(values)}")
+            continue
+        yield record_start, csv_row_to_movie(header, values)
+
+    if record.strip():
+        yield record_start, RowError("Unterminated quoted field")
+
+
+def iter_rows(chunks: AsyncIterator[bytes], fmt: str) -> AsyncIterator[Tuple[int, Any]]:
+    if fmt == "csv":
+        return iter_csv(chunks)
+    return iter_ndjson(chunks)
@@ -0,0 +1,79 @@
+"""Load a deterministic synthetic catalog for scale testing.
+
+    python generate_catalog.py 100000
+    python generate_catalog.py 10000000 --seed 7 --batch-size 2000 --concurrency 8
+    python generate_catalog.py 50000 --start 100000
+
+Titles come from synthetic.generate_catalog and go through the same
+validation and batched writes as POST /api/movies/import, so stats and
+counters stay consistent. The same count, seed and start always load the
+same titles; --start continues a catalog loaded earlier with the same
+seed. Progress and load throughput are printed after every batch.
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from server import IMPORT_BATCH_SIZE, IMPORT_CONCURRENCY, RATING_CATEGORIES, StreamingPlatform, import_movies, storage
+from synthetic import generate_catalog
+
+# Bulk loads favour larger batches than interactive imports
+DEFAULT_BATCH_SIZE = max(IMPORT_BATCH_SIZE, 1000)
+# Catalog entries yielded between pauses that let in-flight batches progress
+YIELD_EVERY = 100
+
+
+async def catalog_rows(count: int, seed: int, start: int):
+    platforms = [platform.value for platform in StreamingPlatform]
+    for line, movie in enumerate(generate_catalog(count, platforms, RATING_CATEGORIES, seed, start), start=1):
+        yield line, movie
+        if line % YIELD_EVERY == 0:
+            await asyncio.sleep(0)
+
+
+def progress_printer():
+    started = time.monotonic()
+
+    def print_progress(report):
+        elapsed = time.monotonic() - started
+        rate = report.processed / elapsed if elapsed > 0 else 0
+        print(
+            f"\r{report.processed} titles: {report.created} created, {report.failed} failed, {rate:.0f} titles/s",
+            end="", flush=True
+        )
+    return print_progress
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("count", type=int, help="number of titles to load")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--start", type=int, default=0, help="index of the first title in the seed's catalog")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=IMPORT_CONCURRENCY)
+    args = parser.parse_args()
+
+    print_progress = progress_printer()
+    try:
+        await storage.setup()
+        report = await import_movies(
+            catalog_rows(args.count, args.seed, args.start),
+            batch_size=args.batch_size,
+            concurrency=args.concurrency,
+            on_progress=print_progress,
+        )
+    finally:
+        storage.close()
+
+    print_progress(report)
+    print(f"\nDone in {report.elapsed_seconds}s ({report.rows_per_second} titles/s)")
+    for error in report.errors:
+        print(f"title {args.start + error.line - 1}: {error.error}")
+    if report.errors_truncated:
+        print("(more errors not shown)")
+    return 1 if report.invalid or report.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,71 @@
+"""Import a catalog file (NDJSON or CSV) straight into storage.
+
+    python import_catalog.py partner.ndjson --batch-size 1000 --concurrency 8
+    python import_catalog.py partner.csv --upsert
+
+The file is read in chunks and goes through the same streaming validation
+and batched writes as POST /api/movies/import. Progress is printed after
+every batch; the exit status is 1 if any row was invalid or failed.
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+from catalog_io import FORMATS, iter_rows
+from server import IMPORT_BATCH_SIZE, IMPORT_CONCURRENCY, import_movies, storage
+
+READ_CHUNK_SIZE = 1 << 20
+
+
+async def read_chunks(path: Path):
+    with path.open("rb") as f:
+        while True:
+            chunk = await asyncio.to_thread(f.read, READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def print_progress(report):
+    print(
+        f"\r{report.processed} rows: {report.created} created, {report.updated} updated, "
+        f"{report.invalid} invalid, {report.failed} failed",
+        end="", flush=True
+    )
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", type=Path)
+    parser.add_argument("--format", choices=FORMATS, help="default: from the file extension")
+    parser.add_argument("--upsert", action="store_true", help="replace movies with the same title, year and platform")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=IMPORT_CONCURRENCY,
+                        help="batches written at once (upserts always write one at a time)")
+    args = parser.parse_args()
+
+    fmt = args.format or ("csv" if args.path.suffix.lower() == ".csv" else "ndjson")
+    try:
+        await storage.setup()
+        report = await import_movies(
+            iter_rows(read_chunks(args.path), fmt),
+            upsert=args.upsert,
+            batch_size=args.batch_size,
+            concurrency=args.concurrency,
+            on_progress=print_progress,
+        )
+    finally:
+        storage.close()
+
+    print_progress(report)
+    print(f"\nDone in {report.elapsed_seconds}s ({report.rows_per_second} rows/s), {report.skipped} skipped")
+    for error in report.errors:
+        print(f"line {error.line}: {error.error}")
+    if report.errors_truncated:
+        print("(more errors not shown)")
+    return 1 if report.invalid or report.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,291 @@
+"""Index declarations for the movie catalog and helpers to keep MongoDB in sync.
+
+Run as a script to create the indexes, report drift and verify that every
+route query is index-backed:
+
+    python indexes.py            # ensure + drift report + explain() check
+    python indexes.py --check    # drift report + explain() check only
+"""
+import asyncio
+import logging
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Fields GET /api/movies/top can rank by
+RANKED_FIELDS = ["overall_rating"] + [
+    f"ratings.{category}"
+    for category in (
+        "story", "acting", "direction", "music_sound",
+        "cinematography", "action_stunts", "emotional_impact",
+    )
+]
+
+# Indexes required by the routes in server.py. Names are explicit so drift
+# can be reported per index rather than per auto-generated key string.
+MOVIE_INDEXES = [
+    IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    IndexModel(
+        [("created_at", DESCENDING), ("id", DESCENDING)],
+        name="created_at_id",
+    ),
+    IndexModel(
+        [("content_type", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+        name="type_created_at_id",
+    ),
+    IndexModel(
+        [("streaming_platform", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+        name="platform_created_at_id",
+    ),
+    IndexModel(
+        [
+            ("streaming_platform", ASCENDING),
+            ("content_type", ASCENDING),
+            ("created_at", DESCENDING),
+            ("id", DESCENDING),
+        ],
+        name="platform_type_created_at_id",
+    ),
+    # Leaderboards: one index per ranked field, led by the filters so any
+    # platform/content_type combination is a bounded walk
+    *[
+        IndexModel(
+            [
+                ("streaming_platform", ASCENDING),
+                ("content_type", ASCENDING),
+                (field, DESCENDING),
+                ("id", ASCENDING),
+            ],
+            name=f"platform_type_{field.replace('.', '_')}_id",
+        )
+        for field in RANKED_FIELDS
+    ],
+    # Natural key matched by upserting imports
+    IndexModel(
+        [("title", ASCENDING), ("year", ASCENDING), ("streaming_platform", ASCENDING)],
+        name="natural_key",
+    ),
+]
+
+# One rating per user and title; the key is matched when a user re-rates
+RATING_EVENT_INDEXES = [
+    IndexModel([("movie_id", ASCENDING), ("user_id", ASCENDING)], name="movie_user_unique", unique=True),
+]
+
+# Background jobs: looked up by id, and by status and kind to resume them at startup
+JOB_INDEXES = [
+    IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    IndexModel([("status", ASCENDING), ("kind", ASCENDING)], name="status_kind"),
+]
+
+# Declared indexes per collection
+COLLECTION_INDEXES = {
+    "movies": MOVIE_INDEXES,
+    "rating_events": RATING_EVENT_INDEXES,
+    "jobs": JOB_INDEXES,
+}
+
+# Sort order of GET /api/movies; the (created_at, id) pair doubles as the page cursor.
+LIST_SORT = [("created_at", DESCENDING), ("id", DESCENDING)]
+_PROBE_TIME = datetime(2000, 1, 1)
+_PLATFORMS = ["Netflix", "Hulu"]
+_CONTENT_TYPES = ["movie", "tv_series"]
+
+# Representative shape of every query issued by the routes and background
+# jobs, per collection: (label, filter, sort). Values only need to be of the
+# right type; explain() does not need matches.
+ROUTE_QUERIES: Dict[str, List[Tuple[str, Dict[str, Any], List[Tuple[str, int]]]]] = {
+    "movies": [
+        ("get_movie / update_movie / delete_movie", {"id": "explain-probe"}, []),
+        ("get_similar_movies / search_movies (id $in)", {"id": {"$in": ["explain-probe"]}}, []),
+        ("get_movies", {}, LIST_SORT),
+        ("get_movies?platform", {"streaming_platform": "Netflix"}, LIST_SORT),
+        ("get_movies?content_type", {"content_type": "movie"}, LIST_SORT),
+        (
+            "get_movies?platform&content_type",
+            {"streaming_platform": "Netflix", "content_type": "movie"},
+            LIST_SORT,
+        ),
+        (
+            "get_movies?platform&content_type&cursor",
+            {
+                "streaming_platform": "Netflix",
+                "content_type": "movie",
+                "created_at": {"$lte": _PROBE_TIME},
+                "$or": [{"created_at": {"$lt": _PROBE_TIME}}, {"id": {"$lt": "explain-probe"}}],
+            },
+            LIST_SORT,
+        ),
+        (
+            "import_movies?upsert (natural key lookup)",
+            {"$or": [{"title": "explain-probe", "year": 2000, "streaming_platform": "Netflix"}]},
+            [],
+        ),
+        *[
+            (
+                f"get_top_movies?category={field}",
+                {"streaming_platform": {"$in": _PLATFORMS}, "content_type": {"$in": _CONTENT_TYPES}},
+                [(field, DESCENDING), ("id", ASCENDING)],
+            )
+            for field in RANKED_FIELDS
+        ],
+        (
+            "get_top_movies?platform",
+            {"streaming_platform": "Netflix", "content_type": {"$in": _CONTENT_TYPES}},
+            [("overall_rating", DESCENDING), ("id", ASCENDING)],
+        ),
+        ("get_stats?platform ($match)", {"streaming_platform": "Netflix"}, []),
+        ("get_stats?content_type ($match)", {"content_type": "movie"}, []),
+        (
+            "delete_movies?platform (rated ids)",
+            {"streaming_platform": "Netflix", "community_ratings": {"$exists": True}},
+            [],
+        ),
+        ("recompute_overall (first batch)", {}, [("id", ASCENDING)]),
+        ("recompute_overall (next batch)", {"id": {"$gt": "explain-probe"}}, [("id", ASCENDING)]),
+    ],
+    "rating_events": [
+        ("rate_movie (previous rating)", {"movie_id": "explain-probe", "user_id": "explain-probe"}, []),
+        ("delete_movie (rating events)", {"movie_id": "explain-probe"}, []),
+        ("delete_movies (rating events)", {"movie_id": {"$in": ["explain-probe"]}}, []),
+    ],
+    "jobs": [
+        ("get_job", {"id": "explain-probe"}, []),
+        ("start_recompute_overall / resume_jobs", {"status": "running", "kind": "recompute_overall"}, []),
+    ],
+}
+
+
+class IndexCheckError(Exception):
+    """Raised when a route query would fall back to a collection scan."""
+
+
+def _declared_specs(indexes: List[IndexModel]) -> Dict[str, Dict[str, Any]]:
+    specs = {}
+    for model in indexes:
+        document = model.document
+        specs[document["name"]] = {
+            "key": list(document["key"].items()),
+            "unique": bool(document.get("unique", False)),
+        }
+    return specs
+
+
+async def index_drift(collection, indexes: List[IndexModel] = MOVIE_INDEXES) -> Dict[str, List[str]]:
+    """Compare the declared indexes with the ones present on the collection"""
+    declared = _declared_specs(indexes)
+    existing = await collection.index_information()
+
+    missing, mismatched, extra = [], [], []
+    for name, spec in declared.items():
+        current = existing.get(name)
+        if current is None:
+            missing.append(name)
+        elif [tuple(k) for k in current["key"]] != spec["key"] or bool(current.get("unique", False)) != spec["unique"]:
+            mismatched.append(name)
+    for name in existing:
+        if name != "_id_" and name not in declared:
+            extra.append(name)
+
+    return {"missing": missing, "mismatched": mismatched, "extra": extra}
+
+
+async def ensure_indexes(collection, indexes: List[IndexModel] = MOVIE_INDEXES) -> Dict[str, List[str]]:
+    """Create any missing declared index; safe to call on every startup"""
+    drift = await index_drift(collection, indexes)
+    if drift["missing"]:
+        logger.info("Creating indexes on %s: %s", collection.name, ", ".join(drift["missing"]))
+    for kind in ("mismatched", "extra"):
+        if drift[kind]:
+            logger.warning("Index drift on %s (%s): %s", collection.name, kind, ", ".join(drift[kind]))
+
+    # create_indexes is a no-op for indexes that already exist with the same
+    # spec. A mismatched index keeps its name, so Mongo refuses to replace it;
+    # that needs a manual drop and is reported above instead of failing startup.
+    # Created one at a time so a single conflict does not block the others.
+    for model in indexes:
+        if model.document["name"] in drift["mismatched"]:
+            continue
+        try:
+            await collection.create_indexes([model])
+        except OperationFailure as e:
+            logger.error("Error creating index %s on %s: %s", model.document["name"], collection.name, e)
+
+    return drift
+
+
+def _plan_stages(plan: Dict[str, Any]) -> List[str]:
+    """Flatten the stage names of an explain() winning plan"""
+    stages = []
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        if "stage" in node:
+            stages.append(node["stage"])
+        if "queryPlan" in node:
+            stack.append(node["queryPlan"])
+        if "inputStage" in node:
+            stack.append(node["inputStage"])
+        stack.extend(node.get("inputStages", []))
+    return stages
+
+
+async def check_query_plans(collection, queries=ROUTE_QUERIES["movies"]) -> Dict[str, List[str]]:
+    """Run explain() for every route query and fail if any of them is a COLLSCAN"""
+    plans = {}
+    offenders = []
+    for label, query, sort in queries:
+        cursor = collection.find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explanation = await cursor.explain()
+        stages = _plan_stages(explanation["queryPlanner"]["winningPlan"])
+        plans[label] = stages
+        if "COLLSCAN" in stages:
+            offenders.append(label)
+
+    if offenders:
+        raise IndexCheckError(f"Collection scan in route queries: {', '.join(offenders)}")
+    return plans
+
+
+async def _main(create: bool) -> int:
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    database = client[os.environ['DB_NAME']]
+    try:
+        for name, indexes in COLLECTION_INDEXES.items():
+            if create:
+                drift = await ensure_indexes(database[name], indexes)
+            else:
+                drift = await index_drift(database[name], indexes)
+            print(f"Index drift on {name}: {drift}")
+
+        plans = {}
+        for name, queries in ROUTE_QUERIES.items():
+            try:
+                plans[name] = await check_query_plans(database[name], queries)
+            except IndexCheckError as e:
+                print(f"FAIL on {name}: {e}")
+                return 1
+        for name, checked in plans.items():
+            for label, stages in checked.items():
+                print(f"OK   {name} {label}: {' <- '.join(stages)}")
+        return 0
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(_main(create="--check" not in sys.argv[1:])))
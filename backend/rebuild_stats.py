@@ -0,0 +1,27 @@
+"""Recompute the materialized /api/stats document from the movie catalog.
+
+    python rebuild_stats.py
+
+Prints the fields that had drifted and exits with status 1 if there were any.
+"""
+import asyncio
+import sys
+
+from server import rebuild_stats, storage
+
+
+async def main() -> int:
+    try:
+        await storage.setup()
+        result = await rebuild_stats()
+    finally:
+        storage.close()
+
+    print(f"Rebuilt stats for {result['total']} titles")
+    for path, values in result["drift"].items():
+        print(f"DRIFT {path}: stored={values['stored']} actual={values['actual']}")
+    return 1 if result["drift"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
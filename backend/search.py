@@ -0,0 +1,155 @@
+"""In-process full-text search and title autocomplete.
+
+An inverted index over title, genre and description ranks matches with
+BM25, with title and genre hits weighted above description hits. Title
+prefixes are served from sorted arrays searched with bisect. Both are
+updated one movie at a time as movies are written, so queries never touch
+Mongo; a full load appends in bulk and sorts the arrays once.
+
+Like the rating matrix, the index is per process.
+"""
+import heapq
+import math
+import re
+import unicodedata
+from bisect import bisect_left, insort
+from collections import defaultdict
+from typing import Any, Dict, List, Tuple
+
+# Term frequency weight of each indexed field
+FIELD_WEIGHTS = {"title": 3.0, "genre": 2.0, "description": 1.0}
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+_WORD = re.compile(r"\w+")
+
+
+def normalize(text: str) -> str:
+    """Case- and accent-insensitive form of a text"""
+    if text.isascii():
+        # Nothing to decompose
+        return text.lower()
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def tokenize(text: str) -> List[str]:
+    return _WORD.findall(normalize(text))
+
+
+class SearchIndex:
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._postings: Dict[str, Dict[str, float]] = defaultdict(dict)
+        self._doc_terms: Dict[str, Dict[str, float]] = {}
+        self._doc_length: Dict[str, float] = {}
+        self._total_length = 0.0
+        self._titles: Dict[str, str] = {}
+        # Sorted (normalized title, id) and (title word, id) pairs for prefix lookups
+        self._title_keys: List[Tuple[str, str]] = []
+        self._word_keys: List[Tuple[str, str]] = []
+        self._unsorted = False
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def upsert(self, movie: Dict[str, Any], bulk: bool = False):
+        """Index a movie; in bulk mode its prefix keys are sorted in by the next resort()"""
+        movie_id = movie['id']
+        self.remove(movie_id)
+
+        terms: Dict[str, float] = defaultdict(float)
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(movie.get(field) or ""):
+                terms[token] += weight
+        for term, frequency in terms.items():
+            self._postings[term][movie_id] = frequency
+        self._doc_terms[movie_id] = dict(terms)
+        self._doc_length[movie_id] = sum(terms.values())
+        self._total_length += self._doc_length[movie_id]
+
+        title = movie['title']
+        self._titles[movie_id] = title
+        add = list.append if bulk else insort
+        add(self._title_keys, (normalize(title), movie_id))
+        for word in set(tokenize(title)):
+            add(self._word_keys, (word, movie_id))
+        self._unsorted = self._unsorted or bulk
+
+    def resort(self):
+        if self._unsorted:
+            self._title_keys.sort()
+            self._word_keys.sort()
+            self._unsorted = False
+
+    def remove(self, movie_id: str):
+        terms = self._doc_terms.pop(movie_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings[term]
+            postings.pop(movie_id, None)
+            if not postings:
+                del self._postings[term]
+        self._total_length -= self._doc_length.pop(movie_id)
+
+        # The prefix keys are found by bisection
+        self.resort()
+        title = self._titles.pop(movie_id)
+        self._discard(self._title_keys, (normalize(title), movie_id))
+        for word in set(tokenize(title)):
+            self._discard(self._word_keys, (word, movie_id))
+
+    @staticmethod
+    def _discard(keys: List[Tuple[str, str]], key: Tuple[str, str]):
+        position = bisect_left(keys, key)
+        if position < len(keys) and keys[position] == key:
+            del keys[position]
+
+    def search(self, query: str, limit: int = 20) -> List[Tuple[str, float]]:
+        """Movie ids ranked by BM25 score for the query terms"""
+        count = len(self._doc_terms)
+        if not count:
+            return []
+        average_length = self._total_length / count
+
+        scores: Dict[str, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for movie_id, frequency in postings.items():
+                length_norm = 1 - B + B * self._doc_length[movie_id] / average_length
+                scores[movie_id] += idf * frequency * (K1 + 1) / (frequency + K1 * length_norm)
+
+        # Only the page is ordered, however many titles match
+        ranked = heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], self._titles[item[0]]))
+        return [(movie_id, round(score, 4)) for movie_id, score in ranked]
+
+    @staticmethod
+    def _prefixed(keys: List[Tuple[str, str]], prefix: str):
+        position = bisect_left(keys, (prefix, ""))
+        while position < len(keys) and keys[position][0].startswith(prefix):
+            yield keys[position][1]
+            position += 1
+
+    def autocomplete(self, prefix: str, limit: int = 10) -> List[Dict[str, str]]:
+        """Titles starting with the prefix, then titles with a word starting with it"""
+        prefix = normalize(prefix).strip()
+        if not prefix:
+            return []
+        suggestions, seen = [], set()
+        for keys in (self._title_keys, self._word_keys):
+            for movie_id in self._prefixed(keys, prefix):
+                if movie_id in seen:
+                    continue
+                seen.add(movie_id)
+                suggestions.append({"id": movie_id, "title": self._titles[movie_id]})
+                if len(suggestions) >= limit:
+                    return suggestions
+        return suggestions
@@ -1,23 +1,39 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, Body, Header, HTTPException, Query, Request, Response
 from dotenv import load_dotenv
+from fastapi.responses import StreamingResponse
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+import orjson
 import os
+import asyncio
 import logging
+import math
+import time
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict
+from pydantic import BaseModel, Field, ValidationError, field_validator
+from typing import Any, AsyncIterator, Callable, List, Optional, Dict, Tuple, Union
 import uuid
-from datetime import datetime
+import base64
+import hashlib
+import json
+import zlib
+from datetime import datetime, timedelta
 from enum import Enum
 
+from analytics import RatingMatrix
+from cache import ResponseCache
+from catalog_io import RowError, iter_rows
+from search import SearchIndex
+from storage import WriteConflictError, create_storage
+from storage.base import increment_path, natural_key
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Read cache for list/detail/stats responses, invalidated by movie writes
+response_cache = ResponseCache(
+    max_entries=int(os.environ.get('CACHE_MAX_ENTRIES', 1024)),
+    ttl_seconds=float(os.environ.get('CACHE_TTL_SECONDS', 30)),
+)
 
 # Create the main app without a prefix
 app = FastAPI()
@@ -41,6 +57,11 @@ class StreamingPlatform(str, Enum):
     YOUTUBE = "YouTube"
     OTHER = "Other"
 
+class JobStatus(str, Enum):
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
 # Models
 class RatingCategories(BaseModel):
     story: float = Field(..., ge=0, le=10, description="Story rating (0-10)")
@@ -51,6 +72,8 @@ class RatingCategories(BaseModel):
     action_stunts: float = Field(..., ge=0, le=10, description="Action & Stunts rating (0-10)")
     emotional_impact: float = Field(..., ge=0, le=10, description="Emotional Impact rating (0-10)")
 
+RATING_CATEGORIES = list(RatingCategories.model_fields)
+
 class MovieTVShow(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     title: str = Field(..., min_length=1, max_length=200)
@@ -64,6 +87,13 @@ class MovieTVShow(BaseModel):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
+# Stored fields a movie read returns; documents also carry internal state (the
+# community rating aggregates) that the trusted orjson responses must not leak
+MOVIE_FIELDS = tuple(MovieTVShow.model_fields)
+
+class WeightedMovieTVShow(MovieTVShow):
+    weighted_score: float
+
 class MovieTVShowCreate(BaseModel):
     title: str = Field(..., min_length=1, max_length=200)
     content_type: ContentType
@@ -82,6 +112,91 @@ class MovieTVShowUpdate(BaseModel):
     description: Optional[str] = Field(None, max_length=1000)
     ratings: Optional[RatingCategories] = None
 
+    # Fields can be left out to keep them; only description can be cleared with null
+    @field_validator("title", "content_type", "year", "genre", "streaming_platform", "ratings", mode="before")
+    @classmethod
+    def reject_null(cls, value: Any) -> Any:
+        if value is None:
+            raise ValueError("cannot be null, leave the field out to keep its value")
+        return value
+
+class RatingCategoriesPatch(BaseModel):
+    story: Optional[float] = Field(None, ge=0, le=10)
+    acting: Optional[float] = Field(None, ge=0, le=10)
+    direction: Optional[float] = Field(None, ge=0, le=10)
+    music_sound: Optional[float] = Field(None, ge=0, le=10)
+    cinematography: Optional[float] = Field(None, ge=0, le=10)
+    action_stunts: Optional[float] = Field(None, ge=0, le=10)
+    emotional_impact: Optional[float] = Field(None, ge=0, le=10)
+
+class MovieTVShowPatch(MovieTVShowUpdate):
+    ratings: Optional[RatingCategoriesPatch] = None
+
+class BulkItemResult(BaseModel):
+    index: int
+    status: str  # "created", "invalid" or "failed"
+    id: Optional[str] = None
+    error: Optional[str] = None
+
+class BulkCreateResponse(BaseModel):
+    created: int
+    failed: int
+    results: List[BulkItemResult]
+
+class ImportRowError(BaseModel):
+    line: int
+    error: str
+
+class ImportReport(BaseModel):
+    processed: int = 0
+    created: int = 0
+    updated: int = 0
+    skipped: int = 0
+    invalid: int = 0
+    failed: int = 0
+    errors: List[ImportRowError] = []
+    errors_truncated: bool = False
+    elapsed_seconds: float = 0
+    rows_per_second: float = 0
+
+class RatingEventCreate(BaseModel):
+    user_id: str = Field(..., min_length=1, max_length=100)
+    ratings: RatingCategoriesPatch
+
+class RatingEvent(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    movie_id: str
+    user_id: str
+    ratings: Dict[str, float]
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    # Set once the event's values are in the movie's community aggregates
+    applied: bool = False
+
+class CategoryAggregate(BaseModel):
+    count: int
+    mean: Optional[float] = None
+    variance: Optional[float] = None
+    stddev: Optional[float] = None
+
+class CommunityRatings(BaseModel):
+    movie_id: str
+    categories: Dict[str, CategoryAggregate]
+
+class Job(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    kind: str
+    status: JobStatus = JobStatus.RUNNING
+    batch_size: int
+    pause_seconds: float
+    total: int = 0
+    processed: int = 0
+    modified: int = 0
+    last_id: Optional[str] = None  # Checkpoint: batches walk the catalog in id order
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+
 # Helper function to calculate overall rating
 def calculate_overall_rating(ratings: RatingCategories) -> float:
     """Calculate overall rating as average of all category ratings"""
@@ -90,6 +205,232 @@ def calculate_overall_rating(ratings: RatingCategories) -> float:
              ratings.action_stunts + ratings.emotional_impact)
     return round(total / 7, 1)
 
+# Storage engine: STORAGE_BACKEND is mongo (default), memory or sqlite, see storage/
+storage = create_storage(
+    os.environ.get('STORAGE_BACKEND', 'mongo'),
+    lambda ratings: calculate_overall_rating(RatingCategories(**ratings)),
+    mongo_url=os.environ.get('MONGO_URL'),
+    db_name=os.environ.get('DB_NAME'),
+    sqlite_path=os.environ.get('SQLITE_PATH'),
+)
+
+def build_movie(movie_data: MovieTVShowCreate) -> MovieTVShow:
+    """Build the stored movie object for a create payload"""
+    movie_dict = movie_data.dict()
+    movie_dict['overall_rating'] = calculate_overall_rating(movie_data.ratings)
+    return MovieTVShow(**movie_dict)
+
+def format_validation_error(error: ValidationError) -> str:
+    """Flatten a pydantic validation error into a single readable line"""
+    return "; ".join(
+        f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in error.errors()
+    )
+
+# Bulk writes are split into chunks to bound the size of each insert_many command
+BULK_INSERT_CHUNK_SIZE = 1000
+MAX_BULK_ITEMS = 10000
+
+async def insert_movies(movies: List[MovieTVShow]) -> Dict[int, str]:
+    """Insert movies in chunks, each written independently of the others.
+
+    Returns the errors keyed by position in `movies`; positions not in the
+    result were written.
+    """
+    errors = {}
+    for start in range(0, len(movies), BULK_INSERT_CHUNK_SIZE):
+        chunk = movies[start:start + BULK_INSERT_CHUNK_SIZE]
+        try:
+            chunk_errors = await storage.movies.insert_many([movie.dict() for movie in chunk])
+            errors.update({start + index: message for index, message in chunk_errors.items()})
+        except Exception as e:
+            # The outcome of the chunk is unknown, report every item in it
+            for offset in range(len(chunk)):
+                errors[start + offset] = str(e)
+    
+    await on_movies_changed([
+        (None, movie.dict()) for index, movie in enumerate(movies) if index not in errors
+    ])
+    return errors
+
+# Trusted read path. Movie documents are only written through MovieTVShow, so
+# reads skip re-validating them: the raw documents are encoded straight to
+# JSON bytes with orjson, and those bytes are what gets cached.
+
+def json_response(body: bytes, headers: Optional[Dict[str, str]] = None) -> Response:
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def movie_filter(platform: Optional[StreamingPlatform] = None,
+                 content_type: Optional[ContentType] = None) -> Dict:
+    """Equality filters for the platform/content_type query parameters shared by the list routes"""
+    query = {}
+    if platform:
+        query['streaming_platform'] = platform
+    if content_type:
+        query['content_type'] = content_type
+    return query
+
+# Sparse fieldsets: the requested fields become the storage projection
+def parse_fields(fields: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """Validate a comma-separated field list, returned in model order with `id` included"""
+    if not fields:
+        return None
+    names = {name.strip() for name in fields.split(',') if name.strip()}
+    unknown = names - set(MOVIE_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    names.add('id')
+    return tuple(name for name in MOVIE_FIELDS if name in names)
+
+# Streaming imports: rows are validated as they are parsed and written in
+# batches, with at most IMPORT_CONCURRENCY batches in flight. Parsing waits for
+# a free slot, which in turn stops reading the upload, so memory stays bounded.
+IMPORT_BATCH_SIZE = 500
+IMPORT_CONCURRENCY = 4
+MAX_REPORTED_ERRORS = 100
+
+# Fields a movie replaced by an upsert keeps from its stored version; the community
+# aggregates stay in step with the rating events, which an upsert leaves in place
+UPSERT_KEPT_FIELDS = ("id", "created_at", "community_ratings")
+
+async def upsert_movies(movies: List[MovieTVShow]) -> Tuple[Dict[int, str], Dict[int, str]]:
+    """Insert movies, or replace the existing movie with the same title, year and platform.
+
+    A replaced movie keeps its UPSERT_KEPT_FIELDS. Returns (errors, outcomes)
+    keyed by position in `movies`, where outcomes are "created", "updated" or
+    "skipped" (superseded by a later movie with the same key in `movies`).
+    Outcomes and stats deltas come from what each write actually replaced.
+    """
+    errors, outcomes = {}, {}
+    documents = [movie.dict() for movie in movies]
+    latest = {}
+    for index, document in enumerate(documents):
+        key = natural_key(document)
+        if key in latest:
+            outcomes[latest[key]] = "skipped"
+        latest[key] = index
+    
+    positions = list(latest.values())
+    write_errors, replaced = await storage.movies.replace_by_natural_key(
+        [documents[index] for index in positions], UPSERT_KEPT_FIELDS
+    )
+    
+    written = []
+    for offset, index in enumerate(positions):
+        if offset in write_errors:
+            errors[index] = write_errors[offset]
+            continue
+        before, after = replaced.get(offset), documents[index]
+        if before:
+            after.update({field: before[field] for field in UPSERT_KEPT_FIELDS if field in before})
+        outcomes[index] = "updated" if before else "created"
+        written.append((before, after))
+    await on_movies_changed(written)
+    return errors, outcomes
+
+async def import_movies(
+    rows: AsyncIterator[Tuple[int, Any]],
+    upsert: bool = False,
+    batch_size: int = IMPORT_BATCH_SIZE,
+    concurrency: int = IMPORT_CONCURRENCY,
+    on_progress: Optional[Callable[[ImportReport], None]] = None
+) -> ImportReport:
+    """Validate and write parsed (line, row) pairs, see catalog_io.
+
+    With `upsert` the batches are written one at a time, whatever
+    `concurrency` says: rows sharing a natural key may sit in different
+    batches, and as the key is not unique in storage, batches written
+    concurrently could each insert it.
+    """
+    if upsert:
+        concurrency = 1
+    report = ImportReport()
+    started = time.monotonic()
+    slots = asyncio.Semaphore(concurrency)
+    in_flight = set()
+    
+    def add_error(line: int, message: str):
+        if len(report.errors) < MAX_REPORTED_ERRORS:
+            report.errors.append(ImportRowError(line=line, error=message))
+        else:
+            report.errors_truncated = True
+    
+    async def write(batch: List[Tuple[int, MovieTVShow]]):
+        movies = [movie for _, movie in batch]
+        try:
+            if upsert:
+                errors, outcomes = await upsert_movies(movies)
+            else:
+                errors = await insert_movies(movies)
+                outcomes = {index: "created" for index in range(len(movies)) if index not in errors}
+        except Exception as e:
+            errors, outcomes = {index: str(e) for index in range(len(movies))}, {}
+        finally:
+            slots.release()
+        
+        for index, (line, _) in enumerate(batch):
+            if index in errors:
+                report.failed += 1
+                add_error(line, errors[index])
+            else:
+                outcome = outcomes[index]
+                setattr(report, outcome, getattr(report, outcome) + 1)
+        if on_progress:
+            on_progress(report)
+    
+    async def flush(batch: List[Tuple[int, MovieTVShow]]):
+        await slots.acquire()
+        task = asyncio.create_task(write(batch))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+    
+    batch = []
+    async for line, row in rows:
+        report.processed += 1
+        if isinstance(row, RowError):
+            report.invalid += 1
+            add_error(line, row.message)
+            continue
+        try:
+            batch.append((line, build_movie(MovieTVShowCreate(**row))))
+        except ValidationError as e:
+            report.invalid += 1
+            add_error(line, format_validation_error(e))
+            continue
+        if len(batch) >= batch_size:
+            await flush(batch)
+            batch = []
+    if batch:
+        await flush(batch)
+    await asyncio.gather(*in_flight)
+    
+    report.errors.sort(key=lambda error: error.line)
+    report.elapsed_seconds = round(time.monotonic() - started, 3)
+    if report.elapsed_seconds > 0:
+        report.rows_per_second = round(report.processed / report.elapsed_seconds, 1)
+    return report
+
+# Keyset pagination: the cursor is the (created_at, id) of the last item of a page,
+# matching LIST_SORT so the next page is a bounded index range scan in every engine.
+
+def encode_cursor(movie: Dict) -> str:
+    """Encode the sort key of a movie document as an opaque page cursor"""
+    payload = json.dumps([movie['created_at'].isoformat(), movie['id']], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Decode a page cursor back into its (created_at, id) sort key"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, movie_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        created_at = datetime.fromisoformat(created_at)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # Stored timestamps are naive UTC and every cursor we issue is too; an offset
+    # could not be compared with them by the memory and SQLite engines
+    if created_at.tzinfo is not None:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return created_at, str(movie_id)
+
 # Seed Data - Popular Movies and TV Shows
 SEED_DATA = [
     # Netflix Movies
@@ -306,27 +647,414 @@ async def seed_database():
     """Seed the database with popular movies and TV shows"""
     try:
         # Check if data already exists
-        existing_count = await db.movies.count_documents({})
+        existing_count = await storage.movies.count()
         if existing_count > 0:
             return {"message": f"Database already contains {existing_count} movies"}
         
-        # Add seed data
-        for item in SEED_DATA:
-            # Calculate overall rating
-            overall_rating = calculate_overall_rating(RatingCategories(**item['ratings']))
-            
-            # Create movie object
-            movie_dict = item.copy()
-            movie_dict['overall_rating'] = overall_rating
-            movie_obj = MovieTVShow(**movie_dict)
-            
-            # Insert into database
-            await db.movies.insert_one(movie_obj.dict())
+        # Add seed data in one batch
+        movies = [build_movie(MovieTVShowCreate(**item)) for item in SEED_DATA]
+        errors = await insert_movies(movies)
+        if errors:
+            return {"error": f"Error seeding database: {len(errors)} of {len(movies)} items failed to insert"}
         
         return {"message": f"Successfully seeded database with {len(SEED_DATA)} movies and TV shows"}
     except Exception as e:
         return {"error": f"Error seeding database: {str(e)}"}
 
+# Rating analytics (analytics.py) and full-text search (search.py) run on
+# in-memory indexes of the catalog. Both are filled by one background scan at
+# startup; writes made while it runs are replayed once it is done, later writes
+# update the indexes directly.
+rating_matrix = RatingMatrix(
+    RATING_CATEGORIES, [p.value for p in StreamingPlatform], [t.value for t in ContentType]
+)
+search_index = SearchIndex()
+MEMORY_INDEXES = (rating_matrix, search_index)
+MEMORY_INDEX_FIELDS = (
+    "id", "ratings", "streaming_platform", "content_type", "title", "genre", "description",
+)
+MEMORY_INDEX_LOAD_BATCH_SIZE = 5000
+_memory_index_load: Optional[asyncio.Task] = None
+# Updates of writes made during the load, replayed in order once it is done
+_memory_index_backlog: List[Callable[[], None]] = []
+
+def apply_memory_index_change(before: Optional[Dict], after: Optional[Dict]):
+    for index in MEMORY_INDEXES:
+        if after is not None:
+            index.upsert(after)
+        elif before is not None:
+            index.remove(before['id'])
+
+def apply_memory_index_delete(platform: Optional[str], content_type: Optional[str]):
+    """Drop the titles of a filtered bulk delete, found by their rows in the rating matrix"""
+    if platform is None and content_type is None:
+        for index in MEMORY_INDEXES:
+            index.clear()
+        return
+    for movie_id in rating_matrix.select(rating_matrix.mask(platform, content_type)):
+        for index in MEMORY_INDEXES:
+            index.remove(movie_id)
+
+async def load_memory_indexes():
+    _memory_index_backlog.clear()
+    for index in MEMORY_INDEXES:
+        index.clear()
+    async for movie in storage.movies.scan(fields=MEMORY_INDEX_FIELDS, batch_size=MEMORY_INDEX_LOAD_BATCH_SIZE):
+        rating_matrix.upsert(movie)
+        search_index.upsert(movie, bulk=True)
+    # Sorting the title prefixes once keeps the load linear in the catalog size
+    search_index.resort()
+    for update in _memory_index_backlog:
+        update()
+    _memory_index_backlog.clear()
+    logger.info("Loaded in-memory indexes with %d titles", len(rating_matrix))
+
+def start_memory_index_load():
+    global _memory_index_load
+    _memory_index_load = asyncio.create_task(load_memory_indexes())
+
+async def wait_for_memory_indexes():
+    """Wait for the initial load of the in-memory indexes (or retry a failed one)"""
+    if _memory_index_load is None or (_memory_index_load.done() and _memory_index_load.exception()):
+        start_memory_index_load()
+    await asyncio.shield(_memory_index_load)
+
+async def get_rating_matrix() -> RatingMatrix:
+    await wait_for_memory_indexes()
+    return rating_matrix
+
+async def get_search_index() -> SearchIndex:
+    await wait_for_memory_indexes()
+    return search_index
+
+def record_memory_index_update(update: Callable[[], None]):
+    """Apply an update for committed movie writes to the in-memory indexes (queued while they load).
+
+    The storage write has already happened, so a failure here does not fail the
+    request: it is logged and the indexes are reloaded from storage.
+    """
+    if _memory_index_load is None:
+        return
+    if not _memory_index_load.done():
+        _memory_index_backlog.append(update)
+    elif not _memory_index_load.exception():
+        try:
+            update()
+        except Exception:
+            logger.exception("Updating the in-memory indexes failed, reloading them")
+            start_memory_index_load()
+
+def record_memory_index_changes(changes: List[Tuple[Optional[Dict], Optional[Dict]]]):
+    def update():
+        for before, after in changes:
+            apply_memory_index_change(before, after)
+    record_memory_index_update(update)
+
+# Materialized catalog stats. A single document in the `stats` store holds the
+# counters and rating sums behind /api/stats; every movie write applies its
+# delta to it with one atomic increment, so reading stats never scans the catalog.
+STATS_ID = "catalog"
+STATS_SECTIONS = ("content_types", "platforms", "genres", "years")
+
+# Rating histograms, kept in the same document as
+# histograms.<platform>.<category>.<bucket>: 20 buckets of width 0.5 over 0-10,
+# with a perfect 10 counted in the last one
+HISTOGRAM_BUCKET_WIDTH = 0.5
+HISTOGRAM_BUCKETS = 20
+HISTOGRAM_CATEGORIES = RATING_CATEGORIES + ["overall"]
+
+def histogram_bucket(score: float) -> int:
+    return min(HISTOGRAM_BUCKETS - 1, int(score / HISTOGRAM_BUCKET_WIDTH))
+
+def histogram_bucket_expression(field: str) -> Dict:
+    """Aggregation counterpart of histogram_bucket"""
+    return {"$min": [HISTOGRAM_BUCKETS - 1, {"$floor": {"$divide": [f"${field}", HISTOGRAM_BUCKET_WIDTH]}}]}
+
+def _value(value: Any) -> Any:
+    """Plain value of an enum member, as stored in Mongo"""
+    return value.value if isinstance(value, Enum) else value
+
+def _stats_key(value: Any) -> str:
+    """Encode a value for use as a field name ('.' and a leading '$' are not allowed)"""
+    key = str(_value(value)).replace('.', '\uff0e')
+    return '\uff04' + key[1:] if key.startswith('$') else key
+
+def _stats_value(key: str) -> str:
+    """Decode a field name produced by _stats_key"""
+    key = key.replace('\uff0e', '.')
+    return '$' + key[1:] if key.startswith('\uff04') else key
+
+def stats_delta(before: Optional[Dict], after: Optional[Dict]) -> Dict[str, float]:
+    """$inc document turning stats that include `before` into stats that include `after`"""
+    inc: Dict[str, float] = {}
+    for movie, sign in ((before, -1), (after, 1)):
+        if movie is None:
+            continue
+        inc["total"] = inc.get("total", 0) + sign
+        fields = {
+            "content_types": movie['content_type'],
+            "platforms": movie['streaming_platform'],
+            "genres": movie['genre'],
+            "years": movie['year'],
+        }
+        for section, value in fields.items():
+            path = f"{section}.{_stats_key(value)}"
+            inc[path] = inc.get(path, 0) + sign
+        ratings = movie['ratings']
+        ratings = ratings if isinstance(ratings, dict) else ratings.dict()
+        for category in RATING_CATEGORIES:
+            path = f"rating_sums.{category}"
+            inc[path] = inc.get(path, 0) + sign * ratings[category]
+        inc["rating_sums.overall"] = inc.get("rating_sums.overall", 0) + sign * movie['overall_rating']
+        
+        scores = {**{category: ratings[category] for category in RATING_CATEGORIES}, "overall": movie['overall_rating']}
+        platform = _stats_key(movie['streaming_platform'])
+        for category, score in scores.items():
+            path = f"histograms.{platform}.{category}.{histogram_bucket(score)}"
+            inc[path] = inc.get(path, 0) + sign
+    return {path: amount for path, amount in inc.items() if amount != 0}
+
+async def on_movies_changed(changes: List[Tuple[Optional[Dict], Optional[Dict]]]):
+    """Apply the side effects of movie writes, given (before, after) document pairs.
+
+    `before` is None for inserts and `after` is None for deletes.
+    """
+    if not changes:
+        return
+    
+    # Any write can move items across list pages and stats, so those are dropped
+    # wholesale, before the version moves: list and stats entries are keyed by the
+    # version they were built at, so one built in between is never served under
+    # the new version
+    response_cache.invalidate("movies")
+    response_cache.invalidate("top")
+    response_cache.invalidate("stats")
+    for before, after in changes:
+        response_cache.invalidate("movie", movie_id=(before or after)['id'])
+    
+    # The version counter backs the ETags of list and stats responses
+    inc: Dict[str, float] = {"version": 1}
+    for before, after in changes:
+        for path, amount in stats_delta(before, after).items():
+            inc[path] = inc.get(path, 0) + amount
+    await storage.stats.update(STATS_ID, inc=inc, upsert=True)
+    
+    record_memory_index_changes(changes)
+
+def build_stats_pipeline(query: Dict, histograms: bool = False) -> List[Dict]:
+    """Aggregation computing every stats section in a single pass over the matched movies"""
+    rating_sums = {category: {"$sum": f"$ratings.{category}"} for category in RATING_CATEGORIES}
+    rating_sums["overall"] = {"$sum": "$overall_rating"}
+    facets = {
+        **{
+            section: [{"$group": {"_id": f"${field}", "count": {"$sum": 1}}}]
+            for section, field in zip(
+                STATS_SECTIONS, ("content_type", "streaming_platform", "genre", "year")
+            )
+        },
+        "rating_sums": [{"$group": {"_id": None, "total": {"$sum": 1}, **rating_sums}}],
+    }
+    if histograms:
+        fields = {category: f"ratings.{category}" for category in RATING_CATEGORIES}
+        fields["overall"] = "overall_rating"
+        for category, field in fields.items():
+            facets[f"histogram_{category}"] = [{"$group": {
+                "_id": {"platform": "$streaming_platform", "bucket": histogram_bucket_expression(field)},
+                "count": {"$sum": 1},
+            }}]
+    return [{"$match": query}, {"$facet": facets}]
+
+STATS_FIELDS = ("content_type", "streaming_platform", "genre", "year", "ratings", "overall_rating")
+
+async def fold_stats_document(query: Dict, histograms: bool = False) -> Dict:
+    """Compute the stats document by summing the stats delta of every matched movie"""
+    document = {
+        "_id": STATS_ID,
+        "total": 0,
+        **{section: {} for section in STATS_SECTIONS},
+        "rating_sums": {category: 0 for category in HISTOGRAM_CATEGORIES},
+    }
+    if histograms:
+        document["histograms"] = {}
+    async for movie in storage.movies.scan(query, fields=STATS_FIELDS):
+        for path, amount in stats_delta(None, movie).items():
+            if histograms or not path.startswith("histograms."):
+                increment_path(document, path, amount)
+    return document
+
+async def compute_stats_document(query: Dict, histograms: bool = False) -> Dict:
+    """Compute the stats document for the movies matching `query` in a single pass"""
+    if not storage.native_aggregation:
+        return await fold_stats_document(query, histograms)
+    result = await storage.movies.aggregate(build_stats_pipeline(query, histograms))
+    facets = result[0]
+    sums = facets["rating_sums"][0] if facets["rating_sums"] else {}
+    document = {"_id": STATS_ID, "total": sums.get("total", 0)}
+    for section in STATS_SECTIONS:
+        document[section] = {_stats_key(item["_id"]): item["count"] for item in facets[section]}
+    document["rating_sums"] = {
+        category: sums.get(category, 0) for category in RATING_CATEGORIES + ["overall"]
+    }
+    if histograms:
+        document["histograms"] = {}
+        for category in HISTOGRAM_CATEGORIES:
+            for item in facets[f"histogram_{category}"]:
+                platform = document["histograms"].setdefault(_stats_key(item["_id"]["platform"]), {})
+                platform.setdefault(category, {})[str(int(item["_id"]["bucket"]))] = item["count"]
+    return document
+
+def format_stats(document: Optional[Dict]) -> Dict:
+    """Build the /api/stats response from a stats document"""
+    document = document or {}
+    total = document.get("total", 0)
+    
+    def distribution(section, sort_key=lambda item: (-item["count"], item["_id"])):
+        items = [
+            {"_id": _stats_value(key), "count": count}
+            for key, count in document.get(section, {}).items() if count > 0
+        ]
+        return sorted(items, key=sort_key)
+    
+    type_counts = document.get("content_types", {})
+    total_movies = type_counts.get(ContentType.MOVIE.value, 0)
+    total_tv_shows = type_counts.get(ContentType.TV_SERIES.value, 0)
+    
+    years = distribution("years", sort_key=lambda item: item["_id"])
+    for item in years:
+        item["_id"] = int(item["_id"])
+    
+    sums = document.get("rating_sums", {})
+    average_ratings = {
+        category: round(sums.get(category, 0) / total, 2) if total > 0 else None
+        for category in RATING_CATEGORIES + ["overall"]
+    }
+    
+    return {
+        "total_movies": total_movies,
+        "total_tv_shows": total_tv_shows,
+        "total_content": total_movies + total_tv_shows,
+        "platform_distribution": distribution("platforms"),
+        "genre_distribution": distribution("genres"),
+        "year_distribution": years,
+        "average_ratings": average_ratings
+    }
+
+def _flatten(document: Dict, prefix: str = "") -> Dict[str, Any]:
+    flat = {}
+    for key, value in document.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+async def rebuild_stats() -> Dict:
+    """Recompute the materialized stats from the movie catalog.
+
+    Returns the fields whose stored value drifted from the recomputed one.
+    Writes landing while the aggregation runs may be missed; run it again
+    in a quiet period if it reports drift.
+    """
+    stored = await storage.stats.get(STATS_ID) or {}
+    actual = await compute_stats_document({}, histograms=True)
+    
+    stored_flat, actual_flat = _flatten(stored), _flatten(actual)
+    drift = {}
+    for path in sorted((set(stored_flat) | set(actual_flat)) - {"_id", "version"}):
+        stored_value, actual_value = stored_flat.get(path, 0), actual_flat.get(path, 0)
+        if not math.isclose(stored_value, actual_value, rel_tol=1e-9, abs_tol=1e-6):
+            drift[path] = {"stored": stored_value, "actual": actual_value}
+    
+    # Bump the version so clients holding pre-rebuild stats refetch them
+    actual["version"] = stored.get("version", 0) + 1
+    response_cache.invalidate("stats")
+    await storage.stats.replace(STATS_ID, actual)
+    return {"total": actual["total"], "drift": drift}
+
+# Background jobs. Progress is checkpointed to the `jobs` store after every
+# batch, so a job interrupted by a restart resumes where it stopped.
+RECOMPUTE_OVERALL_JOB = "recompute_overall"
+RECOMPUTE_BATCH_SIZE = int(os.environ.get('RECOMPUTE_BATCH_SIZE', 500))
+RECOMPUTE_PAUSE_SECONDS = float(os.environ.get('RECOMPUTE_PAUSE_SECONDS', 0.05))
+_job_tasks: Dict[str, asyncio.Task] = {}
+
+async def run_recompute_overall(job: Dict):
+    """Recompute the stored overall_rating of every movie, one batch of ids at a time.
+
+    The changed movies of each batch go through on_movies_changed like any other
+    write, so the overall rating sums and histograms of the materialized stats
+    move by $inc alongside concurrent writes. After each batch the job sleeps
+    for at least as long as the batch took, keeping its share of the database
+    at or below half while live traffic runs.
+    """
+    job_id = job['id']
+    try:
+        while True:
+            started = time.monotonic()
+            ids = await storage.movies.ids_after(job['last_id'], job['batch_size'])
+            if not ids:
+                break
+            
+            changes = await storage.movies.recompute_overall(ids)
+            await on_movies_changed(changes)
+            
+            job['last_id'] = ids[-1]
+            job['processed'] += len(ids)
+            job['modified'] += len(changes)
+            job['updated_at'] = datetime.utcnow()
+            await storage.jobs.update(job_id, set={
+                key: job[key] for key in ("last_id", "processed", "modified", "updated_at")
+            })
+            await asyncio.sleep(max(job['pause_seconds'], time.monotonic() - started))
+        
+        status, error = JobStatus.COMPLETED, None
+    except asyncio.CancelledError:
+        # Left as running so the next startup resumes it
+        raise
+    except Exception as e:
+        logger.exception("Job %s failed", job_id)
+        status, error = JobStatus.FAILED, str(e)
+    finally:
+        _job_tasks.pop(job_id, None)
+    
+    now = datetime.utcnow()
+    await storage.jobs.update(job_id, set={
+        "status": status.value, "error": error, "updated_at": now, "finished_at": now,
+    })
+
+def start_job(job: Dict):
+    _job_tasks[job['id']] = asyncio.create_task(run_recompute_overall(job))
+
+async def resume_jobs():
+    """Restart jobs left running by a previous process"""
+    for job in await storage.jobs.find(status=JobStatus.RUNNING.value, kind=RECOMPUTE_OVERALL_JOB):
+        if job['id'] not in _job_tasks:
+            logger.info("Resuming job %s after %s", job['id'], job['last_id'])
+            start_job(job)
+
+# Conditional requests. Detail ETags derive from the movie's id and updated_at;
+# list and stats ETags derive from the catalog version kept in the stats document.
+def make_etag(*parts: Any) -> str:
+    """Strong ETag over the given parts"""
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header matches the current ETag"""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(',')]
+    # If-None-Match uses weak comparison, so a W/ prefix is ignored
+    return '*' in candidates or etag in (c[2:] if c.startswith('W/') else c for c in candidates)
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
+
+async def catalog_version() -> int:
+    """Current catalog version, bumped by every movie write"""
+    document = await storage.stats.get(STATS_ID, ["version"])
+    return document.get("version", 0) if document else 0
+
 # Routes
 @api_router.get("/")
 async def root():
@@ -341,96 +1069,532 @@ async def seed_data():
 async def create_movie(movie_data: MovieTVShowCreate):
     """Create a new movie or TV show with multi-category ratings"""
     try:
-        # Calculate overall rating
-        overall_rating = calculate_overall_rating(movie_data.ratings)
-        
-        # Create movie object
-        movie_dict = movie_data.dict()
-        movie_dict['overall_rating'] = overall_rating
-        movie_obj = MovieTVShow(**movie_dict)
+        # Create movie object with its overall rating
+        movie_obj = build_movie(movie_data)
         
         # Insert into database
-        result = await db.movies.insert_one(movie_obj.dict())
+        movie_doc = movie_obj.dict()
+        await storage.movies.insert(movie_doc)
+        await on_movies_changed([(None, movie_doc)])
         
         return movie_obj
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating movie: {str(e)}")
 
-@api_router.get("/movies", response_model=List[MovieTVShow])
+@api_router.post("/movies/bulk", response_model=BulkCreateResponse)
+async def create_movies_bulk(items: List[Any] = Body(...)):
+    """Create many movies/TV shows in one request.
+
+    Each item is validated on its own and the valid ones are written in
+    chunks where every item succeeds or fails alone, so a bad row only fails itself. Results are
+    returned in request order.
+    """
+    if len(items) > MAX_BULK_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_ITEMS} items per request")
+    
+    results = [BulkItemResult(index=index, status="invalid") for index in range(len(items))]
+    movies, positions = [], []
+    for index, item in enumerate(items):
+        try:
+            movie_obj = build_movie(MovieTVShowCreate(**item))
+        except ValidationError as e:
+            results[index].error = format_validation_error(e)
+            continue
+        except TypeError:
+            results[index].error = "Item must be an object"
+            continue
+        movies.append(movie_obj)
+        positions.append(index)
+    
+    errors = await insert_movies(movies)
+    for offset, (index, movie_obj) in enumerate(zip(positions, movies)):
+        if offset in errors:
+            results[index].status = "failed"
+            results[index].error = errors[offset]
+        else:
+            results[index].status = "created"
+            results[index].id = movie_obj.id
+    
+    created = sum(1 for result in results if result.status == "created")
+    return BulkCreateResponse(created=created, failed=len(results) - created, results=results)
+
+@api_router.post("/movies/import", response_model=ImportReport)
+async def import_movies_upload(
+    request: Request,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    upsert: bool = False
+):
+    """Import movies from an NDJSON or CSV request body, streamed as it arrives.
+
+    With upsert=true a row replaces the existing movie with the same title,
+    year and platform instead of adding a new one.
+    """
+    try:
+        return await import_movies(iter_rows(request.stream(), format), upsert=upsert)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error importing movies: {str(e)}")
+
+def parse_weights(weights: Optional[str]) -> Optional[Tuple[Tuple[str, float], ...]]:
+    """Parse `category:weight,...` into (category, weight) pairs normalized to sum to 1.
+
+    Categories left out weigh 0. The normalized, sorted pairs double as the
+    cache key, so `story:2,acting:2` and `acting:1,story:1` share an entry.
+    """
+    if weights is None:
+        return None
+    parsed: Dict[str, float] = {}
+    for item in weights.split(','):
+        category, separator, value = item.partition(':')
+        category = category.strip()
+        if category not in RATING_CATEGORIES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown weight category '{category}', expected any of: {', '.join(RATING_CATEGORIES)}"
+            )
+        try:
+            weight = float(value) if separator else float('nan')
+        except ValueError:
+            weight = float('nan')
+        if not weight >= 0 or weight == float('inf'):
+            raise HTTPException(status_code=400, detail=f"Weight of '{category}' must be a non-negative number")
+        parsed[category] = parsed.get(category, 0) + weight
+    
+    total = sum(parsed.values())
+    if total == 0:
+        raise HTTPException(status_code=400, detail="At least one weight must be positive")
+    return tuple(sorted((category, round(weight / total, 6)) for category, weight in parsed.items() if weight))
+
+# The movie lists are serialized straight from storage, so their shapes are
+# documented here instead of being validated by a response_model
+TOP_MOVIES_RESPONSES = {
+    200: {
+        "model": Union[List[MovieTVShow], List[WeightedMovieTVShow]],
+        "description": "Movies, best first; with `weights`, each with its `weighted_score`",
+    },
+}
+MOVIE_LIST_RESPONSES = {
+    200: {
+        "model": Union[List[MovieTVShow], List[WeightedMovieTVShow], List[Dict[str, Any]]],
+        "description": (
+            "Movies; with `weights`, each with its `weighted_score`; with `fields`, "
+            "objects holding only `id` and the selected fields"
+        ),
+    },
+}
+
+@api_router.get("/movies", response_model=None, responses=MOVIE_LIST_RESPONSES)
 async def get_movies(
     platform: Optional[StreamingPlatform] = None,
     content_type: Optional[ContentType] = None,
-    limit: int = 50
+    limit: int = Query(50, ge=1),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    weights: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None)
 ):
-    """Get movies/TV shows with optional filtering"""
+    """Get movies/TV shows with optional filtering, newest first.
+
+    Pages are linked by an opaque cursor: pass the X-Next-Cursor header of a
+    response as `cursor` to get the following page. The header is absent on
+    the last page.
+
+    `fields` is a comma-separated list of top-level fields to return (`id` is
+    always included); only those fields are read from storage and serialized.
+
+    `weights` (e.g. `story:3,action_stunts:1`) ranks by the weighted mean of
+    the rating categories instead, returned as `weighted_score`. Weighted
+    results are a single page and cannot be combined with `cursor`.
+    """
     try:
-        # Build query
-        query = {}
-        if platform:
-            query['streaming_platform'] = platform
-        if content_type:
-            query['content_type'] = content_type
-        
-        # Get movies from database
-        cursor = db.movies.find(query).limit(limit).sort("created_at", -1)
-        movies = await cursor.to_list(length=limit)
-        
-        return [MovieTVShow(**movie) for movie in movies]
+        selected = parse_fields(fields)
+        ranking = parse_weights(weights)
+        if ranking and cursor:
+            raise HTTPException(status_code=400, detail="weights cannot be combined with cursor")
+        # The version is read before the page and is part of the cache key, so a
+        # cached body is only ever served under the ETag of the version it was built at
+        cache_key = response_cache.make_key(
+            "movies", platform=platform, content_type=content_type, limit=limit, cursor=cursor,
+            fields=selected, weights=ranking, version=await catalog_version()
+        )
+        etag = make_etag(cache_key)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        
+        hit, page = response_cache.get(cache_key)
+        if not hit:
+            generation = response_cache.generation
+            
+            # Build query
+            query = movie_filter(platform, content_type)
+            after = decode_cursor(cursor) if cursor else None
+            
+            if ranking:
+                movies, next_cursor = await storage.movies.rank_weighted(query, ranking, limit, selected or MOVIE_FIELDS), None
+            else:
+                # The sort key is always read so the next cursor can be built
+                projection = ("created_at", *selected) if selected else MOVIE_FIELDS
+                
+                # Get movies from storage, one extra to know whether another page exists
+                movies = await storage.movies.find_page(query, limit + 1, after, projection)
+                
+                next_cursor = encode_cursor(movies[limit - 1]) if len(movies) > limit else None
+                movies = movies[:limit]
+                if selected and 'created_at' not in selected:
+                    for movie in movies:
+                        del movie['created_at']
+            
+            page = (orjson.dumps(movies), next_cursor)
+            response_cache.set(cache_key, page, generation)
+        
+        body, next_cursor = page
+        headers = {'ETag': etag}
+        if next_cursor:
+            headers['X-Next-Cursor'] = next_cursor
+        return json_response(body, headers)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving movies: {str(e)}")
 
+MAX_TOP_N = 100
+
+def ranking_field(category: str) -> str:
+    """Document field behind a leaderboard category (a rating category or "overall")"""
+    if category == "overall":
+        return "overall_rating"
+    if category in RATING_CATEGORIES:
+        return f"ratings.{category}"
+    raise HTTPException(
+        status_code=400,
+        detail=f"Unknown category '{category}', expected one of: overall, {', '.join(RATING_CATEGORIES)}"
+    )
+
+@api_router.get("/movies/top", response_model=None, responses=TOP_MOVIES_RESPONSES)
+async def get_top_movies(
+    category: str = "overall",
+    platform: Optional[StreamingPlatform] = None,
+    content_type: Optional[ContentType] = None,
+    n: int = Query(10, ge=1, le=MAX_TOP_N),
+    weights: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None)
+):
+    """Get the n best rated movies/TV shows in one category, optionally per platform/content type.
+
+    With `weights` (e.g. `story:3,action_stunts:1`) titles are ranked by the
+    weighted mean of the rating categories instead of a single category.
+    """
+    try:
+        field = ranking_field(category)
+        ranking = parse_weights(weights)
+        if ranking and category != "overall":
+            raise HTTPException(status_code=400, detail="weights cannot be combined with category")
+        cache_key = response_cache.make_key(
+            "top", category=category, platform=platform, content_type=content_type, n=n, weights=ranking,
+            version=await catalog_version()
+        )
+        etag = make_etag(cache_key)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        
+        hit, body = response_cache.get(cache_key)
+        if not hit:
+            generation = response_cache.generation
+            if ranking:
+                movies = await storage.movies.rank_weighted(movie_filter(platform, content_type), ranking, n, MOVIE_FIELDS)
+            else:
+                # Unfiltered dimensions are spelled out over every value, so each
+                # (platform, content_type) pair is a short walk of a ranking index
+                platforms = [_value(platform)] if platform else [p.value for p in StreamingPlatform]
+                content_types = [_value(content_type)] if content_type else [t.value for t in ContentType]
+                movies = await storage.movies.top(field, n, platforms, content_types, MOVIE_FIELDS)
+            body = orjson.dumps(movies)
+            response_cache.set(cache_key, body, generation)
+        
+        return json_response(body, {'ETag': etag})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving top movies: {str(e)}")
+
+# Documents per storage batch and per streamed chunk of an export
+EXPORT_BATCH_SIZE = 500
+
+async def export_chunks(query: Dict, compress: bool):
+    """Yield the matching movies as NDJSON, one chunk per storage batch.
+
+    Only one batch is held in memory at a time whatever the collection size.
+    """
+    compressor = zlib.compressobj(wbits=31) if compress else None  # 31: gzip container
+    lines = []
+    async for movie in storage.movies.scan(query, fields=MOVIE_FIELDS, batch_size=EXPORT_BATCH_SIZE):
+        lines.append(orjson.dumps(movie, option=orjson.OPT_APPEND_NEWLINE))
+        if len(lines) >= EXPORT_BATCH_SIZE:
+            chunk = b"".join(lines)
+            lines = []
+            yield compressor.compress(chunk) if compressor else chunk
+    
+    chunk = b"".join(lines)
+    if compressor:
+        yield compressor.compress(chunk) + compressor.flush()
+    elif chunk:
+        yield chunk
+
+@api_router.get("/movies/export")
+async def export_movies(
+    platform: Optional[StreamingPlatform] = None,
+    content_type: Optional[ContentType] = None,
+    compress: Optional[str] = Query(None, pattern="^gzip$")
+):
+    """Stream the catalog (or the filtered part of it) as newline-delimited JSON.
+
+    With compress=gzip the stream is gzip-encoded on the fly.
+    """
+    headers = {"Content-Disposition": 'attachment; filename="movies.ndjson"'}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        export_chunks(movie_filter(platform, content_type), compress=bool(compress)),
+        media_type="application/x-ndjson",
+        headers=headers
+    )
+
 @api_router.get("/movies/{movie_id}", response_model=MovieTVShow)
-async def get_movie(movie_id: str):
+async def get_movie(movie_id: str, if_none_match: Optional[str] = Header(None)):
     """Get a specific movie by ID"""
     try:
-        movie = await db.movies.find_one({"id": movie_id})
-        if not movie:
-            raise HTTPException(status_code=404, detail="Movie not found")
+        cache_key = response_cache.make_key("movie", movie_id=movie_id)
+        hit, cached = response_cache.get(cache_key)
+        if not hit:
+            generation = response_cache.generation
+            movie = await storage.movies.get(movie_id, MOVIE_FIELDS)
+            if not movie:
+                raise HTTPException(status_code=404, detail="Movie not found")
+            
+            cached = (orjson.dumps(movie), make_etag(movie['id'], movie['updated_at'].isoformat()))
+            response_cache.set(cache_key, cached, generation)
         
-        return MovieTVShow(**movie)
+        body, etag = cached
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        return json_response(body, {'ETag': etag})
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving movie: {str(e)}")
 
+@api_router.get("/movies/{movie_id}/similar")
+async def get_similar_movies(
+    movie_id: str,
+    k: int = Query(10, ge=1, le=100),
+    metric: str = Query("cosine", pattern="^(cosine|euclidean)$"),
+    same_platform: bool = False,
+    same_content_type: bool = False
+):
+    """Titles whose rating profiles are closest to the given movie's.
+
+    Neighbours are found on the in-memory rating matrix; only the k results
+    are then read from storage. Each result carries its `similarity` (cosine)
+    or `distance` (euclidean).
+    """
+    try:
+        matrix = await get_rating_matrix()
+        if movie_id not in matrix:
+            raise HTTPException(status_code=404, detail="Movie not found")
+        
+        mask = matrix.mask_like(movie_id, same_platform, same_content_type)
+        neighbours = matrix.nearest(movie_id, k, mask, metric)
+        
+        documents = {
+            doc['id']: doc for doc in await storage.movies.get_many([i for i, _ in neighbours], MOVIE_FIELDS)
+        }
+        score_name = "similarity" if metric == "cosine" else "distance"
+        results = [
+            {**documents[neighbour_id], score_name: score}
+            for neighbour_id, score in neighbours if neighbour_id in documents
+        ]
+        return json_response(orjson.dumps(results))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving similar movies: {str(e)}")
+
 @api_router.put("/movies/{movie_id}", response_model=MovieTVShow)
 async def update_movie(movie_id: str, movie_data: MovieTVShowUpdate):
     """Update a movie or TV show"""
     try:
-        # Find existing movie
-        existing_movie = await db.movies.find_one({"id": movie_id})
-        if not existing_movie:
-            raise HTTPException(status_code=404, detail="Movie not found")
-        
         # Prepare update data
         update_data = movie_data.dict(exclude_unset=True)
         update_data['updated_at'] = datetime.utcnow()
         
         # Recalculate overall rating if ratings were updated
         if 'ratings' in update_data:
-            update_data['overall_rating'] = calculate_overall_rating(RatingCategories(**update_data['ratings']))
+            update_data['overall_rating'] = calculate_overall_rating(movie_data.ratings)
         
-        # Update in database
-        await db.movies.update_one(
-            {"id": movie_id},
-            {"$set": update_data}
-        )
+        # Update in storage, getting the previous version back in the same call
+        existing_movie = await storage.movies.update(movie_id, update_data)
+        if not existing_movie:
+            raise HTTPException(status_code=404, detail="Movie not found")
         
         # Return updated movie
-        updated_movie = await db.movies.find_one({"id": movie_id})
+        updated_movie = {**existing_movie, **update_data}
+        await on_movies_changed([(existing_movie, updated_movie)])
         return MovieTVShow(**updated_movie)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error updating movie: {str(e)}")
 
+@api_router.patch("/movies/{movie_id}", response_model=MovieTVShow)
+async def patch_movie(movie_id: str, movie_data: MovieTVShowPatch):
+    """Partially update a movie or TV show.
+
+    Rating categories are set individually, leaving the others untouched, and
+    overall_rating is recomputed inside the same atomic update.
+    """
+    try:
+        patch_data = movie_data.dict(exclude_unset=True)
+        rating_patch = {
+            category: value for category, value in patch_data.pop('ratings', {}).items()
+            if value is not None
+        }
+        
+        fields = {**patch_data, 'updated_at': datetime.utcnow()}
+        existing_movie = await storage.movies.patch(movie_id, fields, rating_patch)
+        if not existing_movie:
+            raise HTTPException(status_code=404, detail="Movie not found")
+        
+        # Same changes applied locally to return the new version
+        updated_movie = {**existing_movie, **patch_data, 'updated_at': fields['updated_at']}
+        if rating_patch:
+            ratings = RatingCategories(**{**existing_movie['ratings'], **rating_patch})
+            updated_movie['ratings'] = ratings.dict()
+            updated_movie['overall_rating'] = calculate_overall_rating(ratings)
+        
+        await on_movies_changed([(existing_movie, updated_movie)])
+        return MovieTVShow(**updated_movie)
+    except HTTPException:
+        raise
+    except WriteConflictError:
+        raise HTTPException(status_code=409, detail="The title is being changed by other requests, retry shortly")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error updating movie: {str(e)}")
+
+# Community ratings. Every movie document keeps a running count, mean and sum of
+# squared deviations (Welford's m2) per category under `community_ratings`, so
+# reading the aggregate is O(1) however many ratings a title has.
+COMMUNITY_FIELDS = ("id", "community_ratings")
+
+def community_summary(movie: Dict) -> CommunityRatings:
+    categories = {}
+    for category in RATING_CATEGORIES:
+        aggregate = (movie.get('community_ratings') or {}).get(category) or {}
+        count = aggregate.get('count', 0)
+        if not count:
+            categories[category] = CategoryAggregate(count=0)
+            continue
+        # Sample variance; a single rating has no spread
+        variance = aggregate['m2'] / (count - 1) if count > 1 else 0.0
+        categories[category] = CategoryAggregate(
+            count=count,
+            mean=round(aggregate['mean'], 2),
+            variance=round(variance, 4),
+            stddev=round(variance ** 0.5, 4),
+        )
+    return CommunityRatings(movie_id=movie['id'], categories=categories)
+
+# A user's re-rating waits (briefly) for their previous rating to be applied
+RATING_WRITE_ATTEMPTS = 5
+RATING_RETRY_DELAY = 0.05
+# A pending event older than this is from a request that died: it is treated as applied
+RATING_PENDING_TIMEOUT = timedelta(seconds=30)
+
+async def write_rating_event(event: Dict) -> Optional[Dict]:
+    """Make `event` the user's current rating of the movie; returns the event it replaced.
+
+    The event is compare-and-set against the one read, and only replaces an
+    applied event, so the aggregate updates of one user's ratings of a title
+    are made one at a time, in order.
+    """
+    movie_id, user_id = event['movie_id'], event['user_id']
+    for attempt in range(RATING_WRITE_ATTEMPTS):
+        previous = await storage.rating_events.get(movie_id, user_id)
+        pending = (
+            previous is not None and not previous.get('applied', True)
+            and datetime.utcnow() - previous['created_at'] < RATING_PENDING_TIMEOUT
+        )
+        expected = previous['id'] if previous else None
+        if not pending and await storage.rating_events.compare_and_set(movie_id, user_id, expected, event):
+            return previous
+        await asyncio.sleep(RATING_RETRY_DELAY * (attempt + 1))
+    raise HTTPException(status_code=409, detail="This user's rating of the title is being changed, retry shortly")
+
+@api_router.post("/movies/{movie_id}/ratings", response_model=CommunityRatings)
+async def rate_movie(movie_id: str, event_data: RatingEventCreate):
+    """Record a user's rating of a title and return the updated community aggregates.
+
+    A user has one rating per title: rating again replaces the previous event,
+    whose values are taken out of the running aggregates in the same atomic
+    update that adds the new ones. The event is written first, as pending; the
+    aggregate update comes last and the event is then marked applied, or put
+    back to the previous one if the update fails. Only a process dying between
+    the two writes leaves them apart, until the pending event times out.
+    """
+    try:
+        ratings = {
+            category: value for category, value in event_data.ratings.dict().items()
+            if value is not None
+        }
+        if not ratings:
+            raise HTTPException(status_code=400, detail="At least one rating category is required")
+        if not await storage.movies.get(movie_id, ["id"]):
+            raise HTTPException(status_code=404, detail="Movie not found")
+        
+        event = RatingEvent(movie_id=movie_id, user_id=event_data.user_id, ratings=ratings).dict()
+        previous = await write_rating_event(event)
+        try:
+            movie = await storage.movies.rate(movie_id, ratings, previous['ratings'] if previous else {})
+        except Exception:
+            await storage.rating_events.compare_and_set(movie_id, event['user_id'], event['id'], previous)
+            raise
+        if not movie:
+            await storage.rating_events.compare_and_set(movie_id, event['user_id'], event['id'], previous)
+            raise HTTPException(status_code=404, detail="Movie not found")
+        await storage.rating_events.compare_and_set(
+            movie_id, event['user_id'], event['id'], {**event, 'applied': True}
+        )
+        
+        # Only the community aggregates changed, which no cached list, top or stats
+        # response holds: updated_at and the catalog version stay as they are, and
+        # only the title's own entry is dropped (its rating reads are not cached)
+        response_cache.invalidate("movie", movie_id=movie_id)
+        return community_summary(movie)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error rating movie: {str(e)}")
+
+@api_router.get("/movies/{movie_id}/ratings", response_model=CommunityRatings)
+async def get_community_ratings(movie_id: str):
+    """Get the community rating count, mean and spread per category"""
+    try:
+        movie = await storage.movies.get(movie_id, COMMUNITY_FIELDS)
+        if not movie:
+            raise HTTPException(status_code=404, detail="Movie not found")
+        return community_summary(movie)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving ratings: {str(e)}")
+
 @api_router.delete("/movies/{movie_id}")
 async def delete_movie(movie_id: str):
     """Delete a movie or TV show"""
     try:
-        result = await db.movies.delete_one({"id": movie_id})
-        if result.deleted_count == 0:
+        deleted_movie = await storage.movies.delete(movie_id)
+        if not deleted_movie:
             raise HTTPException(status_code=404, detail="Movie not found")
+        await on_movies_changed([(deleted_movie, None)])
+        await storage.rating_events.delete_for_movie(movie_id)
         
         return {"message": "Movie deleted successfully"}
     except HTTPException:
@@ -438,33 +1602,293 @@ async def delete_movie(movie_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error deleting movie: {str(e)}")
 
+@api_router.delete("/movies")
+async def delete_movies(
+    platform: Optional[StreamingPlatform] = None,
+    content_type: Optional[ContentType] = None,
+    all: bool = False
+):
+    """Delete every movie/TV show matching the filters of GET /api/movies.
+
+    Without filters `all=true` is required, and the whole catalog is deleted.
+    The stats delta is aggregated in one pass before the titles are removed
+    with a single filtered delete, and their rating events with one more
+    (only the matching titles with community ratings are looked up for it).
+    Titles written by other requests between the aggregation and the delete
+    can leave the stats off until POST /api/stats/rebuild.
+    """
+    try:
+        query = movie_filter(platform, content_type)
+        if not query and not all:
+            raise HTTPException(status_code=400, detail="Pass a platform or content_type filter, or all=true")
+
+        rated_ids = await storage.movies.rated_ids(query) if query else None
+        removed = await compute_stats_document(query, histograms=True)
+        deleted = await storage.movies.delete_many(query)
+
+        # Same side effects as on_movies_changed, with the stats taken out as one delta
+        response_cache.invalidate("movies")
+        response_cache.invalidate("top")
+        response_cache.invalidate("stats")
+        response_cache.invalidate("movie")
+        inc: Dict[str, float] = {"version": 1}
+        for path, amount in _flatten(removed).items():
+            if path != "_id" and amount:
+                inc[path] = -amount
+        await storage.stats.update(STATS_ID, inc=inc, upsert=True)
+
+        record_memory_index_update(lambda: apply_memory_index_delete(_value(platform), _value(content_type)))
+        if rated_ids is None:
+            await storage.rating_events.delete_all()
+        else:
+            await storage.rating_events.delete_for_movies(rated_ids)
+
+        return {"message": f"Deleted {deleted} movies/TV shows", "deleted": deleted}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error deleting movies: {str(e)}")
+
 @api_router.get("/platforms")
 async def get_platforms():
     """Get list of available streaming platforms"""
     return [platform.value for platform in StreamingPlatform]
 
-@api_router.get("/stats")
-async def get_stats():
-    """Get statistics about the movie database"""
+@api_router.get("/search")
+async def search_movies(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100)
+):
+    """Full-text search over title, genre and description.
+
+    Results are ranked on the in-memory search index (BM25, title and genre
+    matches weighted above description matches) and carry their `score`;
+    only the returned page is read from storage.
+    """
     try:
-        total_movies = await db.movies.count_documents({"content_type": "movie"})
-        total_tv_shows = await db.movies.count_documents({"content_type": "tv_series"})
+        index = await get_search_index()
+        matches = index.search(q, limit)
         
-        # Platform distribution
-        pipeline = [
-            {"$group": {"_id": "$streaming_platform", "count": {"$sum": 1}}},
-            {"$sort": {"count": -1}}
+        documents = {doc['id']: doc for doc in await storage.movies.get_many([i for i, _ in matches], MOVIE_FIELDS)}
+        results = [
+            {**documents[movie_id], "score": score}
+            for movie_id, score in matches if movie_id in documents
         ]
-        platform_stats = await db.movies.aggregate(pipeline).to_list(length=None)
+        return json_response(orjson.dumps(results))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error searching movies: {str(e)}")
+
+@api_router.get("/autocomplete")
+async def autocomplete_titles(
+    prefix: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50)
+):
+    """Title suggestions for a typed prefix, served from memory"""
+    try:
+        index = await get_search_index()
+        return index.autocomplete(prefix, limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error suggesting titles: {str(e)}")
+
+@api_router.get("/stats")
+async def get_stats(
+    response: Response,
+    platform: Optional[StreamingPlatform] = None,
+    content_type: Optional[ContentType] = None,
+    if_none_match: Optional[str] = Header(None)
+):
+    """Get statistics about the movie database, optionally for one platform or content type"""
+    try:
+        cache_key = response_cache.make_key(
+            "stats", platform=platform, content_type=content_type, version=await catalog_version()
+        )
+        etag = make_etag(cache_key)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        response.headers['ETag'] = etag
+        
+        hit, stats = response_cache.get(cache_key)
+        if hit:
+            return stats
+        
+        generation = response_cache.generation
+        if platform or content_type:
+            # Filtered stats are aggregated on the fly in one round trip
+            stats = format_stats(await compute_stats_document(movie_filter(platform, content_type)))
+        else:
+            # Catalog-wide stats come from the materialized document
+            stats = format_stats(await storage.stats.get(STATS_ID))
+        
+        response_cache.set(cache_key, stats, generation)
+        return stats
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving stats: {str(e)}")
+
+@api_router.post("/stats/rebuild")
+async def rebuild_stats_endpoint():
+    """Recompute the materialized stats from scratch and report any drift"""
+    try:
+        return await rebuild_stats()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error rebuilding stats: {str(e)}")
+
+@api_router.get("/distributions")
+async def get_distributions(
+    response: Response,
+    category: Optional[str] = None,
+    platform: Optional[StreamingPlatform] = None,
+    if_none_match: Optional[str] = Header(None)
+):
+    """Histograms of rating scores in 0.5-wide buckets, read from the materialized stats.
+
+    `category` is a rating category or "overall" (all of them when omitted);
+    without `platform` the buckets are summed over every platform.
+    """
+    try:
+        if category is not None:
+            ranking_field(category)
+        categories = [category] if category else HISTOGRAM_CATEGORIES
+        
+        # Version and histograms come from the same document in one read
+        path = f"histograms.{_stats_key(platform)}" if platform else "histograms"
+        document = await storage.stats.get(STATS_ID, ["version", path]) or {}
+        etag = make_etag(document.get("version", 0), "distributions", category, _value(platform))
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        response.headers['ETag'] = etag
+        
+        platforms = document.get("histograms", {})
+        
+        histograms = {}
+        for name in categories:
+            counts = [0] * HISTOGRAM_BUCKETS
+            for platform_histograms in platforms.values():
+                for bucket, count in platform_histograms.get(name, {}).items():
+                    counts[int(bucket)] += count
+            histograms[name] = [
+                {
+                    "min": index * HISTOGRAM_BUCKET_WIDTH,
+                    "max": (index + 1) * HISTOGRAM_BUCKET_WIDTH,
+                    "count": count,
+                }
+                for index, count in enumerate(counts)
+            ]
         
         return {
-            "total_movies": total_movies,
-            "total_tv_shows": total_tv_shows,
-            "total_content": total_movies + total_tv_shows,
-            "platform_distribution": platform_stats
+            "platform": _value(platform),
+            "bucket_width": HISTOGRAM_BUCKET_WIDTH,
+            "histograms": histograms,
         }
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error retrieving stats: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error retrieving distributions: {str(e)}")
+
+def parse_percentiles(q: str) -> List[float]:
+    try:
+        quantiles = [float(value) for value in q.split(',') if value.strip()]
+    except ValueError:
+        quantiles = []
+    if not quantiles or any(not 0 <= value <= 100 for value in quantiles):
+        raise HTTPException(status_code=400, detail="q must be a comma-separated list of percentiles between 0 and 100")
+    return quantiles
+
+@api_router.get("/analytics/correlations")
+async def get_category_correlations(
+    platform: Optional[StreamingPlatform] = None,
+    content_type: Optional[ContentType] = None
+):
+    """Pearson correlation between every pair of rating categories"""
+    try:
+        matrix = await get_rating_matrix()
+        mask = matrix.mask(platform, content_type)
+        return {"count": int(mask.sum()), "correlations": matrix.correlations(mask)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error computing correlations: {str(e)}")
+
+@api_router.get("/analytics/percentiles")
+async def get_category_percentiles(
+    q: str = "10,25,50,75,90",
+    platform: Optional[StreamingPlatform] = None,
+    content_type: Optional[ContentType] = None
+):
+    """Score at the given percentiles of every rating category"""
+    try:
+        quantiles = parse_percentiles(q)
+        matrix = await get_rating_matrix()
+        mask = matrix.mask(platform, content_type)
+        return {"count": int(mask.sum()), "percentiles": matrix.percentiles(mask, quantiles)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error computing percentiles: {str(e)}")
+
+@api_router.get("/analytics/zscores/{movie_id}")
+async def get_movie_zscores(
+    movie_id: str,
+    platform: Optional[StreamingPlatform] = None,
+    content_type: Optional[ContentType] = None
+):
+    """How many standard deviations a movie sits from the mean in each category"""
+    try:
+        matrix = await get_rating_matrix()
+        mask = matrix.mask(platform, content_type)
+        zscores = matrix.zscores(movie_id, mask)
+        if zscores is None:
+            raise HTTPException(status_code=404, detail="Movie not found")
+        return {"id": movie_id, "count": int(mask.sum()), "zscores": zscores}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error computing z-scores: {str(e)}")
+
+@api_router.get("/analytics/platforms")
+async def get_platform_summary(content_type: Optional[ContentType] = None):
+    """Count, mean and standard deviation of every rating category per platform"""
+    try:
+        matrix = await get_rating_matrix()
+        return {"platforms": matrix.platform_summary(matrix.mask(content_type=content_type))}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error summarizing platforms: {str(e)}")
+
+@api_router.post("/jobs/recompute-overall", response_model=Job, status_code=202)
+async def start_recompute_overall(
+    batch_size: int = Query(RECOMPUTE_BATCH_SIZE, ge=1, le=10000),
+    pause_seconds: float = Query(RECOMPUTE_PAUSE_SECONDS, ge=0, le=60)
+):
+    """Start recomputing the stored overall_rating of every title in the background"""
+    try:
+        running = await storage.jobs.find(status=JobStatus.RUNNING.value, kind=RECOMPUTE_OVERALL_JOB)
+        if running:
+            raise HTTPException(status_code=409, detail=f"Job {running[0]['id']} is already running")
+        
+        job = Job(
+            kind=RECOMPUTE_OVERALL_JOB, batch_size=batch_size, pause_seconds=pause_seconds,
+            total=await storage.movies.count()
+        )
+        job_dict = job.dict()
+        await storage.jobs.insert(job_dict)
+        start_job(job_dict)
+        return job
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error starting job: {str(e)}")
+
+@api_router.get("/jobs/{job_id}", response_model=Job)
+async def get_job(job_id: str):
+    """Get the status and progress of a background job"""
+    job = await storage.jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return Job(**job)
+
+@api_router.get("/cache/stats")
+async def get_cache_stats():
+    """Get hit/miss counters and occupancy of the read cache"""
+    return response_cache.stats()
 
 # Include the router in the main app
 app.include_router(api_router)
@@ -475,6 +1899,7 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
 
 # Configure logging
@@ -484,6 +1909,19 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def setup_storage():
+    await storage.setup()
+    
+    # Materialize stats for catalogs that predate the stats document or its histograms
+    if "histograms" not in (await storage.stats.get(STATS_ID, ["histograms"]) or {}):
+        await rebuild_stats()
+    
+    start_memory_index_load()
+    await resume_jobs()
+
 @app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+async def close_storage():
+    for task in list(_job_tasks.values()):
+        task.cancel()
+    storage.close()
\ No newline at end of file
@@ -0,0 +1,33 @@
+"""Storage engines behind the movie repository interface.
+
+The server talks to a `Storage` (see base.py) and never to a database
+driver directly. `create_storage` picks the engine:
+
+- "mongo" (default): MongoDB through Motor
+- "memory": dicts with sorted secondary indexes, nothing persisted
+- "sqlite": an embedded SQLite file, no server needed
+"""
+from typing import Optional
+
+from storage.base import (
+    DocumentStore, DuplicateKeyError, MovieRepository, OverallRating, RatingEventStore, Storage,
+    WriteConflictError,
+)
+
+STORAGE_BACKENDS = ("mongo", "memory", "sqlite")
+
+
+def create_storage(backend: str, overall_rating: OverallRating,
+                   mongo_url: Optional[str] = None, db_name: Optional[str] = None,
+                   sqlite_path: Optional[str] = None) -> Storage:
+    # Engines are imported lazily so the others do not need their driver installed
+    if backend == "mongo":
+        from storage.mongo import MongoStorage
+        return MongoStorage.connect(mongo_url, db_name, overall_rating)
+    if backend == "memory":
+        from storage.memory import MemoryStorage
+        return MemoryStorage(overall_rating)
+    if backend == "sqlite":
+        from storage.sqlite import SQLiteStorage
+        return SQLiteStorage(sqlite_path or f"{db_name or 'cinerating'}.sqlite3", overall_rating)
+    raise ValueError(f"Unknown storage backend {backend!r}, expected one of {', '.join(STORAGE_BACKENDS)}")
@@ -0,0 +1,307 @@
+"""Storage interface shared by the engines, and helpers for the Python-side ones.
+
+Documents cross this boundary as plain dicts shaped like `MovieTVShow.dict()`:
+enum members are stored as their values and timestamps as naive UTC
+datetimes, whatever the engine keeps on disk.
+"""
+from abc import ABC, abstractmethod
+from datetime import datetime
+from enum import Enum
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Equality filters on top-level movie fields, e.g. {"streaming_platform": "Netflix"}
+Filters = Dict[str, Any]
+# (created_at, id) of the last movie of the previous page, see LIST_SORT
+PageKey = Tuple[datetime, str]
+# Normalized (category, weight) pairs, see parse_weights in server.py
+Weights = Sequence[Tuple[str, float]]
+NaturalKey = Tuple[str, int, str]
+# Overall rating of a ratings dict, as calculate_overall_rating computes it
+OverallRating = Callable[[Dict[str, float]], float]
+
+DATETIME_FIELDS = ("created_at", "updated_at", "finished_at")
+
+
+def plain(value: Any) -> Any:
+    """Enum members as their values, recursively through dicts and lists"""
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, dict):
+        return {key: plain(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [plain(item) for item in value]
+    return value
+
+
+def clone(value: Any) -> Any:
+    """Copy of the dicts and lists in a document; leaves are immutable"""
+    if isinstance(value, dict):
+        return {key: clone(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [clone(item) for item in value]
+    return value
+
+
+def get_path(document: Dict, path: str, default: Any = None) -> Any:
+    for part in path.split('.'):
+        if not isinstance(document, dict) or part not in document:
+            return default
+        document = document[part]
+    return document
+
+
+def set_path(document: Dict, path: str, value: Any):
+    *parents, leaf = path.split('.')
+    for part in parents:
+        document = document.setdefault(part, {})
+    document[leaf] = value
+
+
+def increment_path(document: Dict, path: str, amount: float):
+    set_path(document, path, get_path(document, path, 0) + amount)
+
+
+def project(document: Dict, fields: Optional[Iterable[str]]) -> Dict:
+    """Copy of a document with only the given (possibly dotted) fields"""
+    if fields is None:
+        return clone(document)
+    projected: Dict = {}
+    for path in fields:
+        value = get_path(document, path, projected)
+        if value is not projected:
+            set_path(projected, path, clone(value))
+    return projected
+
+
+def matches(document: Dict, filters: Optional[Filters]) -> bool:
+    return all(document.get(field) == plain(value) for field, value in (filters or {}).items())
+
+
+def natural_key(document: Dict) -> NaturalKey:
+    return document['title'], document['year'], plain(document['streaming_platform'])
+
+
+def weighted_score(document: Dict, weights: Weights) -> float:
+    return sum(document['ratings'][category] * weight for category, weight in weights)
+
+
+def welford_add(aggregate: Optional[Dict], value: float) -> Dict:
+    """Running count/mean/m2 with one more value"""
+    aggregate = aggregate or {}
+    count = aggregate.get('count', 0) + 1
+    mean = aggregate.get('mean', 0)
+    next_mean = mean + (value - mean) / count
+    return {"count": count, "mean": next_mean, "m2": aggregate.get('m2', 0) + (value - mean) * (value - next_mean)}
+
+
+def welford_remove(aggregate: Optional[Dict], value: float) -> Dict:
+    """Running count/mean/m2 with one earlier value taken out"""
+    aggregate = aggregate or {}
+    count = aggregate.get('count', 1) - 1
+    if count <= 0:
+        return {"count": 0, "mean": 0, "m2": 0}
+    mean = aggregate.get('mean', 0)
+    next_mean = mean - (value - mean) / count
+    m2 = aggregate.get('m2', 0) - (value - mean) * (value - next_mean)
+    return {"count": count, "mean": next_mean, "m2": max(0, m2)}
+
+
+def apply_patch(movie: Dict, fields: Dict[str, Any], ratings: Dict[str, float], overall_rating: OverallRating):
+    """Set top-level fields and single rating categories of a movie, recomputing overall_rating"""
+    movie.update(plain(fields))
+    if ratings:
+        movie['ratings'].update(ratings)
+        movie['overall_rating'] = overall_rating(movie['ratings'])
+
+
+def apply_rating(movie: Dict, added: Dict[str, float], removed: Dict[str, float]):
+    """Replace a user's previous rating (if any) by a new one in a movie's community aggregates.
+
+    The editorial fields, updated_at included, are left alone.
+    """
+    community = movie.setdefault('community_ratings', {})
+    for category, value in removed.items():
+        community[category] = welford_remove(community.get(category), value)
+    for category, value in added.items():
+        community[category] = welford_add(community.get(category), value)
+
+
+class DuplicateKeyError(Exception):
+    """Raised when a write would create a second movie with an existing id."""
+
+
+class WriteConflictError(Exception):
+    """Raised when a conditional write keeps losing to concurrent writes of the same movie."""
+
+
+class MovieRepository(ABC):
+    """Movie catalog operations used by the routes.
+
+    Reads return copies: callers may modify the documents they get back.
+    Write methods that change an existing movie return the movie as it was
+    before the write (None when it does not exist), so the caller can derive
+    stats deltas from the (before, after) pair.
+    """
+
+    # Reads
+
+    @abstractmethod
+    async def get(self, movie_id: str, fields: Optional[Sequence[str]] = None) -> Optional[Dict]:
+        ...
+
+    @abstractmethod
+    async def get_many(self, ids: Sequence[str], fields: Optional[Sequence[str]] = None) -> List[Dict]:
+        """Movies with the given ids, in no particular order; missing ids are skipped"""
+
+    @abstractmethod
+    async def find_page(self, filters: Filters, limit: int, after: Optional[PageKey] = None,
+                        fields: Optional[Sequence[str]] = None) -> List[Dict]:
+        """Up to `limit` matching movies, newest first, starting after a page key"""
+
+    @abstractmethod
+    def scan(self, filters: Optional[Filters] = None, fields: Optional[Sequence[str]] = None,
+             batch_size: int = 500) -> AsyncIterator[Dict]:
+        """Every matching movie, newest first, read `batch_size` at a time"""
+
+    @abstractmethod
+    async def top(self, field: str, n: int, platforms: Sequence[str], content_types: Sequence[str],
+                  fields: Optional[Sequence[str]] = None) -> List[Dict]:
+        """The n movies with the highest `field` (ties by id) on the given platforms and content types"""
+
+    @abstractmethod
+    async def rank_weighted(self, filters: Filters, weights: Weights, limit: int,
+                            fields: Optional[Sequence[str]] = None) -> List[Dict]:
+        """Best `limit` matches by weighted category mean, with `weighted_score` rounded to 2 places"""
+
+    @abstractmethod
+    async def rated_ids(self, filters: Filters) -> List[str]:
+        """Ids of the matching movies that have community ratings (and so rating events)"""
+
+    @abstractmethod
+    async def ids_after(self, last_id: Optional[str], limit: int) -> List[str]:
+        """Next `limit` ids in ascending order, for batch jobs walking the catalog"""
+
+    @abstractmethod
+    async def count(self) -> int:
+        ...
+
+    # Writes
+
+    @abstractmethod
+    async def insert(self, movie: Dict):
+        """Insert one movie; raises DuplicateKeyError if its id exists"""
+
+    @abstractmethod
+    async def insert_many(self, movies: Sequence[Dict]) -> Dict[int, str]:
+        """Insert movies independently; returns the errors keyed by position"""
+
+    @abstractmethod
+    async def replace_by_natural_key(self, movies: Sequence[Dict],
+                                     keep: Sequence[str] = ()) -> Tuple[Dict[int, str], Dict[int, Dict]]:
+        """Insert movies, or replace the movie with the same natural key, which keeps its `keep` fields.
+
+        A movie replaces the one holding its key only if that one is unchanged
+        when written, so concurrent writes are never overwritten. Returns
+        (errors, replaced) keyed by position, `replaced` holding the movies as
+        they were before the write; other positions were inserted.
+        """
+
+    @abstractmethod
+    async def update(self, movie_id: str, fields: Dict[str, Any]) -> Optional[Dict]:
+        """Set top-level fields"""
+
+    @abstractmethod
+    async def patch(self, movie_id: str, fields: Dict[str, Any], ratings: Dict[str, float]) -> Optional[Dict]:
+        """Set top-level fields and single rating categories, recomputing overall_rating atomically.
+
+        Raises WriteConflictError if the movie's ratings keep changing under the write.
+        """
+
+    @abstractmethod
+    async def rate(self, movie_id: str, added: Dict[str, float], removed: Dict[str, float]) -> Optional[Dict]:
+        """Apply a community rating (see apply_rating) atomically; returns the movie after the write"""
+
+    @abstractmethod
+    async def recompute_overall(self, ids: Sequence[str]) -> List[Tuple[Dict, Dict]]:
+        """Store the current overall rating formula for the given movies; returns the (before, after) changes"""
+
+    @abstractmethod
+    async def delete(self, movie_id: str) -> Optional[Dict]:
+        ...
+
+    @abstractmethod
+    async def delete_many(self, filters: Filters) -> int:
+        """Delete every matching movie (all of them for empty filters) in one operation; returns the count"""
+
+
+class DocumentStore(ABC):
+    """Small keyed collection of documents (the stats document, jobs)"""
+
+    @abstractmethod
+    async def get(self, key: str, fields: Optional[Sequence[str]] = None) -> Optional[Dict]:
+        """The document with the given key, limited to some (possibly dotted) fields"""
+
+    @abstractmethod
+    async def find(self, **equals: Any) -> List[Dict]:
+        ...
+
+    @abstractmethod
+    async def insert(self, document: Dict):
+        ...
+
+    @abstractmethod
+    async def replace(self, key: str, document: Dict):
+        """Replace (or create) the document with the given key"""
+
+    @abstractmethod
+    async def update(self, key: str, set: Optional[Dict[str, Any]] = None,
+                     inc: Optional[Dict[str, float]] = None, upsert: bool = False):
+        """Set and increment (possibly dotted) fields atomically"""
+
+
+class RatingEventStore(ABC):
+    """One rating event per (movie_id, user_id)"""
+
+    @abstractmethod
+    async def get(self, movie_id: str, user_id: str) -> Optional[Dict]:
+        """A user's current rating event of a movie"""
+
+    @abstractmethod
+    async def compare_and_set(self, movie_id: str, user_id: str, expected: Optional[str],
+                              event: Optional[Dict]) -> bool:
+        """Replace a user's rating event of a movie if the current one still has the id `expected`.
+
+        `expected` None means the user has no event yet, `event` None deletes
+        it. Returns False, writing nothing, when the current event differs.
+        """
+
+    @abstractmethod
+    async def delete_for_movie(self, movie_id: str):
+        ...
+
+    @abstractmethod
+    async def delete_for_movies(self, movie_ids: Sequence[str]):
+        ...
+
+    @abstractmethod
+    async def delete_all(self):
+        ...
+
+
+class Storage:
+    """An engine: the movie repository plus the auxiliary stores"""
+
+    name = "base"
+    # Whether movies.aggregate() accepts MongoDB aggregation pipelines
+    native_aggregation = False
+
+    movies: MovieRepository
+    stats: DocumentStore
+    jobs: DocumentStore
+    rating_events: RatingEventStore
+
+    async def setup(self):
+        """Create indexes/tables; safe to call on every startup"""
+
+    def close(self):
+        pass
@@ -0,0 +1,362 @@
+"""In-memory engine: the catalog in Python dicts with secondary indexes.
+
+- hash index on id (the document dict itself) and on the natural key
+- sorted (created_at, id) keys for list pages and exports
+- sorted (-score, id) keys for every ranked field, for leaderboards
+- sorted ids for batch jobs walking the catalog
+
+The sorted indexes are partitioned by (streaming_platform, content_type),
+mirroring the Mongo indexes that lead with those fields: a filtered query
+merges the already-sorted keys of the matching partitions instead of
+filtering the whole catalog.
+
+Every operation runs without awaiting, so each one is atomic. Nothing is
+persisted; the engine is meant for tests, benchmarks and demos.
+"""
+import asyncio
+import heapq
+import itertools
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from indexes import RANKED_FIELDS
+from storage.base import (
+    DocumentStore, DuplicateKeyError, Filters, MovieRepository, OverallRating, RatingEventStore,
+    Storage, apply_patch, apply_rating, clone, get_path, increment_path, matches, natural_key,
+    plain, project, set_path, weighted_score,
+)
+
+Partition = Tuple[str, str]
+PARTITION_FIELDS = ("streaming_platform", "content_type")
+
+
+def partition_of(movie: Dict) -> Partition:
+    return movie['streaming_platform'], movie['content_type']
+
+
+class PartitionedIndex:
+    """Sorted keys per partition"""
+
+    def __init__(self):
+        self.partitions: Dict[Partition, List[Tuple]] = defaultdict(list)
+        self._unsorted: Set[Partition] = set()
+
+    def add(self, partition: Partition, key: Tuple, bulk: bool = False):
+        """Insert a key; in bulk mode it is appended and sorted in by the next resort()"""
+        if bulk:
+            self.partitions[partition].append(key)
+            self._unsorted.add(partition)
+        else:
+            insort(self.partitions[partition], key)
+
+    def resort(self):
+        # Timsort merges the appended run into the sorted one in linear time
+        for partition in self._unsorted:
+            self.partitions[partition].sort()
+        self._unsorted.clear()
+
+    def discard(self, partition: Partition, key: Tuple):
+        keys = self.partitions[partition]
+        position = bisect_left(keys, key)
+        if position < len(keys) and keys[position] == key:
+            del keys[position]
+
+    def discard_ids(self, partitions: Sequence[Partition], ids: Set[str]):
+        """Drop the keys of the given ids (the last key element) in one pass over each partition"""
+        for partition in partitions:
+            self.partitions[partition] = [key for key in self.partitions[partition] if key[-1] not in ids]
+
+    def ascending(self, partitions: Sequence[Partition]) -> Iterator[Tuple]:
+        return heapq.merge(*[iter(self.partitions.get(partition, ())) for partition in partitions])
+
+    def descending(self, partitions: Sequence[Partition], before: Optional[Tuple] = None) -> Iterator[Tuple]:
+        """Keys in descending order, starting strictly below `before`"""
+        def walk(keys):
+            position = len(keys) if before is None else bisect_left(keys, before)
+            for index in range(position - 1, -1, -1):
+                yield keys[index]
+        return heapq.merge(*[walk(self.partitions.get(partition, [])) for partition in partitions], reverse=True)
+
+
+class MemoryMovieRepository(MovieRepository):
+    def __init__(self, overall_rating: OverallRating):
+        self.overall_rating = overall_rating
+        self._movies: Dict[str, Dict] = {}
+        self._natural_keys: Dict[Tuple, Set[str]] = defaultdict(set)
+        self._ids: List[str] = []
+        self._created = PartitionedIndex()
+        self._ranked = {field: PartitionedIndex() for field in RANKED_FIELDS}
+
+    # Index maintenance
+
+    def _index(self, movie: Dict, bulk: bool = False):
+        """Add a movie to every index; in bulk mode the sorted ones wait for _resort()"""
+        movie_id, partition = movie['id'], partition_of(movie)
+        self._movies[movie_id] = movie
+        self._natural_keys[natural_key(movie)].add(movie_id)
+        if bulk:
+            self._ids.append(movie_id)
+        else:
+            insort(self._ids, movie_id)
+        self._created.add(partition, (movie['created_at'], movie_id), bulk)
+        for field, index in self._ranked.items():
+            index.add(partition, (-get_path(movie, field), movie_id), bulk)
+
+    def _resort(self):
+        self._ids.sort()
+        self._created.resort()
+        for index in self._ranked.values():
+            index.resort()
+
+    def _unindex(self, movie: Dict):
+        movie_id, partition = movie['id'], partition_of(movie)
+        del self._movies[movie_id]
+        keys = self._natural_keys[natural_key(movie)]
+        keys.discard(movie_id)
+        if not keys:
+            del self._natural_keys[natural_key(movie)]
+        del self._ids[bisect_left(self._ids, movie_id)]
+        self._created.discard(partition, (movie['created_at'], movie_id))
+        for field, index in self._ranked.items():
+            index.discard(partition, (-get_path(movie, field), movie_id))
+
+    def _partitions(self, filters: Optional[Filters]) -> List[Partition]:
+        wanted = [plain((filters or {}).get(field)) for field in PARTITION_FIELDS]
+        return [
+            partition for partition in self._created.partitions
+            if all(value is None or value == key for value, key in zip(wanted, partition))
+        ]
+
+    def _matching(self, filters: Optional[Filters], keys: Iterator[Tuple]) -> Iterator[Dict]:
+        """Movies behind index keys whose last element is the id, filtered by the non-partition fields"""
+        rest = {field: value for field, value in (filters or {}).items() if field not in PARTITION_FIELDS}
+        for key in keys:
+            movie = self._movies[key[-1]]
+            if not rest or matches(movie, rest):
+                yield movie
+
+    def _write(self, movie_id: str, change) -> Optional[Dict]:
+        """Apply `change` to a movie with its indexes refreshed; returns the movie before"""
+        movie = self._movies.get(movie_id)
+        if movie is None:
+            return None
+        before = clone(movie)
+        self._unindex(movie)
+        change(movie)
+        self._index(movie)
+        return before
+
+    # Reads
+
+    async def get(self, movie_id, fields=None):
+        movie = self._movies.get(movie_id)
+        return None if movie is None else project(movie, fields)
+
+    async def get_many(self, ids, fields=None):
+        return [project(self._movies[movie_id], fields) for movie_id in ids if movie_id in self._movies]
+
+    async def find_page(self, filters, limit, after=None, fields=None):
+        keys = self._created.descending(self._partitions(filters), before=after)
+        page = []
+        for movie in self._matching(filters, keys):
+            page.append(project(movie, fields))
+            if len(page) >= limit:
+                break
+        return page
+
+    async def scan(self, filters=None, fields=None, batch_size=500):
+        # Ids are snapshotted so writes during the scan cannot upset the iteration
+        ids = [movie['id'] for movie in self._matching(filters, self._created.descending(self._partitions(filters)))]
+        for start in range(0, len(ids), batch_size):
+            for movie_id in ids[start:start + batch_size]:
+                movie = self._movies.get(movie_id)
+                if movie is not None:
+                    yield project(movie, fields)
+            await asyncio.sleep(0)
+
+    async def top(self, field, n, platforms, content_types, fields=None):
+        partitions = [(plain(platform), plain(content_type)) for platform in platforms for content_type in content_types]
+        keys = self._ranked[field].ascending(partitions)
+        return [project(self._movies[movie_id], fields) for _, movie_id in itertools.islice(keys, n)]
+
+    async def rank_weighted(self, filters, weights, limit, fields=None):
+        keys = self._created.descending(self._partitions(filters))
+        best = heapq.nsmallest(
+            limit, ((-weighted_score(movie, weights), movie['id']) for movie in self._matching(filters, keys))
+        )
+        ranked = []
+        for score, movie_id in best:
+            movie = project(self._movies[movie_id], fields)
+            movie['weighted_score'] = round(-score, 2)
+            ranked.append(movie)
+        return ranked
+
+    async def rated_ids(self, filters):
+        keys = self._created.descending(self._partitions(filters))
+        return [movie['id'] for movie in self._matching(filters, keys) if 'community_ratings' in movie]
+
+    async def ids_after(self, last_id, limit):
+        start = bisect_right(self._ids, last_id) if last_id else 0
+        return self._ids[start:start + limit]
+
+    async def count(self):
+        return len(self._movies)
+
+    # Writes
+
+    async def insert(self, movie):
+        movie = plain(clone(movie))
+        if movie['id'] in self._movies:
+            raise DuplicateKeyError(f"Duplicate id {movie['id']}")
+        self._index(movie)
+
+    async def insert_many(self, movies):
+        # Keys are appended and each sorted index is re-sorted once per call, instead
+        # of an O(n) insort per movie
+        errors = {}
+        for position, movie in enumerate(movies):
+            movie = plain(clone(movie))
+            if movie['id'] in self._movies:
+                errors[position] = f"Duplicate id {movie['id']}"
+                continue
+            self._index(movie, bulk=True)
+        self._resort()
+        return errors
+
+    async def replace_by_natural_key(self, movies, keep=()):
+        errors, replaced = {}, {}
+        for position, movie in enumerate(movies):
+            movie = plain(clone(movie))
+            existing = sorted(self._natural_keys.get(natural_key(movie), ()))
+            before = self._movies[existing[0]] if existing else None
+            if before is not None:
+                movie.update({field: clone(before[field]) for field in keep if field in before})
+            if movie['id'] in self._movies and movie['id'] not in existing[:1]:
+                errors[position] = f"Duplicate id {movie['id']}"
+                continue
+            if before is not None:
+                self._unindex(before)
+                replaced[position] = before
+            self._index(movie)
+        return errors, replaced
+
+    async def update(self, movie_id, fields):
+        return self._write(movie_id, lambda movie: movie.update(plain(clone(fields))))
+
+    async def patch(self, movie_id, fields, ratings):
+        return self._write(movie_id, lambda movie: apply_patch(movie, fields, ratings, self.overall_rating))
+
+    async def rate(self, movie_id, added, removed):
+        if self._write(movie_id, lambda movie: apply_rating(movie, added, removed)) is None:
+            return None
+        return project(self._movies[movie_id], None)
+
+    async def recompute_overall(self, ids):
+        changes = []
+        now = datetime.utcnow()
+        for movie_id in ids:
+            movie = self._movies.get(movie_id)
+            if movie is None or movie['overall_rating'] == self.overall_rating(movie['ratings']):
+                continue
+            before = self._write(movie_id, lambda movie: movie.update(
+                overall_rating=self.overall_rating(movie['ratings']), updated_at=now
+            ))
+            changes.append((before, project(self._movies[movie_id], None)))
+        return changes
+
+    async def delete(self, movie_id):
+        movie = self._movies.get(movie_id)
+        if movie is None:
+            return None
+        self._unindex(movie)
+        return movie
+
+    async def delete_many(self, filters):
+        partitions = self._partitions(filters)
+        matched = list(self._matching(filters, self._created.descending(partitions)))
+        ids = {movie['id'] for movie in matched}
+        # Sorted indexes are filtered once instead of one O(n) removal per movie
+        for movie in matched:
+            del self._movies[movie['id']]
+            keys = self._natural_keys[natural_key(movie)]
+            keys.discard(movie['id'])
+            if not keys:
+                del self._natural_keys[natural_key(movie)]
+        self._ids = [movie_id for movie_id in self._ids if movie_id not in ids]
+        for index in (self._created, *self._ranked.values()):
+            index.discard_ids(partitions, ids)
+        return len(ids)
+
+
+class MemoryDocumentStore(DocumentStore):
+    def __init__(self, key_field: str):
+        self.key_field = key_field
+        self._documents: Dict[str, Dict] = {}
+
+    async def get(self, key, fields=None):
+        document = self._documents.get(key)
+        return None if document is None else project(document, fields)
+
+    async def find(self, **equals):
+        return [clone(document) for document in self._documents.values() if matches(document, equals)]
+
+    async def insert(self, document):
+        document = plain(clone(document))
+        self._documents[document[self.key_field]] = document
+
+    async def replace(self, key, document):
+        self._documents[key] = {**plain(clone(document)), self.key_field: key}
+
+    async def update(self, key, set=None, inc=None, upsert=False):
+        document = self._documents.get(key)
+        if document is None:
+            if not upsert:
+                return
+            document = self._documents[key] = {self.key_field: key}
+        for path, value in plain(set or {}).items():
+            set_path(document, path, clone(value))
+        for path, amount in (inc or {}).items():
+            increment_path(document, path, amount)
+
+
+class MemoryRatingEventStore(RatingEventStore):
+    def __init__(self):
+        self._events: Dict[Tuple[str, str], Dict] = {}
+
+    async def get(self, movie_id, user_id):
+        event = self._events.get((movie_id, user_id))
+        return None if event is None else clone(event)
+
+    async def compare_and_set(self, movie_id, user_id, expected, event):
+        key = (movie_id, user_id)
+        current = self._events.get(key)
+        if (current['id'] if current else None) != expected:
+            return False
+        if event is None:
+            self._events.pop(key, None)
+        else:
+            self._events[key] = plain(clone(event))
+        return True
+
+    async def delete_for_movie(self, movie_id):
+        await self.delete_for_movies([movie_id])
+
+    async def delete_for_movies(self, movie_ids):
+        movie_ids = set(movie_ids)
+        for key in [key for key in self._events if key[0] in movie_ids]:
+            del self._events[key]
+
+    async def delete_all(self):
+        self._events.clear()
+
+
+class MemoryStorage(Storage):
+    name = "memory"
+
+    def __init__(self, overall_rating: OverallRating):
+        self.movies = MemoryMovieRepository(overall_rating)
+        self.stats = MemoryDocumentStore("_id")
+        self.jobs = MemoryDocumentStore("id")
+        self.rating_events = MemoryRatingEventStore()
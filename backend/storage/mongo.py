@@ -0,0 +1,437 @@
+"""MongoDB engine (the default), through Motor.
+
+Every operation is a single Mongo command that is backed by an index from
+indexes.py. Community aggregates and weighted scores are computed by the
+server in update and aggregation pipelines. overall_rating comes from the
+application's formula instead, so it is written conditionally on the ratings
+it was computed from.
+"""
+import asyncio
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Dict, Iterable, List, Optional, Sequence
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReplaceOne, ReturnDocument
+from pymongo.errors import BulkWriteError
+from pymongo.errors import DuplicateKeyError as MongoDuplicateKeyError
+
+from indexes import JOB_INDEXES, LIST_SORT, RATING_EVENT_INDEXES, ensure_indexes
+from storage.base import (
+    DocumentStore, DuplicateKeyError, MovieRepository, OverallRating, PageKey, RatingEventStore, Storage,
+    Weights, WriteConflictError, natural_key,
+)
+
+# Ids per $in when a write targets an unbounded id list
+ID_CHUNK_SIZE = 10000
+# Tries of a write conditional on the ratings it read before giving up on a busy movie
+CONDITIONAL_WRITE_ATTEMPTS = 5
+# Single-document writes of one batch in flight at once, so a large batch cannot
+# take over the connection pool
+DOCUMENT_WRITE_CONCURRENCY = 16
+
+
+def projection(fields: Optional[Sequence[str]]) -> Dict[str, int]:
+    if fields is None:
+        return {"_id": 0}
+    return {"_id": 0, **{field: 1 for field in fields}}
+
+
+def after_page_key(after: PageKey) -> Dict:
+    """Query clause selecting the movies that sort after a (created_at, id) page key"""
+    created_at, movie_id = after
+    # The top-level range bounds the index scan; the $or breaks created_at ties on id
+    return {
+        "created_at": {"$lte": created_at},
+        "$or": [{"created_at": {"$lt": created_at}}, {"id": {"$lt": movie_id}}],
+    }
+
+
+def ratings_match(ratings: Dict[str, float]) -> Dict:
+    """Query clause matching a movie whose ratings are still the given ones"""
+    return {f"ratings.{category}": value for category, value in ratings.items()}
+
+
+def weighted_score_expression(weights: Weights) -> Dict:
+    """Aggregation expression for the weighted mean of the rating categories"""
+    return {"$add": [{"$multiply": [f"$ratings.{category}", weight]} for category, weight in weights]}
+
+
+def welford_add(path: str, value: Any) -> Dict:
+    """Expression for the running aggregate at `path` with one more value"""
+    return {"$let": {
+        "vars": {
+            "n": {"$add": [{"$ifNull": [f"${path}.count", 0]}, 1]},
+            "mean": {"$ifNull": [f"${path}.mean", 0]},
+            "m2": {"$ifNull": [f"${path}.m2", 0]},
+        },
+        "in": {"$let": {
+            "vars": {"next_mean": {"$add": ["$$mean", {"$divide": [{"$subtract": [value, "$$mean"]}, "$$n"]}]}},
+            "in": {
+                "count": "$$n",
+                "mean": "$$next_mean",
+                "m2": {"$add": ["$$m2", {"$multiply": [
+                    {"$subtract": [value, "$$mean"]}, {"$subtract": [value, "$$next_mean"]}
+                ]}]},
+            },
+        }},
+    }}
+
+
+def welford_remove(path: str, value: Any) -> Dict:
+    """Expression for the running aggregate at `path` with one earlier value taken out"""
+    return {"$let": {
+        "vars": {
+            "n": {"$subtract": [{"$ifNull": [f"${path}.count", 1]}, 1]},
+            "mean": {"$ifNull": [f"${path}.mean", 0]},
+            "m2": {"$ifNull": [f"${path}.m2", 0]},
+        },
+        "in": {"$let": {
+            "vars": {"next_mean": {"$cond": [
+                {"$lte": ["$$n", 0]}, 0,
+                {"$subtract": ["$$mean", {"$divide": [{"$subtract": [value, "$$mean"]}, "$$n"]}]}
+            ]}},
+            "in": {
+                "count": {"$max": ["$$n", 0]},
+                "mean": "$$next_mean",
+                # Clamped: rounding can leave a tiny negative m2 once the last value is removed
+                "m2": {"$cond": [{"$lte": ["$$n", 0]}, 0, {"$max": [0, {"$subtract": ["$$m2", {"$multiply": [
+                    {"$subtract": [value, "$$mean"]}, {"$subtract": [value, "$$next_mean"]}
+                ]}]}]}]},
+            },
+        }},
+    }}
+
+
+async def gather_bounded(writes: Iterable[Awaitable], limit: int = DOCUMENT_WRITE_CONCURRENCY,
+                         return_exceptions: bool = False) -> List[Any]:
+    """Results of the writes, in order, with at most `limit` of them running at once"""
+    slots = asyncio.Semaphore(limit)
+
+    async def run(write):
+        async with slots:
+            return await write
+    return await asyncio.gather(*[run(write) for write in writes], return_exceptions=return_exceptions)
+
+
+def write_errors(error: BulkWriteError, positions: Sequence[int]) -> Dict[int, str]:
+    return {
+        positions[write_error['index']]: write_error.get('errmsg', 'Write error')
+        for write_error in error.details.get('writeErrors', [])
+    }
+
+
+class MongoMovieRepository(MovieRepository):
+    def __init__(self, collection, overall_rating: OverallRating):
+        self.collection = collection
+        self.overall_rating = overall_rating
+
+    async def aggregate(self, pipeline: List[Dict]) -> List[Dict]:
+        return await self.collection.aggregate(pipeline).to_list(length=None)
+
+    async def get(self, movie_id, fields=None):
+        return await self.collection.find_one({"id": movie_id}, projection(fields))
+
+    async def get_many(self, ids, fields=None):
+        return await self.collection.find({"id": {"$in": list(ids)}}, projection(fields)).to_list(length=None)
+
+    async def find_page(self, filters, limit, after=None, fields=None):
+        query = dict(filters)
+        if after:
+            query.update(after_page_key(after))
+        cursor = self.collection.find(query, projection(fields)).sort(LIST_SORT).limit(limit)
+        return await cursor.to_list(length=limit)
+
+    async def scan(self, filters=None, fields=None, batch_size=500) -> AsyncIterator[Dict]:
+        cursor = self.collection.find(filters or {}, projection(fields)).sort(LIST_SORT).batch_size(batch_size)
+        async for movie in cursor:
+            yield movie
+
+    async def top(self, field, n, platforms, content_types, fields=None):
+        # Every dimension is spelled out as $in, so each (platform, content_type) pair
+        # is a short walk of the ranking index that Mongo merges in order, instead
+        # of an in-memory sort of the collection
+        query = {
+            'streaming_platform': platforms[0] if len(platforms) == 1 else {"$in": list(platforms)},
+            'content_type': content_types[0] if len(content_types) == 1 else {"$in": list(content_types)},
+        }
+        cursor = self.collection.find(query, projection(fields)).sort([(field, -1), ("id", 1)]).limit(n)
+        return await cursor.to_list(length=n)
+
+    async def rank_weighted(self, filters, weights, limit, fields=None):
+        # $sort followed by $limit keeps only the running top `limit` documents, so
+        # the server never holds (or sends) more than one page
+        stages = [
+            {"$match": filters},
+            {"$addFields": {"weighted_score": weighted_score_expression(weights)}},
+            {"$sort": {"weighted_score": -1, "id": 1}},
+            {"$limit": limit},
+            {"$addFields": {"weighted_score": {"$round": ["$weighted_score", 2]}}},
+            {"$project": projection(None if fields is None else [*fields, "weighted_score"])},
+        ]
+        return await self.collection.aggregate(stages).to_list(length=limit)
+
+    async def rated_ids(self, filters):
+        query = {**filters, "community_ratings": {"$exists": True}}
+        return [movie['id'] async for movie in self.collection.find(query, {"_id": 0, "id": 1})]
+
+    async def ids_after(self, last_id, limit):
+        query = {"id": {"$gt": last_id}} if last_id else {}
+        batch = await self.collection.find(query, {"_id": 0, "id": 1}).sort("id", 1).to_list(length=limit)
+        return [movie['id'] for movie in batch]
+
+    async def count(self):
+        # From collection metadata, without scanning the id index
+        return await self.collection.estimated_document_count()
+
+    async def insert(self, movie):
+        try:
+            await self.collection.insert_one(dict(movie))
+        except MongoDuplicateKeyError as e:
+            raise DuplicateKeyError(str(e))
+
+    async def insert_many(self, movies):
+        try:
+            await self.collection.insert_many([dict(movie) for movie in movies], ordered=False)
+        except BulkWriteError as e:
+            return write_errors(e, range(len(movies)))
+        return {}
+
+    async def replace_by_natural_key(self, movies, keep=()):
+        # The movies already holding the keys are read with one $or query, then every
+        # row goes out in one unordered bulk_write of upserting replacements. A
+        # replacement only matches the movie as it was read (same updated_at and
+        # `keep` fields); if that movie changed since, the upsert collides with its
+        # unique id and the row falls back to a single atomic find_one_and_update.
+        if not movies:
+            return {}, {}
+        current = {}
+        keys = {natural_key(movie) for movie in movies}
+        query = {"$or": [{"title": title, "year": year, "streaming_platform": platform}
+                         for title, year, platform in keys]}
+        async for movie in self.collection.find(query, projection(None)).sort("id", 1):
+            current.setdefault(natural_key(movie), movie)
+
+        operations = []
+        for movie in movies:
+            before = current.get(natural_key(movie))
+            if before is None:
+                operations.append(ReplaceOne({"id": movie['id']}, dict(movie), upsert=True))
+                continue
+            kept = {field: before.get(field) for field in keep}
+            replacement = {**movie, **{field: value for field, value in kept.items() if value is not None}}
+            operations.append(ReplaceOne(
+                {**kept, "updated_at": before.get('updated_at')}, replacement, upsert=True
+            ))
+
+        errors, conflicts = {}, []
+        try:
+            result = await self.collection.bulk_write(operations, ordered=False)
+            upserted = result.upserted_ids
+        except BulkWriteError as e:
+            upserted = {item['index']: item['_id'] for item in e.details.get('upserted', [])}
+            for position, message in write_errors(e, range(len(movies))).items():
+                if current.get(natural_key(movies[position])) is not None and "E11000" in message:
+                    conflicts.append(position)
+                else:
+                    errors[position] = message
+        replaced = {
+            position: current[natural_key(movie)]
+            for position, movie in enumerate(movies)
+            if position not in errors and position not in conflicts and position not in upserted
+            and natural_key(movie) in current
+        }
+
+        results = await gather_bounded(
+            [self.replace_one(movies[position], keep) for position in conflicts], return_exceptions=True
+        )
+        for position, result in zip(conflicts, results):
+            if isinstance(result, Exception):
+                errors[position] = str(result)
+            elif result is not None:
+                replaced[position] = result
+        return errors, replaced
+
+    async def replace_one(self, movie, keep):
+        """Replace the movie with the same natural key in one find_one_and_update, returning it as it was"""
+        # The $project stage replaces every field (keeping `keep` ones), like a
+        # replacement, and on an upsert $ifNull falls back to the movie's own values.
+        stage = {field: {"$literal": value} for field, value in movie.items() if field not in keep}
+        stage.update({
+            field: {"$ifNull": [f"${field}", {"$literal": movie[field]}]} if field in movie else 1
+            for field in keep
+        })
+        return await self.collection.find_one_and_update(
+            {"title": movie['title'], "year": movie['year'], "streaming_platform": movie['streaming_platform']},
+            [{"$project": stage}],
+            projection=projection(None),
+            sort=[("id", 1)],
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        )
+
+    async def update(self, movie_id, fields):
+        return await self.collection.find_one_and_update(
+            {"id": movie_id},
+            {"$set": fields},
+            projection=projection(None),
+            return_document=ReturnDocument.BEFORE
+        )
+
+    async def patch(self, movie_id, fields, ratings):
+        changes = {**fields, **{f"ratings.{category}": value for category, value in ratings.items()}}
+        query = {"id": movie_id}
+        for _ in range(CONDITIONAL_WRITE_ATTEMPTS):
+            if ratings:
+                # overall_rating is computed from the merged ratings read here, and the
+                # write only applies if no other write changed them in the meantime
+                current = await self.collection.find_one({"id": movie_id}, projection(["ratings"]))
+                if current is None:
+                    return None
+                changes['overall_rating'] = self.overall_rating({**current['ratings'], **ratings})
+                query = {"id": movie_id, **ratings_match(current['ratings'])}
+            before = await self.collection.find_one_and_update(
+                query,
+                {"$set": changes},
+                projection=projection(None),
+                return_document=ReturnDocument.BEFORE
+            )
+            if before is not None or not ratings:
+                return before
+        raise WriteConflictError(f"Movie {movie_id} kept changing during the update")
+
+    async def rate(self, movie_id, added, removed):
+        pipeline = []
+        if removed:
+            pipeline.append({"$set": {
+                f"community_ratings.{category}": welford_remove(f"community_ratings.{category}", {"$literal": value})
+                for category, value in removed.items()
+            }})
+        pipeline.append({"$set": {
+            f"community_ratings.{category}": welford_add(f"community_ratings.{category}", {"$literal": value})
+            for category, value in added.items()
+        }})
+        return await self.collection.find_one_and_update(
+            {"id": movie_id},
+            pipeline,
+            projection=projection(None),
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def recompute_overall(self, ids):
+        # Only the movies whose value changes are written (so updated_at only moves
+        # then), each on the condition that its ratings are still the ones read.
+        # One update per movie returns the document the write actually replaced,
+        # which a bulk_write cannot; at most DOCUMENT_WRITE_CONCURRENCY run at once
+        movies = self.collection.find({"id": {"$in": list(ids)}}, projection(["id", "ratings", "overall_rating"]))
+        now = datetime.utcnow()
+        writes = []
+        async for movie in movies:
+            overall = self.overall_rating(movie['ratings'])
+            if overall != movie['overall_rating']:
+                writes.append(self.collection.find_one_and_update(
+                    {"id": movie['id'], **ratings_match(movie['ratings'])},
+                    {"$set": {"overall_rating": overall, "updated_at": now}},
+                    projection=projection(None),
+                    return_document=ReturnDocument.BEFORE
+                ))
+        return [
+            (before, {**before, "overall_rating": self.overall_rating(before['ratings']), "updated_at": now})
+            for before in await gather_bounded(writes) if before is not None
+        ]
+
+    async def delete(self, movie_id):
+        return await self.collection.find_one_and_delete({"id": movie_id}, projection=projection(None))
+
+    async def delete_many(self, filters):
+        result = await self.collection.delete_many(dict(filters))
+        return result.deleted_count
+
+
+class MongoDocumentStore(DocumentStore):
+    def __init__(self, collection, key_field: str):
+        self.collection = collection
+        self.key_field = key_field
+
+    async def get(self, key, fields=None):
+        return await self.collection.find_one({self.key_field: key}, projection(fields))
+
+    async def find(self, **equals):
+        return await self.collection.find(equals, projection(None)).to_list(length=None)
+
+    async def insert(self, document):
+        await self.collection.insert_one(dict(document))
+
+    async def replace(self, key, document):
+        await self.collection.replace_one({self.key_field: key}, {**document, self.key_field: key}, upsert=True)
+
+    async def update(self, key, set=None, inc=None, upsert=False):
+        update: Dict[str, Dict] = {}
+        if set:
+            update["$set"] = set
+        if inc:
+            update["$inc"] = inc
+        if update:
+            await self.collection.update_one({self.key_field: key}, update, upsert=upsert)
+
+
+class MongoRatingEventStore(RatingEventStore):
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def get(self, movie_id, user_id):
+        return await self.collection.find_one({"movie_id": movie_id, "user_id": user_id}, projection(None))
+
+    async def compare_and_set(self, movie_id, user_id, expected, event):
+        key = {"movie_id": movie_id, "user_id": user_id}
+        if expected is None:
+            if event is None:
+                return await self.collection.find_one(key, {"_id": 1}) is None
+            # The unique (movie_id, user_id) index turns away a concurrent first rating
+            try:
+                await self.collection.insert_one(dict(event))
+            except MongoDuplicateKeyError:
+                return False
+            return True
+        if event is None:
+            result = await self.collection.delete_one({**key, "id": expected})
+            return result.deleted_count == 1
+        result = await self.collection.replace_one({**key, "id": expected}, dict(event))
+        return result.matched_count == 1
+
+    async def delete_for_movie(self, movie_id):
+        await self.collection.delete_many({"movie_id": movie_id})
+
+    async def delete_for_movies(self, movie_ids):
+        # Chunked to keep each $in well below the command size limit
+        for start in range(0, len(movie_ids), ID_CHUNK_SIZE):
+            await self.collection.delete_many({"movie_id": {"$in": list(movie_ids[start:start + ID_CHUNK_SIZE])}})
+
+    async def delete_all(self):
+        await self.collection.delete_many({})
+
+
+class MongoStorage(Storage):
+    name = "mongo"
+    native_aggregation = True
+
+    def __init__(self, database, overall_rating: OverallRating, client: Optional[AsyncIOMotorClient] = None):
+        self.client = client
+        self.db = database
+        self.movies = MongoMovieRepository(database.movies, overall_rating)
+        self.stats = MongoDocumentStore(database.stats, "_id")
+        self.jobs = MongoDocumentStore(database.jobs, "id")
+        self.rating_events = MongoRatingEventStore(database.rating_events)
+
+    @classmethod
+    def connect(cls, url: str, db_name: str, overall_rating: OverallRating) -> "MongoStorage":
+        client = AsyncIOMotorClient(url)
+        return cls(client[db_name], overall_rating, client)
+
+    async def setup(self):
+        await ensure_indexes(self.db.movies)
+        await ensure_indexes(self.db.rating_events, RATING_EVENT_INDEXES)
+        await ensure_indexes(self.db.jobs, JOB_INDEXES)
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
@@ -0,0 +1,471 @@
+"""Embedded SQLite engine.
+
+Movies are stored as JSON documents next to typed columns for every field
+that is filtered, sorted or ranked on. The column indexes mirror the Mongo
+ones in indexes.py, so list pages, leaderboards and natural key lookups are
+index walks here too. Weighted rankings are computed in SQL with a top-N
+sort; stats are folded over a scan by the server.
+
+All statements run on one connection owned by a single worker thread: the
+event loop never blocks on disk I/O, and each operation (including
+read-modify-write ones such as patch) is atomic with respect to the others.
+"""
+import asyncio
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import orjson
+
+from indexes import RANKED_FIELDS
+from storage.base import (
+    DATETIME_FIELDS, DocumentStore, DuplicateKeyError, Filters, MovieRepository, OverallRating,
+    RatingEventStore, Storage, apply_patch, apply_rating, get_path, increment_path, matches,
+    natural_key, plain, project, set_path,
+)
+
+# Columns filtered on besides the ranked ones
+FILTER_COLUMNS = ("title", "year", "streaming_platform", "content_type")
+RANKED_COLUMNS = {field: field.replace('.', '_') for field in RANKED_FIELDS}
+MOVIE_COLUMNS = ("id", *FILTER_COLUMNS, "created_at", *RANKED_COLUMNS.values(), "document")
+
+SCHEMA = [
+    f"""CREATE TABLE IF NOT EXISTS movies (
+        id TEXT PRIMARY KEY,
+        title TEXT NOT NULL,
+        year INTEGER NOT NULL,
+        streaming_platform TEXT NOT NULL,
+        content_type TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        {", ".join(f"{column} REAL NOT NULL" for column in RANKED_COLUMNS.values())},
+        document TEXT NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS created_at_id ON movies (created_at DESC, id DESC)",
+    "CREATE INDEX IF NOT EXISTS type_created_at_id ON movies (content_type, created_at DESC, id DESC)",
+    "CREATE INDEX IF NOT EXISTS platform_created_at_id ON movies (streaming_platform, created_at DESC, id DESC)",
+    "CREATE INDEX IF NOT EXISTS platform_type_created_at_id"
+    " ON movies (streaming_platform, content_type, created_at DESC, id DESC)",
+    *[
+        f"CREATE INDEX IF NOT EXISTS platform_type_{column}_id"
+        f" ON movies (streaming_platform, content_type, {column} DESC, id)"
+        for column in RANKED_COLUMNS.values()
+    ],
+    "CREATE INDEX IF NOT EXISTS natural_key ON movies (title, year, streaming_platform)",
+    """CREATE TABLE IF NOT EXISTS documents (
+        collection TEXT NOT NULL,
+        key TEXT NOT NULL,
+        document TEXT NOT NULL,
+        PRIMARY KEY (collection, key)
+    )""",
+    """CREATE TABLE IF NOT EXISTS rating_events (
+        movie_id TEXT NOT NULL,
+        user_id TEXT NOT NULL,
+        document TEXT NOT NULL,
+        PRIMARY KEY (movie_id, user_id)
+    )""",
+]
+
+
+def timestamp(value: datetime) -> str:
+    """Fixed-width text form of a datetime, so columns sort chronologically"""
+    return value.isoformat(timespec='microseconds')
+
+
+def encode(document: Dict) -> str:
+    return orjson.dumps(plain(document)).decode()
+
+
+def decode(text: str) -> Dict:
+    document = orjson.loads(text)
+    for field in DATETIME_FIELDS:
+        if isinstance(document.get(field), str):
+            document[field] = datetime.fromisoformat(document[field])
+    return document
+
+
+def movie_row(movie: Dict) -> Tuple:
+    return (
+        movie['id'],
+        *(plain(movie[column]) for column in FILTER_COLUMNS),
+        timestamp(movie['created_at']),
+        *(get_path(movie, field) for field in RANKED_COLUMNS),
+        encode(movie),
+    )
+
+
+def where(filters: Optional[Filters]) -> Tuple[str, List[Any]]:
+    """WHERE clause for equality filters on the filter columns"""
+    clauses, values = [], []
+    for field, value in (filters or {}).items():
+        if field not in FILTER_COLUMNS:
+            raise ValueError(f"Cannot filter on {field}")
+        clauses.append(f"{field} = ?")
+        values.append(plain(value))
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), values
+
+
+class SQLiteDatabase:
+    """One connection used from one worker thread; connecting creates the schema"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._connection: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path)
+            if self.path != ":memory:":
+                self._connection.execute("PRAGMA journal_mode=WAL")
+                self._connection.execute("PRAGMA synchronous=NORMAL")
+            for statement in SCHEMA:
+                self._connection.execute(statement)
+        return self._connection
+
+    def _call(self, function: Callable, args: Tuple) -> Any:
+        connection = self._connect()
+        try:
+            result = function(connection, *args)
+            connection.commit()
+            return result
+        except BaseException:
+            connection.rollback()
+            raise
+
+    async def run(self, function: Callable[..., Any], *args: Any) -> Any:
+        """Run function(connection, *args) on the worker thread, committing on success"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._call, function, args)
+
+    def close(self):
+        """Close the connection and stop the worker; a later run() starts over"""
+        def disconnect():
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+        if self._executor is not None:
+            self._executor.submit(disconnect)
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+class SQLiteMovieRepository(MovieRepository):
+    def __init__(self, database: SQLiteDatabase, overall_rating: OverallRating):
+        self.database = database
+        self.overall_rating = overall_rating
+
+    # Statements, run on the worker thread
+
+    @staticmethod
+    def _load(connection, movie_id: str) -> Optional[Dict]:
+        row = connection.execute("SELECT document FROM movies WHERE id = ?", (movie_id,)).fetchone()
+        return None if row is None else decode(row[0])
+
+    @staticmethod
+    def _store(connection, movie: Dict):
+        columns = ", ".join(MOVIE_COLUMNS)
+        placeholders = ", ".join("?" for _ in MOVIE_COLUMNS)
+        connection.execute(f"INSERT INTO movies ({columns}) VALUES ({placeholders})", movie_row(movie))
+
+    @staticmethod
+    def _restore(connection, movie: Dict):
+        assignments = ", ".join(f"{column} = ?" for column in MOVIE_COLUMNS[1:])
+        row = movie_row(movie)
+        connection.execute(f"UPDATE movies SET {assignments} WHERE id = ?", (*row[1:], row[0]))
+
+    def _modify(self, connection, movie_id: str, change: Callable[[Dict], None]) -> Optional[Dict]:
+        """Read, change and write back a movie; returns the movie before"""
+        movie = self._load(connection, movie_id)
+        if movie is None:
+            return None
+        before = decode(encode(movie))
+        change(movie)
+        self._restore(connection, movie)
+        return before
+
+    @staticmethod
+    def _page(connection, filters, limit, after) -> List[Dict]:
+        clause, values = where(filters)
+        if after:
+            created_at, movie_id = after
+            clause += (" AND " if clause else " WHERE ") + "(created_at < ? OR (created_at = ? AND id < ?))"
+            values += [timestamp(created_at), timestamp(created_at), movie_id]
+        rows = connection.execute(
+            f"SELECT document FROM movies{clause} ORDER BY created_at DESC, id DESC LIMIT ?", (*values, limit)
+        ).fetchall()
+        return [decode(row[0]) for row in rows]
+
+    # Reads
+
+    async def get(self, movie_id, fields=None):
+        movie = await self.database.run(self._load, movie_id)
+        return None if movie is None else project(movie, fields)
+
+    async def get_many(self, ids, fields=None):
+        def select(connection):
+            placeholders = ", ".join("?" for _ in ids)
+            return connection.execute(f"SELECT document FROM movies WHERE id IN ({placeholders})", list(ids)).fetchall()
+        if not ids:
+            return []
+        return [project(decode(row[0]), fields) for row in await self.database.run(select)]
+
+    async def find_page(self, filters, limit, after=None, fields=None):
+        return [project(movie, fields) for movie in await self.database.run(self._page, filters, limit, after)]
+
+    async def scan(self, filters=None, fields=None, batch_size=500):
+        # Keyset pagination, so no statement stays open between batches
+        after = None
+        while True:
+            batch = await self.database.run(self._page, filters, batch_size, after)
+            for movie in batch:
+                yield project(movie, fields)
+            if len(batch) < batch_size:
+                break
+            after = (batch[-1]['created_at'], batch[-1]['id'])
+
+    async def top(self, field, n, platforms, content_types, fields=None):
+        def select(connection):
+            return connection.execute(
+                f"SELECT document FROM movies"
+                f" WHERE streaming_platform IN ({', '.join('?' for _ in platforms)})"
+                f" AND content_type IN ({', '.join('?' for _ in content_types)})"
+                f" ORDER BY {RANKED_COLUMNS[field]} DESC, id LIMIT ?",
+                (*plain(list(platforms)), *plain(list(content_types)), n)
+            ).fetchall()
+        return [project(decode(row[0]), fields) for row in await self.database.run(select)]
+
+    async def rank_weighted(self, filters, weights, limit, fields=None):
+        def select(connection):
+            clause, values = where(filters)
+            score = " + ".join(f"{RANKED_COLUMNS['ratings.' + category]} * ?" for category, _ in weights)
+            return connection.execute(
+                f"SELECT document, {score} AS weighted_score FROM movies{clause}"
+                f" ORDER BY weighted_score DESC, id LIMIT ?",
+                (*[weight for _, weight in weights], *values, limit)
+            ).fetchall()
+        ranked = []
+        for document, score in await self.database.run(select):
+            movie = project(decode(document), fields)
+            movie['weighted_score'] = round(score, 2)
+            ranked.append(movie)
+        return ranked
+
+    async def rated_ids(self, filters):
+        def select(connection):
+            clause, values = where(filters)
+            clause += (" AND " if clause else " WHERE ") + "json_type(document, '$.community_ratings') IS NOT NULL"
+            return [row[0] for row in connection.execute(f"SELECT id FROM movies{clause}", values).fetchall()]
+        return await self.database.run(select)
+
+    async def ids_after(self, last_id, limit):
+        def select(connection):
+            rows = connection.execute(
+                "SELECT id FROM movies WHERE id > ? ORDER BY id LIMIT ?", (last_id or "", limit)
+            ).fetchall()
+            return [row[0] for row in rows]
+        return await self.database.run(select)
+
+    async def count(self):
+        return await self.database.run(lambda connection: connection.execute("SELECT COUNT(*) FROM movies").fetchone()[0])
+
+    # Writes
+
+    async def insert(self, movie):
+        try:
+            await self.database.run(self._store, movie)
+        except sqlite3.IntegrityError as e:
+            raise DuplicateKeyError(str(e))
+
+    async def insert_many(self, movies):
+        def insert(connection):
+            errors = {}
+            for position, movie in enumerate(movies):
+                try:
+                    self._store(connection, movie)
+                except sqlite3.IntegrityError as e:
+                    # Only the failing statement is undone, the transaction goes on
+                    errors[position] = str(e)
+            return errors
+        return await self.database.run(insert)
+
+    async def replace_by_natural_key(self, movies, keep=()):
+        def replace(connection):
+            errors, replaced = {}, {}
+            for position, movie in enumerate(movies):
+                row = connection.execute(
+                    "SELECT document FROM movies WHERE title = ? AND year = ? AND streaming_platform = ? ORDER BY id LIMIT 1",
+                    natural_key(movie)
+                ).fetchone()
+                before = None if row is None else decode(row[0])
+                if before is not None:
+                    movie = {**movie, **{field: before[field] for field in keep if field in before}}
+                connection.execute("SAVEPOINT replace_movie")
+                try:
+                    if before is not None:
+                        connection.execute("DELETE FROM movies WHERE id = ?", (before['id'],))
+                    self._store(connection, movie)
+                    if before is not None:
+                        replaced[position] = before
+                except sqlite3.IntegrityError as e:
+                    connection.execute("ROLLBACK TO replace_movie")
+                    errors[position] = str(e)
+                connection.execute("RELEASE replace_movie")
+            return errors, replaced
+        return await self.database.run(replace)
+
+    async def update(self, movie_id, fields):
+        return await self.database.run(self._modify, movie_id, lambda movie: movie.update(plain(fields)))
+
+    async def patch(self, movie_id, fields, ratings):
+        return await self.database.run(
+            self._modify, movie_id, lambda movie: apply_patch(movie, fields, ratings, self.overall_rating)
+        )
+
+    async def rate(self, movie_id, added, removed):
+        def rate(connection):
+            if self._modify(connection, movie_id, lambda movie: apply_rating(movie, added, removed)) is None:
+                return None
+            return self._load(connection, movie_id)
+        return await self.database.run(rate)
+
+    async def recompute_overall(self, ids):
+        def recompute(connection):
+            changes, now = [], datetime.utcnow()
+            for movie_id in ids:
+                movie = self._load(connection, movie_id)
+                if movie is None or movie['overall_rating'] == self.overall_rating(movie['ratings']):
+                    continue
+                before = self._modify(connection, movie_id, lambda movie: movie.update(
+                    overall_rating=self.overall_rating(movie['ratings']), updated_at=now
+                ))
+                changes.append((before, self._load(connection, movie_id)))
+            return changes
+        return await self.database.run(recompute)
+
+    async def delete(self, movie_id):
+        def delete(connection):
+            movie = self._load(connection, movie_id)
+            if movie is not None:
+                connection.execute("DELETE FROM movies WHERE id = ?", (movie_id,))
+            return movie
+        return await self.database.run(delete)
+
+    async def delete_many(self, filters):
+        def delete(connection):
+            clause, values = where(filters)
+            return connection.execute(f"DELETE FROM movies{clause}", values).rowcount
+        return await self.database.run(delete)
+
+
+class SQLiteDocumentStore(DocumentStore):
+    def __init__(self, database: SQLiteDatabase, collection: str, key_field: str):
+        self.database = database
+        self.collection = collection
+        self.key_field = key_field
+
+    def _load(self, connection, key: str) -> Optional[Dict]:
+        row = connection.execute(
+            "SELECT document FROM documents WHERE collection = ? AND key = ?", (self.collection, key)
+        ).fetchone()
+        return None if row is None else decode(row[0])
+
+    def _store(self, connection, key: str, document: Dict):
+        connection.execute(
+            "INSERT OR REPLACE INTO documents (collection, key, document) VALUES (?, ?, ?)",
+            (self.collection, key, encode({**document, self.key_field: key}))
+        )
+
+    async def get(self, key, fields=None):
+        document = await self.database.run(self._load, key)
+        return None if document is None else project(document, fields)
+
+    async def find(self, **equals):
+        def select(connection):
+            rows = connection.execute("SELECT document FROM documents WHERE collection = ?", (self.collection,))
+            return [decode(row[0]) for row in rows.fetchall()]
+        return [document for document in await self.database.run(select) if matches(document, equals)]
+
+    async def insert(self, document):
+        def insert(connection):
+            connection.execute(
+                "INSERT INTO documents (collection, key, document) VALUES (?, ?, ?)",
+                (self.collection, document[self.key_field], encode(document))
+            )
+        await self.database.run(insert)
+
+    async def replace(self, key, document):
+        await self.database.run(self._store, key, document)
+
+    async def update(self, key, set=None, inc=None, upsert=False):
+        def update(connection):
+            document = self._load(connection, key)
+            if document is None:
+                if not upsert:
+                    return
+                document = {}
+            for path, value in plain(set or {}).items():
+                set_path(document, path, value)
+            for path, amount in (inc or {}).items():
+                increment_path(document, path, amount)
+            self._store(connection, key, document)
+        await self.database.run(update)
+
+
+class SQLiteRatingEventStore(RatingEventStore):
+    def __init__(self, database: SQLiteDatabase):
+        self.database = database
+
+    @staticmethod
+    def _load(connection, movie_id: str, user_id: str) -> Optional[Dict]:
+        row = connection.execute(
+            "SELECT document FROM rating_events WHERE movie_id = ? AND user_id = ?", (movie_id, user_id)
+        ).fetchone()
+        return None if row is None else decode(row[0])
+
+    async def get(self, movie_id, user_id):
+        return await self.database.run(self._load, movie_id, user_id)
+
+    async def compare_and_set(self, movie_id, user_id, expected, event):
+        def compare_and_set(connection):
+            current = self._load(connection, movie_id, user_id)
+            if (current['id'] if current else None) != expected:
+                return False
+            if event is None:
+                connection.execute("DELETE FROM rating_events WHERE movie_id = ? AND user_id = ?", (movie_id, user_id))
+            else:
+                connection.execute(
+                    "INSERT OR REPLACE INTO rating_events (movie_id, user_id, document) VALUES (?, ?, ?)",
+                    (movie_id, user_id, encode(event))
+                )
+            return True
+        return await self.database.run(compare_and_set)
+
+    async def delete_for_movie(self, movie_id):
+        await self.delete_for_movies([movie_id])
+
+    async def delete_for_movies(self, movie_ids):
+        await self.database.run(lambda connection: connection.executemany(
+            "DELETE FROM rating_events WHERE movie_id = ?", [(movie_id,) for movie_id in movie_ids]
+        ))
+
+    async def delete_all(self):
+        await self.database.run(lambda connection: connection.execute("DELETE FROM rating_events"))
+
+
+class SQLiteStorage(Storage):
+    name = "sqlite"
+
+    def __init__(self, path: str, overall_rating: OverallRating):
+        self.database = SQLiteDatabase(path)
+        self.movies = SQLiteMovieRepository(self.database, overall_rating)
+        self.stats = SQLiteDocumentStore(self.database, "stats", "_id")
+        self.jobs = SQLiteDocumentStore(self.database, "jobs", "id")
+        self.rating_events = SQLiteRatingEventStore(self.database)
+
+    async def setup(self):
+        await self.database.run(lambda connection: None)
+
+    def close(self):
+        self.database.close()
@@ -0,0 +1,122 @@
+"""Deterministic synthetic catalog entries for benchmarks and scale tests.
+
+Entries are create payloads, as POST /api/movies takes them. The same
+arguments and seed always produce the same entries.
+
+- generate_movies varies template titles such as SEED_DATA: each entry
+  copies a template, makes the title unique and jitters the year and the
+  rating categories.
+- generate_catalog builds titles from scratch at any scale, with the
+  skew of a real catalog: a few platforms and genres hold most titles,
+  recent years dominate, and the category scores of a title are
+  correlated through a shared quality plus genre-specific strengths.
+"""
+import math
+import random
+from typing import Any, Dict, Iterator, List, Sequence
+
+MIN_YEAR, MAX_YEAR = 1900, 2030
+YEAR_JITTER = 5
+RATING_JITTER = 0.8
+
+# generate_catalog draws every block of this many titles from its own
+# generator, so any range of indexes can be produced without the ones before it
+CATALOG_BLOCK_SIZE = 10000
+LATEST_YEAR = 2025
+# Mean age in years of a title; ages are exponential, so most titles are recent
+MEAN_AGE = 9
+TV_SERIES_SHARE = 0.35
+# Exponent of the Zipf weights of platforms and genres, in the order given
+ZIPF_EXPONENT = 1.1
+QUALITY_MEAN, QUALITY_SD = 6.8, 1.1
+CATEGORY_NOISE_SD = 0.6
+
+# Genres with their score offsets relative to the title's overall quality
+GENRES: Dict[str, Dict[str, float]] = {
+    "Drama": {"acting": 0.6, "emotional_impact": 0.7, "action_stunts": -1.8},
+    "Comedy": {"story": 0.2, "emotional_impact": -0.3, "action_stunts": -1.5},
+    "Action/Thriller": {"action_stunts": 1.6, "music_sound": 0.4, "story": -0.6},
+    "Crime/Drama": {"story": 0.5, "acting": 0.6, "action_stunts": -0.5},
+    "Documentary": {"cinematography": 0.8, "acting": -1.5, "action_stunts": -2.5},
+    "Sci-Fi": {"cinematography": 0.8, "action_stunts": 0.7, "music_sound": 0.5},
+    "Horror": {"music_sound": 0.8, "emotional_impact": 0.3, "acting": -0.5},
+    "Romance": {"emotional_impact": 0.9, "music_sound": 0.3, "action_stunts": -2.0},
+    "Animated": {"cinematography": 0.6, "music_sound": 0.6, "acting": -0.4},
+    "Fantasy": {"cinematography": 0.9, "action_stunts": 0.8, "story": 0.2},
+    "Historical Drama": {"cinematography": 0.7, "direction": 0.5, "action_stunts": -0.8},
+    "Superhero": {"action_stunts": 1.8, "cinematography": 0.5, "story": -0.8},
+}
+TITLE_WORDS = (
+    ["Silent", "Broken", "Last", "Hidden", "Golden", "Crimson", "Endless", "Distant", "Wild", "Frozen",
+     "Burning", "Lost", "Midnight", "Secret", "Hollow", "Iron", "Paper", "Electric", "Quiet", "Velvet"],
+    ["River", "Empire", "Garden", "Signal", "Harbor", "Kingdom", "Witness", "Orbit", "Summer", "Machine",
+     "Crown", "Frontier", "Letter", "Mirror", "Storm", "Tide", "Voyage", "Alibi", "Legacy", "Horizon"],
+)
+
+
+def clamp(value: float, low: float, high: float) -> float:
+    return min(high, max(low, value))
+
+
+def synthetic_movie(template: Dict[str, Any], index: int, rng: random.Random) -> Dict[str, Any]:
+    """Create payload number `index`, varied from a template"""
+    return {
+        **template,
+        "title": f"{template['title']} #{index}",
+        "year": int(clamp(template['year'] + rng.randint(-YEAR_JITTER, YEAR_JITTER), MIN_YEAR, MAX_YEAR)),
+        "ratings": {
+            category: round(clamp(rng.gauss(score, RATING_JITTER), 0, 10), 1)
+            for category, score in template['ratings'].items()
+        },
+    }
+
+
+def generate_movies(templates: Sequence[Dict[str, Any]], count: int, seed: int = 0,
+                    start: int = 0) -> Iterator[Dict[str, Any]]:
+    """`count` create payloads numbered from `start`, each from a template picked at random"""
+    rng = random.Random(f"{seed}:{start}")
+    for index in range(start, start + count):
+        yield synthetic_movie(rng.choice(templates), index, rng)
+
+
+def zipf_weights(count: int) -> List[float]:
+    return [1 / rank ** ZIPF_EXPONENT for rank in range(1, count + 1)]
+
+
+def catalog_movie(index: int, rng: random.Random, platforms: Sequence[str], platform_weights: Sequence[float],
+                  genres: Sequence[str], genre_weights: Sequence[float], categories: Sequence[str]) -> Dict[str, Any]:
+    genre = rng.choices(genres, genre_weights)[0]
+    offsets = GENRES[genre]
+    quality = rng.gauss(QUALITY_MEAN, QUALITY_SD)
+    first, second = (rng.choice(words) for words in TITLE_WORDS)
+    age = min(int(rng.expovariate(1 / MEAN_AGE)), LATEST_YEAR - MIN_YEAR)
+    return {
+        "title": f"The {first} {second} {index}",
+        "content_type": "tv_series" if rng.random() < TV_SERIES_SHARE else "movie",
+        "year": LATEST_YEAR - age,
+        "genre": genre,
+        "streaming_platform": rng.choices(platforms, platform_weights)[0],
+        "description": f"A {genre.lower()} about the {second.lower()} and those who find it {first.lower()}.",
+        "ratings": {
+            category: round(clamp(quality + offsets.get(category, 0) + rng.gauss(0, CATEGORY_NOISE_SD), 0, 10), 1)
+            for category in categories
+        },
+    }
+
+
+def generate_catalog(count: int, platforms: Sequence[str], categories: Sequence[str], seed: int = 0,
+                     start: int = 0) -> Iterator[Dict[str, Any]]:
+    """Create payloads for titles `start` to `start + count` of the catalog of a seed.
+
+    Platforms are weighted in the order given, most popular first.
+    """
+    platform_weights = zipf_weights(len(platforms))
+    genres = list(GENRES)
+    genre_weights = zipf_weights(len(genres))
+    end = start + count
+    for block in range(start // CATALOG_BLOCK_SIZE, math.ceil(end / CATALOG_BLOCK_SIZE)):
+        rng = random.Random(f"catalog:{seed}:{block}")
+        for index in range(block * CATALOG_BLOCK_SIZE, min(end, (block + 1) * CATALOG_BLOCK_SIZE)):
+            movie = catalog_movie(index, rng, platforms, platform_weights, genres, genre_weights, categories)
+            if index >= start:
+                yield movie
@@ -4,6 +4,7 @@ import json
 import unittest
 import os
 import sys
+import time
 import random
 import uuid
 from dotenv import load_dotenv
@@ -452,8 +453,496 @@ class MovieRatingAPITest(unittest.TestCase):
         # Verify platform distribution
         self.assertIsInstance(data["platform_distribution"], list)
         
+        # Verify histograms and category averages
+        self.assertIsInstance(data["genre_distribution"], list)
+        self.assertIsInstance(data["year_distribution"], list)
+        self.assertEqual(
+            set(data["average_ratings"]),
+            {"story", "acting", "direction", "music_sound", "cinematography",
+             "action_stunts", "emotional_impact", "overall"}
+        )
+        
+        # Verify stats can be limited to one content type
+        response = requests.get(f"{API_URL}/stats", params={"content_type": "tv_series"})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["total_movies"], 0)
+        self.assertEqual(data["total_content"], data["total_tv_shows"])
+        
         print("✅ Get stats test passed")
 
+    def test_18_cursor_pagination(self):
+        """Test paging through movies with the next-page cursor"""
+        # Create enough movies to span several pages
+        for _ in range(3):
+            self.test_02_create_movie()
+        
+        seen_ids = []
+        params = {"limit": 2}
+        while True:
+            response = requests.get(f"{API_URL}/movies", params=params)
+            self.assertEqual(response.status_code, 200)
+            page = response.json()
+            self.assertLessEqual(len(page), 2)
+            seen_ids.extend(movie["id"] for movie in page)
+            
+            next_cursor = response.headers.get("X-Next-Cursor")
+            if not next_cursor:
+                break
+            params["cursor"] = next_cursor
+        
+        # Every movie appears exactly once across pages
+        self.assertEqual(len(seen_ids), len(set(seen_ids)))
+        for movie_id in self.created_movie_ids:
+            self.assertIn(movie_id, seen_ids)
+        
+        # Invalid cursors are rejected
+        response = requests.get(f"{API_URL}/movies", params={"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, 400)
+        
+        print("✅ Cursor pagination test passed")
+
+    def test_19_bulk_create(self):
+        """Test creating a batch of movies with per-item results"""
+        invalid_movie = self.test_movie.copy()
+        invalid_movie["ratings"] = {**self.test_movie["ratings"], "story": 11}
+        batch = [self.test_movie, invalid_movie, self.test_tv_show]
+        
+        response = requests.post(f"{API_URL}/movies/bulk", json=batch)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        
+        # Verify the bad row failed on its own
+        self.assertEqual(data["created"], 2)
+        self.assertEqual(data["failed"], 1)
+        self.assertEqual([r["status"] for r in data["results"]], ["created", "invalid", "created"])
+        self.assertIn("ratings.story", data["results"][1]["error"])
+        
+        for result in data["results"]:
+            if result["status"] == "created":
+                self.created_movie_ids.append(result["id"])
+        
+        # Verify the overall rating was computed for created items
+        response = requests.get(f"{API_URL}/movies/{data['results'][0]['id']}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["overall_rating"], 9.2)
+        
+        print("✅ Bulk create test passed")
+
+    def test_20_conditional_requests(self):
+        """Test ETag / If-None-Match handling on movie reads"""
+        self.test_02_create_movie()
+        movie_id = self.created_movie_ids[-1]
+        
+        # Unchanged resources answer 304
+        for url in (f"{API_URL}/movies/{movie_id}", f"{API_URL}/movies", f"{API_URL}/stats"):
+            response = requests.get(url)
+            self.assertEqual(response.status_code, 200)
+            etag = response.headers.get("ETag")
+            self.assertIsNotNone(etag)
+            
+            response = requests.get(url, headers={"If-None-Match": etag})
+            self.assertEqual(response.status_code, 304)
+        
+        # A write changes the detail ETag
+        response = requests.get(f"{API_URL}/movies/{movie_id}")
+        etag = response.headers["ETag"]
+        requests.put(f"{API_URL}/movies/{movie_id}", json={"title": "Inception (Updated)"})
+        response = requests.get(f"{API_URL}/movies/{movie_id}", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+        
+        print("✅ Conditional requests test passed")
+
+    def test_21_patch_ratings(self):
+        """Test patching a single rating category"""
+        self.test_02_create_movie()
+        movie_id = self.created_movie_ids[-1]
+        
+        response = requests.patch(f"{API_URL}/movies/{movie_id}", json={"ratings": {"story": 2.5}})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        
+        # Only the patched category changed and the overall rating follows it
+        expected_ratings = {**self.test_movie["ratings"], "story": 2.5}
+        self.assertEqual(data["ratings"], expected_ratings)
+        expected_overall = round(sum(expected_ratings.values()) / 7, 1)
+        self.assertEqual(data["overall_rating"], expected_overall)
+        self.assertEqual(data["title"], self.test_movie["title"])
+        
+        # The stored document matches the response
+        response = requests.get(f"{API_URL}/movies/{movie_id}")
+        self.assertEqual(response.json()["overall_rating"], expected_overall)
+        
+        response = requests.patch(f"{API_URL}/movies/{uuid.uuid4()}", json={"ratings": {"story": 2.5}})
+        self.assertEqual(response.status_code, 404)
+        
+        print("✅ Patch ratings test passed")
+
+    def test_22_sparse_fieldsets(self):
+        """Test limiting list responses to selected fields"""
+        self.test_02_create_movie()
+        
+        response = requests.get(f"{API_URL}/movies", params={"fields": "title,overall_rating"})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertGreater(len(data), 0)
+        for movie in data:
+            self.assertEqual(set(movie), {"id", "title", "overall_rating"})
+        
+        response = requests.get(f"{API_URL}/movies", params={"fields": "title,unknown_field"})
+        self.assertEqual(response.status_code, 400)
+        
+        print("✅ Sparse fieldsets test passed")
+
+    def test_23_export_ndjson(self):
+        """Test streaming the catalog as NDJSON"""
+        self.test_02_create_movie()
+        movie_id = self.created_movie_ids[-1]
+        
+        for params in ({"platform": "Netflix"}, {"platform": "Netflix", "compress": "gzip"}):
+            response = requests.get(f"{API_URL}/movies/export", params=params, stream=True)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.headers["Content-Type"].startswith("application/x-ndjson"))
+            
+            movies = [json.loads(line) for line in response.iter_lines() if line]
+            self.assertTrue(all(movie["streaming_platform"] == "Netflix" for movie in movies))
+            self.assertIn(movie_id, [movie["id"] for movie in movies])
+        
+        print("✅ Export NDJSON test passed")
+
+    def test_24_import_csv_upsert(self):
+        """Test importing a CSV upload with upsert on title/year/platform"""
+        columns = ["title", "content_type", "year", "genre", "streaming_platform", "description",
+                   "story", "acting", "direction", "music_sound", "cinematography",
+                   "action_stunts", "emotional_impact"]
+        title = f"Import Test {uuid.uuid4()}"
+        rows = [
+            ",".join(columns),
+            f"{title},movie,2015,Drama,Hulu,,7,7,7,7,7,7,7",
+            f"{title},movie,1800,Drama,Hulu,,7,7,7,7,7,7,7",
+        ]
+        body = "\n".join(rows).encode()
+        
+        response = requests.post(f"{API_URL}/movies/import", params={"format": "csv", "upsert": "true"}, data=body)
+        self.assertEqual(response.status_code, 200)
+        report = response.json()
+        self.assertEqual(report["processed"], 2)
+        self.assertEqual(report["created"], 1)
+        self.assertEqual(report["invalid"], 1)
+        self.assertEqual(report["errors"][0]["line"], 3)
+        
+        # Importing the same title again updates it in place
+        rows[1] = f"{title},movie,2015,Drama,Hulu,,9,9,9,9,9,9,9"
+        body = "\n".join(rows[:2]).encode()
+        response = requests.post(f"{API_URL}/movies/import", params={"format": "csv", "upsert": "true"}, data=body)
+        self.assertEqual(response.json()["updated"], 1)
+        
+        movies = requests.get(f"{API_URL}/movies", params={"platform": "Hulu", "limit": 1000}).json()
+        imported = [movie for movie in movies if movie["title"] == title]
+        self.assertEqual(len(imported), 1)
+        self.assertEqual(imported[0]["overall_rating"], 9.0)
+        self.created_movie_ids.append(imported[0]["id"])
+        
+        print("✅ Import CSV upsert test passed")
+
+    def test_25_top_movies(self):
+        """Test per-category leaderboards"""
+        self.test_02_create_movie()
+        self.test_03_create_tv_show()
+        
+        response = requests.get(f"{API_URL}/movies/top", params={"category": "cinematography", "platform": "Netflix", "n": 5})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertLessEqual(len(data), 5)
+        scores = [movie["ratings"]["cinematography"] for movie in data]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertTrue(all(movie["streaming_platform"] == "Netflix" for movie in data))
+        
+        response = requests.get(f"{API_URL}/movies/top", params={"content_type": "tv_series"})
+        self.assertEqual(response.status_code, 200)
+        scores = [movie["overall_rating"] for movie in response.json()]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        
+        response = requests.get(f"{API_URL}/movies/top", params={"category": "plot_twists"})
+        self.assertEqual(response.status_code, 400)
+        
+        print("✅ Top movies test passed")
+
+    def test_26_search_and_autocomplete(self):
+        """Test full-text search and title autocomplete"""
+        movie_id = self.test_02_create_movie()
+        
+        response = requests.get(f"{API_URL}/search", params={"q": "dream sharing thief"})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertIn(movie_id, [movie["id"] for movie in data])
+        scores = [movie["score"] for movie in data]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        
+        response = requests.get(f"{API_URL}/autocomplete", params={"prefix": "incep"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(movie_id, [suggestion["id"] for suggestion in response.json()])
+        
+        response = requests.get(f"{API_URL}/search", params={"q": ""})
+        self.assertEqual(response.status_code, 422)
+        
+        print("✅ Search and autocomplete test passed")
+
+    def test_27_weighted_ranking(self):
+        """Test ranking by custom category weights"""
+        self.test_02_create_movie()
+        self.test_03_create_tv_show()
+        
+        response = requests.get(f"{API_URL}/movies", params={"weights": "story:3,action_stunts:1", "limit": 10})
+        self.assertEqual(response.status_code, 200)
+        scores = [movie["weighted_score"] for movie in response.json()]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertNotIn("X-Next-Cursor", response.headers)
+        
+        response = requests.get(f"{API_URL}/movies/top", params={"weights": "acting:1", "n": 5})
+        self.assertEqual(response.status_code, 200)
+        for movie in response.json():
+            self.assertAlmostEqual(movie["weighted_score"], movie["ratings"]["acting"], places=2)
+        
+        response = requests.get(f"{API_URL}/movies", params={"weights": "plot_twists:1"})
+        self.assertEqual(response.status_code, 400)
+        
+        print("✅ Weighted ranking test passed")
+
+    def test_28_recompute_overall_job(self):
+        """Test the background overall rating recompute job"""
+        self.test_02_create_movie()
+        
+        response = requests.post(f"{API_URL}/jobs/recompute-overall", params={"batch_size": 100})
+        if response.status_code == 409:
+            print("⚠️ A recompute job is already running, skipping")
+            return
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json()["id"]
+        
+        for _ in range(60):
+            job = requests.get(f"{API_URL}/jobs/{job_id}").json()
+            if job["status"] != "running":
+                break
+            time.sleep(1)
+        self.assertEqual(job["status"], "completed")
+        self.assertGreaterEqual(job["processed"], 1)
+        
+        response = requests.get(f"{API_URL}/jobs/does-not-exist")
+        self.assertEqual(response.status_code, 404)
+        
+        print("✅ Recompute overall job test passed")
+
+    def test_29_community_ratings(self):
+        """Test per-user rating events and running aggregates"""
+        movie_id = self.test_02_create_movie()
+        
+        for user_id, score in (("alice", 8.0), ("bob", 6.0)):
+            response = requests.post(
+                f"{API_URL}/movies/{movie_id}/ratings",
+                json={"user_id": user_id, "ratings": {"story": score}}
+            )
+            self.assertEqual(response.status_code, 200)
+        story = response.json()["categories"]["story"]
+        self.assertEqual(story["count"], 2)
+        self.assertAlmostEqual(story["mean"], 7.0)
+        self.assertAlmostEqual(story["variance"], 2.0)
+        
+        # Rating again replaces the user's previous rating
+        requests.post(f"{API_URL}/movies/{movie_id}/ratings", json={"user_id": "bob", "ratings": {"story": 8.0}})
+        response = requests.get(f"{API_URL}/movies/{movie_id}/ratings")
+        self.assertEqual(response.status_code, 200)
+        story = response.json()["categories"]["story"]
+        self.assertEqual(story["count"], 2)
+        self.assertAlmostEqual(story["mean"], 8.0)
+        self.assertAlmostEqual(story["variance"], 0.0)
+        
+        response = requests.post(f"{API_URL}/movies/{movie_id}/ratings", json={"user_id": "carol", "ratings": {}})
+        self.assertEqual(response.status_code, 400)
+        
+        print("✅ Community ratings test passed")
+
+    def test_30_distributions(self):
+        """Test precomputed rating histograms"""
+        self.test_02_create_movie()
+        
+        response = requests.get(f"{API_URL}/distributions", params={"category": "story", "platform": "Netflix"})
+        self.assertEqual(response.status_code, 200)
+        buckets = response.json()["histograms"]["story"]
+        self.assertEqual(len(buckets), 20)
+        self.assertEqual(buckets[0]["min"], 0)
+        self.assertEqual(buckets[-1]["max"], 10)
+        # The test movie's story score of 9.5 lands in the last bucket
+        self.assertGreaterEqual(buckets[-1]["count"], 1)
+        
+        response = requests.get(f"{API_URL}/distributions")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("overall", response.json()["histograms"])
+        
+        response = requests.get(f"{API_URL}/distributions", params={"category": "plot_twists"})
+        self.assertEqual(response.status_code, 400)
+        
+        print("✅ Distributions test passed")
+
+    def test_31_bulk_delete(self):
+        """Test deleting every title matching a filter in one request"""
+        movie = {**self.test_movie, "title": f"Bulk Delete {uuid.uuid4()}", "streaming_platform": "Other"}
+        response = requests.post(f"{API_URL}/movies", json=movie)
+        self.assertEqual(response.status_code, 200)
+        movie_id = response.json()["id"]
+        
+        # Without a filter the whole catalog would go, so all=true is required
+        response = requests.delete(f"{API_URL}/movies")
+        self.assertEqual(response.status_code, 400)
+        
+        total_before = requests.get(f"{API_URL}/stats").json()["total_movies"]
+        response = requests.delete(f"{API_URL}/movies", params={"platform": "Other", "content_type": "movie"})
+        self.assertEqual(response.status_code, 200)
+        deleted = response.json()["deleted"]
+        self.assertGreaterEqual(deleted, 1)
+        
+        self.assertEqual(requests.get(f"{API_URL}/movies/{movie_id}").status_code, 404)
+        response = requests.get(f"{API_URL}/movies", params={"platform": "Other", "content_type": "movie"})
+        self.assertEqual(response.json(), [])
+        self.assertEqual(requests.get(f"{API_URL}/stats").json()["total_movies"], total_before - deleted)
+        
+        print("✅ Bulk delete test passed")
+
+    def test_32_analytics(self):
+        """Test the rating analytics served from the in-memory matrix"""
+        movie_id = self.test_02_create_movie()
+        self.test_03_create_tv_show()
+        categories = list(self.test_movie["ratings"])
+
+        response = requests.get(f"{API_URL}/analytics/correlations", params={"platform": "Netflix"})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertGreaterEqual(data["count"], 2)
+        self.assertEqual(set(data["correlations"]), set(categories))
+        for category in categories:
+            if data["correlations"][category][category] is not None:
+                self.assertAlmostEqual(data["correlations"][category][category], 1.0, places=4)
+
+        response = requests.get(f"{API_URL}/analytics/percentiles", params={"q": "0,50,100"})
+        self.assertEqual(response.status_code, 200)
+        for values in response.json()["percentiles"].values():
+            self.assertEqual(list(values), ["0", "50", "100"])
+            self.assertLessEqual(values["0"], values["50"])
+            self.assertLessEqual(values["50"], values["100"])
+        for q in ("", "50,150", "median"):
+            response = requests.get(f"{API_URL}/analytics/percentiles", params={"q": q})
+            self.assertEqual(response.status_code, 400)
+
+        response = requests.get(f"{API_URL}/analytics/zscores/{movie_id}", params={"platform": "Netflix"})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["id"], movie_id)
+        self.assertEqual(set(data["zscores"]), set(categories))
+        response = requests.get(f"{API_URL}/analytics/zscores/{uuid.uuid4()}")
+        self.assertEqual(response.status_code, 404)
+
+        response = requests.get(f"{API_URL}/analytics/platforms", params={"content_type": "movie"})
+        self.assertEqual(response.status_code, 200)
+        summary = response.json()["platforms"]
+        netflix = next(item for item in summary if item["platform"] == "Netflix")
+        self.assertGreaterEqual(netflix["count"], 1)
+        self.assertEqual(set(netflix["mean"]), set(categories))
+        counts = [item["count"] for item in summary]
+        self.assertEqual(counts, sorted(counts, reverse=True))
+
+        print("✅ Analytics test passed")
+
+    def test_33_similar_movies(self):
+        """Test nearest neighbours by rating profile"""
+        movie_id = self.test_02_create_movie()
+        self.test_03_create_tv_show()
+        for platform in ("Netflix", "Hulu"):
+            movie = {**self.test_movie, "title": f"Similar {uuid.uuid4()}", "streaming_platform": platform}
+            response = requests.post(f"{API_URL}/movies", json=movie)
+            self.assertEqual(response.status_code, 200)
+            self.created_movie_ids.append(response.json()["id"])
+        categories = list(self.test_movie["ratings"])
+        profile = [self.test_movie["ratings"][category] for category in categories]
+
+        def vector(movie):
+            return [movie["ratings"][category] for category in categories]
+
+        response = requests.get(f"{API_URL}/movies/{movie_id}/similar", params={"k": 5})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(1 <= len(data) <= 5)
+        self.assertNotIn(movie_id, [movie["id"] for movie in data])
+        similarities = [movie["similarity"] for movie in data]
+        self.assertEqual(similarities, sorted(similarities, reverse=True))
+        norm = sum(value ** 2 for value in profile) ** 0.5
+        for movie in data:
+            other = vector(movie)
+            expected = sum(a * b for a, b in zip(profile, other)) / (norm * sum(b ** 2 for b in other) ** 0.5)
+            self.assertAlmostEqual(movie["similarity"], expected, places=3)
+        # Titles with the same ratings are as close as it gets
+        self.assertAlmostEqual(data[0]["similarity"], 1.0, places=4)
+
+        response = requests.get(f"{API_URL}/movies/{movie_id}/similar", params={"k": 5, "metric": "euclidean"})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        distances = [movie["distance"] for movie in data]
+        self.assertEqual(distances, sorted(distances))
+        for movie in data:
+            expected = sum((a - b) ** 2 for a, b in zip(profile, vector(movie))) ** 0.5
+            self.assertAlmostEqual(movie["distance"], expected, places=3)
+        self.assertAlmostEqual(distances[0], 0.0, places=4)
+
+        response = requests.get(f"{API_URL}/movies/{movie_id}/similar", params={"same_platform": "true", "k": 100})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json())
+        self.assertTrue(all(movie["streaming_platform"] == "Netflix" for movie in response.json()))
+
+        response = requests.get(f"{API_URL}/movies/{uuid.uuid4()}/similar")
+        self.assertEqual(response.status_code, 404)
+        response = requests.get(f"{API_URL}/movies/{movie_id}/similar", params={"metric": "manhattan"})
+        self.assertEqual(response.status_code, 422)
+
+        print("✅ Similar movies test passed")
+
+    def test_34_cache_invalidation(self):
+        """Test that cached reads are served until a write invalidates them"""
+        movie_id = self.test_02_create_movie()
+        before = requests.get(f"{API_URL}/cache/stats").json()
+        if not before["enabled"]:
+            print("⚠️ The response cache is disabled, skipping")
+            return
+
+        def counters():
+            stats = requests.get(f"{API_URL}/cache/stats").json()
+            return stats["hits"] - before["hits"], stats["misses"] - before["misses"]
+
+        # First read misses and fills the cache, the second one is a hit
+        self.assertEqual(requests.get(f"{API_URL}/movies/{movie_id}").json()["genre"], "Sci-Fi")
+        self.assertEqual(counters(), (0, 1))
+        self.assertEqual(requests.get(f"{API_URL}/movies/{movie_id}").json()["genre"], "Sci-Fi")
+        self.assertEqual(counters(), (1, 1))
+
+        # A write drops the cached response: the next read misses and returns the new data
+        response = requests.put(f"{API_URL}/movies/{movie_id}", json={"genre": "Thriller"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(requests.get(f"{API_URL}/movies/{movie_id}").json()["genre"], "Thriller")
+        self.assertEqual(counters(), (1, 2))
+
+        # Lists and stats are invalidated by writes to any title
+        params = {"platform": "Netflix", "limit": 1000}
+        ids = [movie["id"] for movie in requests.get(f"{API_URL}/movies", params=params).json()]
+        total = requests.get(f"{API_URL}/stats").json()["total_content"]
+        self.assertEqual([movie["id"] for movie in requests.get(f"{API_URL}/movies", params=params).json()], ids)
+        tv_show_id = self.test_03_create_tv_show()
+        self.assertIn(tv_show_id, [movie["id"] for movie in requests.get(f"{API_URL}/movies", params=params).json()])
+        self.assertEqual(requests.get(f"{API_URL}/stats").json()["total_content"], total + 1)
+
+        stats = requests.get(f"{API_URL}/cache/stats").json()
+        self.assertEqual(stats["hit_ratio"], round(stats["hits"] / (stats["hits"] + stats["misses"]), 4))
+
+        print("✅ Cache invalidation test passed")
+
 if __name__ == "__main__":
     # Run the tests
     unittest.main(argv=['first-arg-is-ignored'], exit=False)
\ No newline at end of file
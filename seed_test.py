@@ -29,18 +29,9 @@ class SeedDataTest(unittest.TestCase):
     
     def clear_database(self):
         """Helper method to clear the database"""
-        # Get all movies
-        response = requests.get(f"{API_URL}/movies")
-        if response.status_code == 200:
-            movies = response.json()
-            # Delete each movie
-            for movie in movies:
-                movie_id = movie["id"]
-                delete_response = requests.delete(f"{API_URL}/movies/{movie_id}")
-                if delete_response.status_code != 200:
-                    print(f"Warning: Failed to delete movie {movie_id}")
-        else:
-            print(f"Warning: Failed to get movies for cleanup, status: {response.status_code}")
+        response = requests.delete(f"{API_URL}/movies", params={"all": "true"})
+        if response.status_code != 200:
+            print(f"Warning: Failed to clear the database, status: {response.status_code}")
 
     def test_01_empty_database_state(self):
         """Test that the database is empty before seeding"""
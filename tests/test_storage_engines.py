@@ -0,0 +1,381 @@
+"""Engine parity tests: the same API calls, through TestClient, on the memory and SQLite engines.
+
+    python -m pytest tests/test_storage_engines.py
+
+Each test starts from an empty catalog on a fresh engine and checks the
+responses against values computed here from the payloads, so both engines
+are held to the same expectations. Every test ends by rebuilding the
+materialized stats and asserting that the incremental updates left no drift.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import unittest
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+
+import httpx  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+import server  # noqa: E402
+from storage import create_storage  # noqa: E402
+from synthetic import generate_catalog  # noqa: E402
+
+CATALOG_SIZE = 60
+PLATFORMS = [platform.value for platform in server.StreamingPlatform]
+
+
+class EngineParityTest:
+    """Mixed into one unittest.TestCase per engine"""
+
+    engine = None
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.previous_storage = server.storage
+        server.storage = create_storage(
+            self.engine,
+            lambda ratings: server.calculate_overall_rating(server.RatingCategories(**ratings)),
+            sqlite_path=os.path.join(self.directory.name, "movies.sqlite3"),
+        )
+        server.response_cache.clear()
+        self.client = TestClient(server.app)
+        self.client.__enter__()
+
+    def tearDown(self):
+        try:
+            response = self.client.post("/api/stats/rebuild")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["drift"], {})
+        finally:
+            self.client.__exit__(None, None, None)
+            server.storage = self.previous_storage
+            self.directory.cleanup()
+
+    def create_catalog(self, count=CATALOG_SIZE, seed=1):
+        payloads = list(generate_catalog(count, PLATFORMS, server.RATING_CATEGORIES, seed))
+        response = self.client.post("/api/movies/bulk", json=payloads)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["created"], count)
+        return self.client.get("/api/movies", params={"limit": count}).json()
+
+    def test_cursor_paging(self):
+        movies = self.create_catalog()
+        keys = [(movie["created_at"], movie["id"]) for movie in movies]
+        self.assertEqual(keys, sorted(keys, reverse=True))
+
+        for params in ({}, {"platform": "Netflix"}, {"platform": "Netflix", "content_type": "movie"}):
+            expected = [
+                movie["id"] for movie in movies
+                if all(movie[{"platform": "streaming_platform"}.get(name, name)] == value for name, value in params.items())
+            ]
+            paged, cursor = [], None
+            while True:
+                response = self.client.get("/api/movies", params={**params, "limit": 7, **({"cursor": cursor} if cursor else {})})
+                self.assertEqual(response.status_code, 200)
+                paged.extend(movie["id"] for movie in response.json())
+                cursor = response.headers.get("X-Next-Cursor")
+                if not cursor:
+                    break
+            self.assertEqual(paged, expected, params)
+
+        response = self.client.get("/api/movies", params={"limit": 5, "fields": "title"})
+        self.assertEqual([set(movie) for movie in response.json()], [{"id", "title"}] * 5)
+
+        # A cursor with a UTC offset cannot be compared with the stored naive timestamps
+        aware = {"created_at": datetime.fromisoformat(movies[3]["created_at"]).replace(tzinfo=timezone.utc),
+                 "id": movies[3]["id"]}
+        response = self.client.get("/api/movies", params={"limit": 5, "cursor": server.encode_cursor(aware)})
+        self.assertEqual(response.status_code, 400)
+
+    def test_top(self):
+        movies = self.create_catalog()
+        for category, field in (("overall", "overall_rating"), ("story", None)):
+            def score(movie):
+                return movie[field] if field else movie["ratings"][category]
+            for params in ({}, {"platform": "Netflix"}, {"content_type": "tv_series"}):
+                candidates = [
+                    movie for movie in movies
+                    if movie["streaming_platform"] == params.get("platform", movie["streaming_platform"])
+                    and movie["content_type"] == params.get("content_type", movie["content_type"])
+                ]
+                expected = [movie["id"] for movie in sorted(candidates, key=lambda movie: (-score(movie), movie["id"]))[:5]]
+                response = self.client.get("/api/movies/top", params={"category": category, "n": 5, **params})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual([movie["id"] for movie in response.json()], expected, (category, params))
+
+    def test_rank_weighted(self):
+        movies = self.create_catalog()
+        weights = {"story": 3, "action_stunts": 1}
+
+        def score(movie):
+            return sum(movie["ratings"][category] * weight for category, weight in weights.items()) / 4
+
+        for params, path in (({"limit": 8}, "/api/movies"), ({"n": 8}, "/api/movies/top")):
+            response = self.client.get(path, params={**params, "weights": "story:3,action_stunts:1"})
+            self.assertEqual(response.status_code, 200)
+            ranked = response.json()
+            expected = sorted(movies, key=lambda movie: (-score(movie), movie["id"]))[:8]
+            self.assertEqual([movie["id"] for movie in ranked], [movie["id"] for movie in expected])
+            for movie, reference in zip(ranked, expected):
+                self.assertAlmostEqual(movie["weighted_score"], round(score(reference), 2), places=2)
+
+    def test_read_during_write_is_not_confirmed_stale(self):
+        self.create_catalog(count=3)
+        payload = next(generate_catalog(1, PLATFORMS, server.RATING_CATEGORIES, seed=8))
+        for path in ("/api/movies", "/api/stats"):
+            self.assertEqual(self.client.get(path).status_code, 200)
+
+        # Reads land inside the write's side effects, on either side of the version bump
+        reads = []
+        update = server.storage.stats.update
+
+        async def read(client):
+            for path in ("/api/movies", "/api/stats"):
+                reads.append((path, await client.get(path)))
+
+        async def update_between_reads(key, set=None, inc=None, upsert=False):
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                await read(client)
+                await update(key, set=set, inc=inc, upsert=upsert)
+                await read(client)
+
+        with mock.patch.object(server.storage.stats, "update", update_between_reads):
+            self.assertEqual(self.client.post("/api/movies", json=payload).status_code, 200)
+
+        # Revalidating a response read mid-write either refreshes it or confirms data with the new title
+        self.assertEqual(len(reads), 4)
+        for path, response in reads:
+            revalidated = self.client.get(path, headers={"If-None-Match": response.headers["ETag"]})
+            body = response.json() if revalidated.status_code == 304 else revalidated.json()
+            if path == "/api/movies":
+                self.assertIn(payload["title"], [movie["title"] for movie in body])
+            else:
+                self.assertEqual(body["total_content"], 4)
+
+    def test_patch(self):
+        movie = self.create_catalog(count=3)[0]
+        response = self.client.patch(f"/api/movies/{movie['id']}", json={"genre": "Drama", "ratings": {"story": 1.0}})
+        self.assertEqual(response.status_code, 200)
+        ratings = {**movie["ratings"], "story": 1.0}
+        expected_overall = server.calculate_overall_rating(server.RatingCategories(**ratings))
+        for patched in (response.json(), self.client.get(f"/api/movies/{movie['id']}").json()):
+            self.assertEqual(patched["genre"], "Drama")
+            self.assertEqual(patched["ratings"], ratings)
+            self.assertEqual(patched["overall_rating"], expected_overall)
+            self.assertEqual(patched["created_at"], movie["created_at"])
+
+        response = self.client.patch(f"/api/movies/{movie['id']}", json={"ratings": {"story": 11}})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.client.patch("/api/movies/missing", json={"genre": "Drama"}).status_code, 404)
+        conflict = server.WriteConflictError("kept changing")
+        with mock.patch.object(server.storage.movies, "patch", side_effect=conflict):
+            response = self.client.patch(f"/api/movies/{movie['id']}", json={"ratings": {"story": 2.0}})
+        self.assertEqual(response.status_code, 409)
+
+        # Only description can be cleared; other fields can be left out but not nulled
+        for body in ({"title": None}, {"ratings": None}, {"streaming_platform": None, "genre": "Drama"}):
+            self.assertEqual(self.client.patch(f"/api/movies/{movie['id']}", json=body).status_code, 422, body)
+            self.assertEqual(self.client.put(f"/api/movies/{movie['id']}", json=body).status_code, 422, body)
+        response = self.client.patch(f"/api/movies/{movie['id']}", json={"description": None})
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.json()["description"])
+        self.assertEqual(self.client.get(f"/api/movies/{movie['id']}").json()["title"], movie["title"])
+        self.assertEqual(self.client.get("/api/search", params={"q": movie["title"]}).status_code, 200)
+
+    def test_delete_many(self):
+        movies = self.create_catalog()
+        response = self.client.post(f"/api/movies/{movies[0]['id']}/ratings", json={"user_id": "u1", "ratings": {"story": 7}})
+        self.assertEqual(response.status_code, 200)
+
+        platform = movies[0]["streaming_platform"]
+        expected = [movie["id"] for movie in movies if movie["streaming_platform"] == platform]
+        response = self.client.delete("/api/movies", params={"platform": platform})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["deleted"], len(expected))
+        self.assertEqual(self.client.get("/api/movies", params={"platform": platform}).json(), [])
+        self.assertEqual(self.client.get(f"/api/movies/{movies[0]['id']}").status_code, 404)
+        remaining = self.client.get("/api/movies", params={"limit": CATALOG_SIZE}).json()
+        self.assertEqual(len(remaining), CATALOG_SIZE - len(expected))
+        self.assertEqual(self.client.get("/api/stats").json()["total_content"], len(remaining))
+
+        self.assertEqual(self.client.delete("/api/movies").status_code, 400)
+
+        # Rating events go with their titles: those of the filtered delete, then all of them
+        kept = remaining[0]["id"]
+        self.client.post(f"/api/movies/{kept}/ratings", json={"user_id": "u1", "ratings": {"story": 5}})
+        self.assertIsNone(self.client.portal.call(server.storage.rating_events.get, movies[0]["id"], "u1"))
+        self.assertIsNotNone(self.client.portal.call(server.storage.rating_events.get, kept, "u1"))
+
+        response = self.client.delete("/api/movies", params={"all": "true"})
+        self.assertEqual(response.json()["deleted"], len(remaining))
+        self.assertEqual(self.client.get("/api/movies").json(), [])
+        self.assertEqual(self.client.get("/api/stats").json()["total_content"], 0)
+        self.assertEqual(self.client.get("/api/search", params={"q": remaining[0]["title"]}).json(), [])
+        self.assertIsNone(self.client.portal.call(server.storage.rating_events.get, kept, "u1"))
+
+    def test_replace_by_natural_key(self):
+        payloads = list(generate_catalog(4, PLATFORMS, server.RATING_CATEGORIES, seed=2))
+        ndjson = "\n".join(server.json.dumps(payload) for payload in payloads)
+        response = self.client.post("/api/movies/import", params={"upsert": "true"}, content=ndjson)
+        self.assertEqual(response.json()["created"], 4)
+        originals = {movie["title"]: movie for movie in self.client.get("/api/movies").json()}
+        rated = originals[payloads[0]["title"]]["id"]
+        response = self.client.post(f"/api/movies/{rated}/ratings", json={"user_id": "u1", "ratings": {"story": 7}})
+        community = response.json()
+        self.assertEqual(community["categories"]["story"]["count"], 1)
+
+        changed = [{**payload, "genre": "Documentary"} for payload in payloads[:2]]
+        ndjson = "\n".join(server.json.dumps(payload) for payload in changed)
+        response = self.client.post("/api/movies/import", params={"upsert": "true"}, content=ndjson)
+        self.assertEqual((response.json()["created"], response.json()["updated"]), (0, 2))
+
+        movies = {movie["title"]: movie for movie in self.client.get("/api/movies").json()}
+        self.assertEqual(set(movies), set(originals))
+        for payload in changed:
+            movie, original = movies[payload["title"]], originals[payload["title"]]
+            self.assertEqual(movie["genre"], "Documentary")
+            self.assertEqual((movie["id"], movie["created_at"]), (original["id"], original["created_at"]))
+        self.assertEqual(self.client.get(f"/api/movies/{rated}/ratings").json(), community)
+
+    def test_reads_hide_community_ratings(self):
+        movie = self.create_catalog(count=5)[0]
+        response = self.client.post(f"/api/movies/{movie['id']}/ratings", json={"user_id": "u1", "ratings": {"story": 7}})
+        self.assertEqual(response.status_code, 200)
+
+        reads = [
+            self.client.get("/api/movies").json(),
+            self.client.get("/api/movies", params={"weights": "story:1"}).json(),
+            self.client.get("/api/movies/top").json(),
+            self.client.get("/api/movies/top", params={"weights": "story:1"}).json(),
+            [self.client.get(f"/api/movies/{movie['id']}").json()],
+            [server.json.loads(line) for line in self.client.get("/api/movies/export").text.splitlines()],
+            self.client.get("/api/search", params={"q": movie["title"]}).json(),
+            self.client.get(f"/api/movies/{movie['id']}/similar").json(),
+        ]
+        for documents in reads:
+            self.assertTrue(documents)
+            for document in documents:
+                self.assertLessEqual(set(document), {*server.MOVIE_FIELDS, "weighted_score", "score", "similarity"})
+
+    def test_rating_keeps_cached_reads(self):
+        movie = self.create_catalog(count=3)[0]
+        reads = {path: self.client.get(path) for path in ("/api/movies", "/api/movies/top", "/api/stats")}
+        hits = self.client.get("/api/cache/stats").json()["hits"]
+
+        response = self.client.post(f"/api/movies/{movie['id']}/ratings", json={"user_id": "u1", "ratings": {"story": 7}})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(f"/api/movies/{movie['id']}").json()["updated_at"], movie["updated_at"])
+        for path, read in reads.items():
+            response = self.client.get(path, headers={"If-None-Match": read.headers["ETag"]})
+            self.assertEqual(response.status_code, 304, path)
+            self.assertEqual(self.client.get(path).content, read.content)
+        self.assertEqual(self.client.get("/api/cache/stats").json()["hits"], hits + len(reads))
+
+    def test_concurrent_rerates(self):
+        movie = self.create_catalog(count=2)[0]
+
+        async def rerate():
+            ratings = [server.RatingEventCreate(user_id="u1", ratings={"story": value}) for value in range(1, 7)]
+            return await asyncio.gather(
+                *(server.rate_movie(movie["id"], rating) for rating in ratings), return_exceptions=True
+            )
+
+        results = self.client.portal.call(rerate)
+        self.assertTrue(any(isinstance(result, server.CommunityRatings) for result in results))
+        event = self.client.portal.call(server.storage.rating_events.get, movie["id"], "u1")
+        self.assertTrue(event["applied"])
+        story = self.client.get(f"/api/movies/{movie['id']}/ratings").json()["categories"]["story"]
+        self.assertEqual((story["count"], story["mean"]), (1, event["ratings"]["story"]))
+
+    def test_failed_rating_restores_event(self):
+        movie = self.create_catalog(count=2)[0]
+        path = f"/api/movies/{movie['id']}/ratings"
+        self.client.post(path, json={"user_id": "u1", "ratings": {"story": 4}})
+
+        with mock.patch.object(server.storage.movies, "rate", side_effect=RuntimeError("write failed")):
+            self.assertEqual(self.client.post(path, json={"user_id": "u1", "ratings": {"story": 9}}).status_code, 500)
+        event = self.client.portal.call(server.storage.rating_events.get, movie["id"], "u1")
+        self.assertEqual((event["ratings"], event["applied"]), ({"story": 4}, True))
+
+        story = self.client.post(path, json={"user_id": "u1", "ratings": {"story": 8}}).json()["categories"]["story"]
+        self.assertEqual((story["count"], story["mean"]), (1, 8))
+
+    def test_recompute_overall_job(self):
+        movies = self.create_catalog(count=20)
+        self.assertEqual(self.client.get("/api/stats").json()["total_content"], 20)
+
+        # A new formula: every stored overall_rating is now stale
+        def story_only(ratings):
+            return ratings.story
+
+        with mock.patch.object(server, "calculate_overall_rating", story_only):
+            response = self.client.post("/api/jobs/recompute-overall", params={"batch_size": 7, "pause_seconds": 0})
+            self.assertEqual(response.status_code, 202)
+            for _ in range(100):
+                job = self.client.get(f"/api/jobs/{response.json()['id']}").json()
+                if job["status"] != "running":
+                    break
+                time.sleep(0.02)
+            self.assertEqual(job["status"], "completed")
+
+            expected = [movie for movie in movies if movie["overall_rating"] != movie["ratings"]["story"]]
+            self.assertEqual((job["processed"], job["modified"]), (20, len(expected)))
+            for movie in self.client.get("/api/movies", params={"limit": 20}).json():
+                self.assertEqual(movie["overall_rating"], movie["ratings"]["story"])
+            # The incremental stats already hold the new values (tearDown checks for drift)
+            stats = self.client.get("/api/stats").json()
+            average = sum(movie["ratings"]["story"] for movie in movies) / 20
+            self.assertAlmostEqual(stats["average_ratings"]["overall"], average, delta=0.01)
+
+    def test_memory_index_failure_reloads(self):
+        movies = self.create_catalog(count=5)
+        movie = movies[0]
+        self.client.post(f"/api/movies/{movie['id']}/ratings", json={"user_id": "u1", "ratings": {"story": 7}})
+        self.assertTrue(self.client.get("/api/search", params={"q": movie["title"]}).json())
+
+        broken = RuntimeError("index update failed")
+        with mock.patch.object(server.search_index, "upsert", side_effect=broken):
+            response = self.client.patch(f"/api/movies/{movie['id']}", json={"title": "Reindexed Title"})
+        self.assertEqual(response.status_code, 200)
+        results = self.client.get("/api/search", params={"q": "reindexed"}).json()
+        self.assertEqual([result["id"] for result in results], [movie["id"]])
+
+        platform = movie["streaming_platform"]
+        with mock.patch.object(server.search_index, "remove", side_effect=broken):
+            response = self.client.delete("/api/movies", params={"platform": platform})
+        self.assertEqual(response.json()["deleted"], sum(1 for other in movies if other["streaming_platform"] == platform))
+        self.assertEqual(self.client.get("/api/search", params={"q": "reindexed"}).json(), [])
+        self.assertIsNone(self.client.portal.call(server.storage.rating_events.get, movie["id"], "u1"))
+
+    def test_upsert_keys_repeated_across_batches(self):
+        payloads = list(generate_catalog(2, PLATFORMS, server.RATING_CATEGORIES, seed=3))
+
+        async def rows():
+            for line in range(1, 9):
+                yield line, {**payloads[line % 2], "genre": f"Genre {line}"}
+
+        # Small batches with concurrency requested: upserts must still apply in order
+        report = self.client.portal.call(lambda: server.import_movies(rows(), upsert=True, batch_size=2, concurrency=4))
+        self.assertEqual((report.created, report.updated, report.failed), (2, 6, 0))
+        movies = self.client.get("/api/movies").json()
+        self.assertEqual(sorted(movie["genre"] for movie in movies), ["Genre 7", "Genre 8"])
+
+
+class MemoryEngineTest(EngineParityTest, unittest.TestCase):
+    engine = "memory"
+
+
+class SQLiteEngineTest(EngineParityTest, unittest.TestCase):
+    engine = "sqlite"
+
+
+if __name__ == "__main__":
+    unittest.main()